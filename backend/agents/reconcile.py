@@ -0,0 +1,33 @@
+from typing import List
+
+from pydantic import BaseModel
+from pydantic_ai import Agent as PydanticAgent
+
+from helper_functions.llm_gateway import openai_model
+
+
+class Resolution(BaseModel):
+    id: int
+    text: str
+
+
+class Resolutions(BaseModel):
+    resolutions: List[Resolution]
+
+
+RECONCILE_SYSTEM_PROMPT = (
+    "You reconcile two extractions of the same document: a markdown extraction (preserves structure, may miss text) "
+    "and an OCR extraction (may contain recognition errors). You are given only the regions where they disagree, "
+    "each with a few words of surrounding context. For every region, return the correct text to replace the "
+    "markdown version with: keep the markdown formatting, restore text only the OCR found, and fix OCR errors. "
+    "Do not repeat the context, add explanations or reword anything. "
+    'Your response must be a JSON object: {"resolutions": [{"id": <region id>, "text": "<reconciled text>"}, ...]}.'
+)
+
+# Deterministic, so responses can be served from helper_functions.llm_cache
+reconcile_agent = PydanticAgent(
+    openai_model("gpt-4o", "openai"),
+    system_prompt=RECONCILE_SYSTEM_PROMPT,
+    output_type=Resolutions,
+    model_settings={"temperature": 0},
+)
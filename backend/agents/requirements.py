@@ -0,0 +1,17 @@
+from typing import List
+
+from pydantic_ai import Agent as PydanticAgent
+
+from helper_functions.llm_gateway import openai_model
+
+open_ai_model = openai_model("gpt-4.1", "openai")
+
+REQUIREMENTS_SYSTEM_PROMPT = "You are an expert requirements engineer. Extract all requirements from the document and return them as a list of strings List[str]. Do not include any additional text or explanation but you can reformat the text to make it readable."
+
+# Deterministic, so responses can be served from helper_functions.llm_cache
+requirements_agent = PydanticAgent(
+    open_ai_model,
+    system_prompt=REQUIREMENTS_SYSTEM_PROMPT,
+    output_type=List[str],
+    model_settings={"temperature": 0},
+)
@@ -0,0 +1,104 @@
+"""
+Compares helper_functions.parse.clean_extracted_text, on one multi-MB
+document, and clean_extracted_texts, on its pages, with the original
+eight-pass implementation. Every output is checked to be identical to the
+original's.
+
+    python -m benchmarks.clean_text
+    python -m benchmarks.clean_text --megabytes 1 8 32 --page-chars 3000
+"""
+
+import re
+import sys
+import time
+import random
+import argparse
+import unicodedata
+
+from helper_functions.parse import clean_extracted_text, clean_extracted_texts
+
+WORDS = (
+    "system shall provide user operator data report interface traffic model "
+    "network response time secure store display export within seconds "
+    "requirement speciﬁcation ﬂow conﬁguration ①"
+).split()
+# PDF extraction artifacts: line breaks, hyphenation, NBSP, zero-width
+# spaces, blank lines, tabs and full-width spaces
+SEPARATORS = [" "] * 40 + ["\n", "-\n", "- ", "\xa0", "\u200b", "\n\n", "\t", "\u3000"]
+
+
+def clean_extracted_text_reference(text: str) -> str:
+    """clean_extracted_text as it was originally, for comparison."""
+    if not isinstance(text, str):
+        return ""
+
+    text = re.sub(r"^\d+:\s*\'?", "", text)
+    text = unicodedata.normalize("NFKC", text)
+    text = re.sub(r"([a-zA-Z])-\s+([a-zA-Z])", r"\1\2", text)
+    text = text.replace("\xa0", " ").replace("\u200b", "")
+    text = re.sub(r"(?<!\n)\n(?!\n)", " ", text)
+    text = re.sub(r"\n{2,}", "\n\n", text)
+    text = re.sub(r"\s+", " ", text)
+    text = text.strip()
+
+    return text
+
+
+def synthetic_pages(total_chars: int, page_chars: int, seed: int = 0):
+    rng = random.Random(seed)
+    pages = []
+    for page_number in range(total_chars // page_chars or 1):
+        parts = [f"{page_number}: '"]
+        size = 0
+        while size < page_chars:
+            word = rng.choice(WORDS) + rng.choice(SEPARATORS)
+            parts.append(word)
+            size += len(word)
+        pages.append("".join(parts))
+    return pages
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--megabytes", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--page-chars", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(f"{'MB':>6} {'input':>22} {'seconds':>8} {'MB/sec':>8} {'speedup':>8}")
+    for megabytes in args.megabytes:
+        pages = synthetic_pages(
+            int(megabytes * 1024 * 1024), args.page_chars, args.seed
+        )
+        document = "".join(pages)
+        size_mb = len(document.encode()) / 1024 / 1024
+
+        def row(label, seconds, baseline):
+            print(
+                f"{size_mb:>6.1f} {label:>22} {seconds:>8.3f} {size_mb / seconds:>8.1f} {baseline / seconds:>7.1f}x"
+            )
+
+        expected, reference_seconds = timed(clean_extracted_text_reference, document)
+        cleaned, seconds = timed(clean_extracted_text, document)
+        assert cleaned == expected, "clean_extracted_text differs from the original"
+        row("original, document", reference_seconds, reference_seconds)
+        row("current, document", seconds, reference_seconds)
+
+        expected, reference_seconds = timed(
+            lambda: [clean_extracted_text_reference(page) for page in pages]
+        )
+        batched, batch_seconds = timed(clean_extracted_texts, pages)
+        assert batched == expected, "clean_extracted_texts differs from the original"
+        row(f"original, {len(pages)} pages", reference_seconds, reference_seconds)
+        row(f"batch, {len(pages)} pages", batch_seconds, reference_seconds)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Compares the linear-scan and grid-indexed versions of
+helper_functions.multi_column.join_column_boxes on synthetic pages.
+
+Each page is a form-like grid of text blocks with some shaded (path)
+table cells, an image and a vertical text strip. Both versions must
+return the same boxes; the script exits non-zero if they don't.
+
+    python -m benchmarks.column_boxes
+    python -m benchmarks.column_boxes --blocks 10 100 500 2000 --repeat 3
+"""
+
+import sys
+import time
+import random
+import argparse
+
+import fitz
+
+from helper_functions.multi_column import join_column_boxes
+
+PAGE_RECT = fitz.Rect(0, 0, 612, 792)
+
+
+def synthetic_page(n_blocks: int, seed: int = 0):
+    """Text, path, vertical and image bboxes of a form-like synthetic page.
+
+    Text blocks are laid out as table cells (about 4:3 rows to columns), each
+    block filling a random part of its cell; a tenth of the cells are shaded.
+    """
+    rng = random.Random(seed)
+    margin = 36
+    columns = max(1, round((n_blocks * 3 / 4) ** 0.5))
+    rows = -(-n_blocks // columns)
+    cell_width = (PAGE_RECT.width - 2 * margin - 20) / columns
+    cell_height = (PAGE_RECT.height - 2 * margin) / rows
+
+    text = []
+    for k in range(n_blocks):
+        row, col = divmod(k, columns)
+        x0 = margin + 20 + col * cell_width + 1
+        y0 = margin + row * cell_height + 1
+        width = rng.uniform(0.4, 0.9) * (cell_width - 2)
+        height = rng.uniform(0.5, 0.9) * (cell_height - 2)
+        text.append(fitz.IRect(x0, y0, x0 + max(width, 2), y0 + max(height, 2)))
+
+    # shaded table cells around some of the text blocks
+    paths = []
+    for bb in rng.sample(text, max(1, n_blocks // 10)):
+        paths.append(fitz.IRect(bb.x0 - 1, bb.y0 - 1, bb.x1 + 1, bb.y1 + 1))
+    paths.sort(key=lambda b: (b.y0, b.x0))
+
+    images = [
+        fitz.Rect(
+            PAGE_RECT.width - margin - 60, margin, PAGE_RECT.width - margin, margin + 60
+        )
+    ]
+    vertical = [fitz.IRect(margin, margin, margin + 12, PAGE_RECT.height - margin)]
+    return text, paths, vertical, images
+
+
+def run(rects, use_index: bool):
+    text, paths, vertical, images = rects
+    return join_column_boxes(
+        list(text), list(paths), list(vertical), list(images), PAGE_RECT, use_index
+    )
+
+
+def best_of(repeat: int, rects, use_index: bool):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run(rects, use_index)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--blocks", type=int, nargs="+", default=[10, 50, 100, 250, 500, 1000, 2000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(f"{'blocks':>7} {'linear (s)':>11} {'index (s)':>10} {'speedup':>8}  same")
+    mismatches = 0
+    for n_blocks in args.blocks:
+        rects = synthetic_page(n_blocks, args.seed)
+        linear_time, linear = best_of(args.repeat, rects, use_index=False)
+        index_time, indexed = best_of(args.repeat, rects, use_index=True)
+        same = linear == indexed
+        mismatches += not same
+        print(
+            f"{n_blocks:>7} {linear_time:>11.4f} {index_time:>10.4f} {linear_time / index_time:>7.1f}x  {same}"
+        )
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
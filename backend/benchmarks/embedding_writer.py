@@ -0,0 +1,103 @@
+"""
+Measures the throughput of helper_functions.embedding_writer in chunks/sec.
+
+Chunks are synthetic and embedded with the deterministic HashEmbedder. By
+default rows are only encoded for COPY (binary and text), which isolates the
+embedding and encoding cost; with --table they are loaded into an existing
+PgVector table through the vector database pool (VECTOR_DATABASE_URL).
+
+    python -m benchmarks.embedding_writer
+    python -m benchmarks.embedding_writer --chunks 20000 --table ai.test
+"""
+
+import sys
+import random
+import asyncio
+import argparse
+
+from agno.document import Document
+
+from db.vectors import encode_binary_copy, encode_text_copy
+from helper_functions.embedding_writer import (
+    HashEmbedder,
+    VectorCopyWriter,
+    aembed_and_load,
+)
+
+WORDS = (
+    "system shall provide user operator data report interface traffic model "
+    "network response time secure store display export within seconds"
+).split()
+
+
+def synthetic_chunks(n_chunks: int, words_per_chunk: int = 120, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        Document(
+            name="benchmark",
+            id=f"benchmark_{i}",
+            meta_data={"chunk": i},
+            content=" ".join(rng.choices(WORDS, k=words_per_chunk)),
+        )
+        for i in range(n_chunks)
+    ]
+
+
+class EncodeOnlyWriter:
+    """Encodes each window for COPY without sending it anywhere."""
+
+    def __init__(self, binary: bool):
+        self.binary = binary
+
+    def write(self, rows) -> int:
+        (encode_binary_copy if self.binary else encode_text_copy)(rows)
+        return len(rows)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--window-rows", type=int, default=2048)
+    parser.add_argument("--table", help="schema.table of a PgVector table to load into")
+    args = parser.parse_args(argv)
+
+    embedder = HashEmbedder(dimensions=args.dimensions)
+    if args.table:
+        schema, _, table_name = args.table.rpartition(".")
+        writers = {
+            "binary COPY": lambda: VectorCopyWriter(schema or None, table_name, True),
+            "text COPY": lambda: VectorCopyWriter(schema or None, table_name, False),
+        }
+    else:
+        writers = {
+            "binary encode": lambda: EncodeOnlyWriter(True),
+            "text encode": lambda: EncodeOnlyWriter(False),
+        }
+
+    print(
+        f"{'chunks':>7} {'writer':>14} {'seconds':>8} {'embed (s)':>9} {'copy (s)':>9} {'chunks/sec':>11}"
+    )
+    for n_chunks in args.chunks:
+        documents = synthetic_chunks(n_chunks)
+        for label, make_writer in writers.items():
+            stats = asyncio.run(
+                aembed_and_load(
+                    documents,
+                    embedder,
+                    make_writer(),
+                    batch_size=args.batch_size,
+                    concurrency=args.concurrency,
+                    window_rows=args.window_rows,
+                )
+            )
+            print(
+                f"{n_chunks:>7} {label:>14} {stats['seconds']:>8.2f} {stats['embed_seconds']:>9.2f} {stats['copy_seconds']:>9.2f} {stats['chunks_per_sec']:>11.1f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Reports p50/p99 latency of db.search.hybrid_search_chunks (vector + full-text
+ranking fused with RRF, one prepared statement) on a synthetic corpus.
+
+Chunks are unit vectors from Gaussian clusters (see benchmarks.vector_index),
+and each cluster has its own vocabulary, so a query's words and vector point
+at the same chunks. The corpus is loaded into a scratch PgVector-shaped table
+of the vector database (VECTOR_DATABASE_URL, or --dsn), which gets the stored
+tsvector column and GIN index from ensure_chunk_search_column and an HNSW
+index. Query embedding and the /search result cache are not measured.
+
+    python -m benchmarks.hybrid_search
+    python -m benchmarks.hybrid_search --rows 1000000 --dimensions 1536
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import psycopg2
+from psycopg2 import sql
+
+from benchmarks.vector_index import synthetic_corpus, synthetic_queries
+from db.search import ensure_chunk_search_column, hybrid_search_chunks
+from db.vector_index import build_vector_index
+
+COMMON_WORDS = "system shall provide user data report interface response".split()
+
+
+def cluster_words(clusters: int, words_per_cluster: int):
+    return [
+        [f"topic{c}term{j}" for j in range(words_per_cluster)] for c in range(clusters)
+    ]
+
+
+def corpus_labels(rows: int, dimensions: int, clusters: int, n_queries: int, seed: int):
+    """
+    The cluster of every corpus row and the row each query was perturbed
+    from, replaying the draws of synthetic_corpus and synthetic_queries.
+    """
+    rng = np.random.default_rng(seed)
+    rng.normal(size=(clusters, dimensions))
+    labels = rng.integers(0, clusters, size=rows)
+    query_rows = np.random.default_rng(seed + 1).integers(0, rows, size=n_queries)
+    return labels, query_rows
+
+
+def chunk_texts(labels, vocabulary, words_per_chunk: int, seed: int):
+    rng = np.random.default_rng(seed)
+    for label in labels:
+        words = rng.choice(vocabulary[label], size=words_per_chunk // 2).tolist()
+        words += rng.choice(COMMON_WORDS, size=words_per_chunk // 2).tolist()
+        yield " ".join(words)
+
+
+def load_chunks(conn, table: str, corpus, texts) -> float:
+    started = time.perf_counter()
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+        cursor.execute(
+            sql.SQL("DROP TABLE IF EXISTS {};").format(sql.Identifier(table))
+        )
+        cursor.execute(
+            sql.SQL(
+                "CREATE TABLE {} (id text PRIMARY KEY, name text, meta_data jsonb, "
+                "content text, embedding vector(%s));"
+            ).format(sql.Identifier(table)),
+            (corpus.shape[1],),
+        )
+        buffer = io.StringIO()
+        for i, (vector, text) in enumerate(zip(corpus, texts)):
+            buffer.write(
+                f"chunk_{i}\tbenchmark\t{json.dumps({'chunk': i})}\t{text}\t"
+                f"[{','.join(map(repr, vector.tolist()))}]\n"
+            )
+        buffer.seek(0)
+        cursor.copy_expert(
+            sql.SQL("COPY {} (id, name, meta_data, content, embedding) FROM STDIN;")
+            .format(sql.Identifier(table))
+            .as_string(cursor),
+            buffer,
+        )
+    conn.commit()
+    return time.perf_counter() - started
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dsn", default=os.getenv("VECTOR_DATABASE_URL"))
+    parser.add_argument("--table", default="hybrid_search_benchmark")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--words-per-cluster", type=int, default=50)
+    parser.add_argument("--words-per-chunk", type=int, default=40)
+    parser.add_argument("--spread", type=float, default=0.5)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=100)
+    parser.add_argument("--target-p99-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch table")
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error("--dsn or VECTOR_DATABASE_URL is required")
+
+    corpus = synthetic_corpus(
+        args.rows, args.dimensions, args.clusters, args.spread, args.seed
+    )
+    queries = synthetic_queries(corpus, args.queries, args.spread, args.seed)
+    labels, query_rows = corpus_labels(
+        args.rows, args.dimensions, args.clusters, args.queries, args.seed
+    )
+    vocabulary = cluster_words(args.clusters, args.words_per_cluster)
+    texts = chunk_texts(labels, vocabulary, args.words_per_chunk, args.seed)
+    rng = np.random.default_rng(args.seed + 2)
+    query_texts = [
+        " ".join(rng.choice(vocabulary[label], size=2)) for label in labels[query_rows]
+    ]
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        load_seconds = load_chunks(conn, args.table, corpus, texts)
+        started = time.perf_counter()
+        ensure_chunk_search_column(conn, None, args.table)
+        build_vector_index(conn, None, args.table, method="hnsw")
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("ANALYZE {};").format(sql.Identifier(args.table)))
+        conn.commit()
+        print(
+            f"Loaded {args.rows} chunks in {load_seconds:.1f}s, indexed in "
+            f"{time.perf_counter() - started:.1f}s; {args.queries} queries, "
+            f"k={args.k}, candidates={args.candidates}"
+        )
+
+        latencies = []
+        with conn.cursor() as cursor:
+            for vector, text in zip(queries, query_texts):
+                query_started = time.perf_counter()
+                hybrid_search_chunks(
+                    cursor,
+                    None,
+                    args.table,
+                    vector,
+                    text,
+                    k=args.k,
+                    candidates=args.candidates,
+                )
+                latencies.append((time.perf_counter() - query_started) * 1000)
+        # The first query PREPAREs the statement on this connection
+        first, warm = latencies[0], np.array(latencies[1:])
+        p50, p99 = np.percentile(warm, 50), np.percentile(warm, 99)
+        print(f"first query (PREPARE + EXECUTE): {first:.2f} ms")
+        print(
+            f"prepared: p50 {p50:.2f} ms, p99 {p99:.2f} ms, max {warm.max():.2f} ms "
+            f"({'within' if p99 < args.target_p99_ms else 'over'} the "
+            f"{args.target_p99_ms:.0f} ms p99 target)"
+        )
+    finally:
+        conn.rollback()
+        if not args.keep:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    sql.SQL("DROP TABLE IF EXISTS {};").format(
+                        sql.Identifier(args.table)
+                    )
+                )
+            conn.commit()
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Compares helper_functions.ocr.extract_text_with_ocr with the original OCR
+(pdf2image rasterising the whole PDF, then tesseract page by page) on a
+synthetic PDF of text pages and scanned (image-only) pages. Reports time and
+peak RSS of each, in its own child process, and how many pages were OCRed.
+Needs tesseract and poppler, as installed in the Docker image.
+
+    python -m benchmarks.ocr
+    python -m benchmarks.ocr --text-pages 200 --scanned-pages 10
+"""
+
+import sys
+import time
+import random
+import argparse
+import resource
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pymupdf
+
+WORDS = (
+    "system shall provide user operator data report interface traffic model "
+    "network response time secure store display export within seconds"
+).split()
+
+
+def extract_text_with_ocr_reference(pdf_path: str) -> str:
+    """extract_text_with_ocr as it was originally, for comparison."""
+    import pytesseract
+    from pdf2image import convert_from_path
+
+    pages = convert_from_path(pdf_path)
+    text = ""
+    for page in pages:
+        text += pytesseract.image_to_string(page)
+    return text
+
+
+def synthetic_pdf(path: str, text_pages: int, scanned_pages: int, seed: int = 0):
+    """Text pages, with scanned pages (a rendered text page as an image) spread among them."""
+    rng = random.Random(seed)
+    kinds = ["text"] * text_pages + ["scanned"] * scanned_pages
+    rng.shuffle(kinds)
+    with pymupdf.open() as doc:
+        for kind in kinds:
+            page = doc.new_page()
+            paragraph = " ".join(rng.choice(WORDS) for _ in range(300))
+            if kind == "text":
+                page.insert_textbox(page.rect + (50, 50, -50, -50), paragraph)
+                continue
+            with pymupdf.open() as scratch:
+                source = scratch.new_page()
+                source.insert_textbox(source.rect + (50, 50, -50, -50), paragraph)
+                image = source.get_pixmap(dpi=150).tobytes("png")
+            page.insert_image(page.rect, stream=image)
+        doc.save(path)
+
+
+def measure(function_name: str, pdf_path: str):
+    # Runs in a fresh child process, so peak RSS is this run's alone
+    if function_name == "reference":
+        function = extract_text_with_ocr_reference
+    else:
+        from helper_functions.ocr import extract_text_with_ocr as function
+    started = time.perf_counter()
+    text = function(pdf_path)
+    seconds = time.perf_counter() - started
+    peak_kb = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return seconds, peak_kb / 1024, len(text)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--text-pages", type=int, default=100)
+    parser.add_argument("--scanned-pages", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        pdf_path = f"{scratch}/benchmark.pdf"
+        synthetic_pdf(pdf_path, args.text_pages, args.scanned_pages, args.seed)
+
+        from helper_functions.ocr import has_text_layer
+
+        with pymupdf.open(pdf_path) as doc:
+            to_ocr = sum(1 for page in doc if not has_text_layer(page))
+        print(
+            f"{args.text_pages + args.scanned_pages} pages, {args.scanned_pages} "
+            f"scanned; {to_ocr} selected for OCR"
+        )
+        print(f"{'':>10} {'seconds':>8} {'peak MB':>8} {'chars':>8}")
+        results = {}
+        for name in ("reference", "current"):
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                results[name] = pool.submit(measure, name, pdf_path).result()
+            seconds, peak_mb, chars = results[name]
+            print(f"{name:>10} {seconds:>8.2f} {peak_mb:>8.0f} {chars:>8}")
+        print(
+            f"speedup {results['reference'][0] / results['current'][0]:.1f}x, "
+            f"peak RSS {results['reference'][1] / results['current'][1]:.1f}x lower"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
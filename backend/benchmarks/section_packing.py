@@ -0,0 +1,91 @@
+"""
+Compares /fix_md_formatting/'s LLM requests per document with one request
+per heading and with helper_functions.md_sections.pack_sections, on
+markdown files or a synthetic paper. Every packing is checked to reassemble
+the document exactly and to keep each request within the budget.
+
+    python -m benchmarks.section_packing
+    python -m benchmarks.section_packing uploads/*.md --budget 4000 8000
+"""
+
+import sys
+import random
+import argparse
+
+from config import settings
+from helper_functions.md_sections import (
+    pack_sections,
+    split_markdown_into_sections,
+    token_counter,
+)
+
+WORDS = (
+    "system shall provide user operator data report interface traffic model "
+    "network response time secure store display export within seconds"
+).split()
+
+
+def synthetic_paper(sections: int, seed: int = 0) -> str:
+    """
+    Headings over mostly short sections (captions, affiliations, one-line
+    subsections), a few long ones and one appendix far over any budget.
+    """
+    rng = random.Random(seed)
+    parts = ["Title of the paper\n\nAuthor One, Author Two\n\n"]
+    for i in range(sections):
+        paragraphs = rng.choice([1] * 6 + [3] * 3 + [12])
+        if i == sections - 1:
+            paragraphs = 400
+        parts.append(f"{'#' * rng.randint(1, 3)} Section {i}\n\n")
+        for _ in range(paragraphs):
+            words = rng.randint(10, 120)
+            parts.append(" ".join(rng.choice(WORDS) for _ in range(words)) + "\n\n")
+    return "".join(parts)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("paths", nargs="*", help="markdown files (default: synthetic)")
+    parser.add_argument(
+        "--budget", type=int, nargs="+", default=[settings.FIX_MD_BATCH_TOKENS]
+    )
+    parser.add_argument("--sections", type=int, default=80)
+    parser.add_argument("--model", default="gpt-4.1")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    documents = [(f"synthetic ({args.sections} headings)", None)]
+    if args.paths:
+        documents = [(path, path) for path in args.paths]
+    count_tokens = token_counter(args.model)
+
+    print(
+        f"{'document':>28} {'budget':>7} {'tokens':>8} {'headings':>9} "
+        f"{'requests':>9} {'max req':>8} {'reduction':>10}"
+    )
+    for label, path in documents:
+        if path is None:
+            md_text = synthetic_paper(args.sections, args.seed)
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                md_text = f.read()
+        sections = split_markdown_into_sections(md_text)
+        assert "".join(sections) == md_text, "sections don't reassemble exactly"
+        per_heading = sum(1 for section in sections if section.strip())
+
+        for budget in args.budget:
+            batches = pack_sections(sections, budget, count_tokens)
+            assert (
+                "".join(batch.text for batch in batches) == md_text
+            ), "batches don't reassemble exactly"
+            largest = max(count_tokens(batch.text) for batch in batches)
+            print(
+                f"{label[-28:]:>28} {budget:>7} {count_tokens(md_text):>8} "
+                f"{per_heading:>9} {len(batches):>9} {largest:>8} "
+                f"{per_heading / len(batches):>9.1f}x"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Reports p50/p99 query latency and recall@k of HNSW and IVFFlat indexes
+against exact search, on a synthetic pgvector corpus.
+
+The corpus is made of Gaussian clusters of unit vectors, loaded into a
+scratch table of the vector database (VECTOR_DATABASE_URL, or --dsn).
+Queries are perturbed corpus vectors. Exact results come from the same table
+with index scans disabled; each index is then built (see
+db.vector_index.build_vector_index) and queried at every --ef-search
+(HNSW) or --probes (IVFFlat) value.
+
+    python -m benchmarks.vector_index
+    python -m benchmarks.vector_index --rows 200000 --dimensions 768 --k 10 \\
+        --ef-search 10 40 100 200 --probes 1 5 10 20
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import psycopg2
+from psycopg2 import sql
+
+from db.vector_index import build_vector_index, drop_vector_index, vector_search
+
+
+def synthetic_corpus(
+    rows: int, dimensions: int, clusters: int, spread: float, seed: int
+):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimensions))
+    labels = rng.integers(0, clusters, size=rows)
+    vectors = centers[labels] + spread * rng.normal(size=(rows, dimensions))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def synthetic_queries(corpus, n_queries: int, spread: float, seed: int):
+    rng = np.random.default_rng(seed + 1)
+    picks = corpus[rng.integers(0, len(corpus), size=n_queries)]
+    queries = picks + spread * rng.normal(size=picks.shape) / np.sqrt(corpus.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def load_corpus(conn, table: str, corpus) -> float:
+    started = time.perf_counter()
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+        cursor.execute(
+            sql.SQL("DROP TABLE IF EXISTS {};").format(sql.Identifier(table))
+        )
+        cursor.execute(
+            sql.SQL(
+                "CREATE TABLE {} (id integer PRIMARY KEY, embedding vector(%s));"
+            ).format(sql.Identifier(table)),
+            (corpus.shape[1],),
+        )
+        buffer = io.StringIO()
+        for i, vector in enumerate(corpus):
+            buffer.write(f"{i}\t[{','.join(map(repr, vector.tolist()))}]\n")
+        buffer.seek(0)
+        cursor.copy_expert(
+            sql.SQL("COPY {} (id, embedding) FROM STDIN;")
+            .format(sql.Identifier(table))
+            .as_string(cursor),
+            buffer,
+        )
+        cursor.execute(sql.SQL("ANALYZE {};").format(sql.Identifier(table)))
+    conn.commit()
+    return time.perf_counter() - started
+
+
+def run_queries(conn, table: str, queries, k: int, **params):
+    latencies = []
+    results = []
+    with conn.cursor() as cursor:
+        for query in queries:
+            started = time.perf_counter()
+            rows = vector_search(cursor, None, table, query, k, **params)
+            latencies.append(time.perf_counter() - started)
+            results.append([row[0] for row in rows])
+    return np.array(latencies) * 1000, results
+
+
+def recall_at_k(results, exact, k: int) -> float:
+    return float(
+        np.mean([len(set(r[:k]) & set(e[:k])) / k for r, e in zip(results, exact)])
+    )
+
+
+def report(label: str, latencies, recall: float):
+    print(
+        f"{label:<28} {np.percentile(latencies, 50):>9.2f} {np.percentile(latencies, 99):>9.2f} {recall:>9.3f}"
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dsn", default=os.getenv("VECTOR_DATABASE_URL"))
+    parser.add_argument("--table", default="vector_index_benchmark")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--spread", type=float, default=0.5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--methods", nargs="+", default=["hnsw", "ivfflat"])
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 40, 100])
+    parser.add_argument("--lists", type=int, default=None)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch table")
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error("--dsn or VECTOR_DATABASE_URL is required")
+
+    corpus = synthetic_corpus(
+        args.rows, args.dimensions, args.clusters, args.spread, args.seed
+    )
+    queries = synthetic_queries(corpus, args.queries, args.spread, args.seed)
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        load_seconds = load_corpus(conn, args.table, corpus)
+        print(
+            f"Loaded {args.rows} x {args.dimensions} vectors into {args.table} in {load_seconds:.1f}s; "
+            f"{args.queries} queries, k={args.k}"
+        )
+        print(f"{'search':<28} {'p50 (ms)':>9} {'p99 (ms)':>9} {'recall@k':>9}")
+
+        exact_latencies, exact = run_queries(
+            conn, args.table, queries, args.k, exact=True
+        )
+        report("exact", exact_latencies, 1.0)
+
+        for method in args.methods:
+            started = time.perf_counter()
+            built = build_vector_index(
+                conn,
+                None,
+                args.table,
+                method=method,
+                m=args.m,
+                ef_construction=args.ef_construction,
+                lists=args.lists,
+                rebuild=True,
+            )
+            print(
+                f"-- {method} {built['options']} built in {time.perf_counter() - started:.1f}s"
+            )
+            sweep = (
+                [{"ef_search": value} for value in args.ef_search]
+                if method == "hnsw"
+                else [{"probes": value} for value in args.probes]
+            )
+            for params in sweep:
+                latencies, results = run_queries(
+                    conn, args.table, queries, args.k, **params
+                )
+                label = f"{method} " + " ".join(f"{k}={v}" for k, v in params.items())
+                report(label, latencies, recall_at_k(results, exact, args.k))
+            # Only one ANN index at a time, so the planner can't pick another
+            drop_vector_index(conn, None, built["index"])
+    finally:
+        conn.rollback()
+        if not args.keep:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    sql.SQL("DROP TABLE IF EXISTS {};").format(
+                        sql.Identifier(args.table)
+                    )
+                )
+            conn.commit()
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,8 @@ import os
 import time
 import random
 from celery import Celery
-from celery.signals import task_postrun
+from kombu import Queue
+from celery.signals import task_postrun, worker_process_init, worker_process_shutdown
 from celery.utils.log import get_task_logger
 
 from config import settings
@@ -25,7 +26,97 @@ celery.conf.update(
     timezone="UTC",
     enable_utc=True,
     broker_connection_retry_on_startup=True,
+    # Honour per-message priorities (the full markdown conversion is queued
+    # behind metadata extraction); with Redis 0 is the highest priority
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
+    worker_prefetch_multiplier=1,
+    # Each ingestion stage has its own queue so workers can be sized per kind
+    # of work (see WORKER_PROFILES)
+    task_routes={
+        "tasks.pdf_tasks.extract_front_matter_task": {"queue": "pdf_cpu"},
+        "tasks.pdf_tasks.convert_pdf_markdown_task": {"queue": "pdf_cpu"},
+        "tasks.pdf_tasks.ingest_pdf_backlog_task": {"queue": "pdf_cpu"},
+        "tasks.pdf_tasks.extract_metadata_task": {"queue": "llm_io"},
+        "tasks.pdf_tasks.persist_paper_task": {"queue": "db_io"},
+        "tasks.requirements_tasks.chunk_paper_task": {"queue": "pdf_cpu"},
+        "tasks.requirements_tasks.extract_chunk_requirements_task": {"queue": "llm_io"},
+        "tasks.requirements_tasks.aggregate_requirements_task": {"queue": "db_io"},
+        "tasks.knowledge_tasks.ingest_knowledge_base_task": {"queue": "llm_io"},
+        "tasks.vector_tasks.build_vector_index_task": {"queue": "db_io"},
+    },
 )
 
+# Worker settings per queue, selected with CELERY_WORKER_PROFILE:
+# - pdf_cpu: pymupdf conversions, one prefork process per core
+# - llm_io: LLM calls that mostly wait on the network, many threads
+# - db_io: short database writes, plus the default queue for everything else
+# The thread pools can be swapped for gevent by starting the worker with
+# `-P gevent` (which also monkey-patches the process).
+WORKER_PROFILES = {
+    "pdf_cpu": {
+        "queues": ["pdf_cpu"],
+        "pool": "prefork",
+        "concurrency": os.cpu_count() or 1,
+        "prefetch_multiplier": 1,
+    },
+    "llm_io": {
+        "queues": ["llm_io"],
+        "pool": "threads",
+        "concurrency": 32,
+        "prefetch_multiplier": 4,
+    },
+    "db_io": {
+        "queues": ["db_io", "celery"],
+        "pool": "threads",
+        "concurrency": 8,
+        "prefetch_multiplier": 4,
+    },
+}
 
-celery.autodiscover_tasks(["tasks.pdf_tasks", "tasks.tests"])
+if settings.CELERY_WORKER_PROFILE:
+    profile = WORKER_PROFILES[settings.CELERY_WORKER_PROFILE]
+    celery.conf.update(
+        task_queues=[Queue(name) for name in profile["queues"]],
+        worker_pool=profile["pool"],
+        worker_concurrency=profile["concurrency"],
+        worker_prefetch_multiplier=profile["prefetch_multiplier"],
+    )
+else:
+    # Without a profile a worker consumes every queue, with the default pool
+    celery.conf.update(
+        task_queues=[
+            Queue(name)
+            for profile in WORKER_PROFILES.values()
+            for name in profile["queues"]
+        ],
+    )
+
+
+@worker_process_init.connect
+def init_worker_db_pools(**kwargs):
+    # Each prefork child opens its own pools after the fork
+    from db.conn import init_db_pools
+
+    init_db_pools()
+
+
+@worker_process_shutdown.connect
+def close_worker_db_pools(**kwargs):
+    from db.conn import close_db_pools
+
+    close_db_pools()
+
+
+celery.autodiscover_tasks(
+    [
+        "tasks.pdf_tasks",
+        "tasks.requirements_tasks",
+        "tasks.knowledge_tasks",
+        "tasks.vector_tasks",
+        "tasks.tests",
+    ]
+)
@@ -1,7 +1,16 @@
 import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
 import psycopg2
+from psycopg2 import pool as psycopg2_pool
 from psycopg2.extras import RealDictCursor
-from typing import Generator
+from typing import Any, Dict, Generator, Iterator
+
+from config import settings
+
+logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 # Read database URLs from environment variables defined in docker-compose.yml
@@ -14,23 +23,239 @@ if not STANDARD_DATABASE_URL:
 if not VECTOR_DATABASE_URL:
     raise ValueError("VECTOR_DATABASE_URL environment variable not set.")
 
+
+# --- Connection Pooling ---
+
+
+class PoolTimeout(psycopg2_pool.PoolError):
+    """Raised when no pooled connection becomes free within the pool timeout."""
+
+
+class PooledDatabase:
+    """
+    A thread-safe psycopg2 connection pool for one database.
+
+    Unlike ThreadedConnectionPool on its own, checkouts block (up to
+    `timeout` seconds) while the pool is exhausted instead of failing
+    immediately, connections that sat idle longer than `healthcheck_after`
+    seconds are pinged before being handed out, and wait times are recorded.
+
+    The pool is opened lazily on first checkout and re-opened if the process
+    has forked since (e.g. Celery prefork children), so it is safe to create
+    at import time and initialise explicitly per process with open().
+    """
+
+    def __init__(
+        self,
+        name: str,
+        dsn: str,
+        min_size: int,
+        max_size: int,
+        timeout: float,
+        healthcheck_after: float,
+    ):
+        self.name = name
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+
+        self._pool = None
+        self._pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._last_used: Dict[int, float] = {}
+        self._reset_metrics()
+
+    def _reset_metrics(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.failed_healthchecks = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def open(self) -> None:
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                return
+            # A pool inherited across fork() shares sockets with the parent;
+            # drop it without closing and start fresh in this process.
+            self._pool = psycopg2_pool.ThreadedConnectionPool(
+                self.min_size, self.max_size, self.dsn
+            )
+            self._pid = os.getpid()
+            self._slots = threading.BoundedSemaphore(self.max_size)
+            self._last_used = {}
+            self._reset_metrics()
+            logger.info(
+                f"Opened {self.name} database pool (min={self.min_size}, max={self.max_size}) in pid {self._pid}"
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.closeall()
+                logger.info(f"Closed {self.name} database pool in pid {self._pid}")
+            self._pool = None
+            self._pid = None
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.healthcheck_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def getconn(self) -> psycopg2.extensions.connection:
+        """
+        Checks a connection out of the pool. Every checkout must be paired with
+        putconn(), preferably through connection().
+        """
+        self.open()
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            self.timeouts += 1
+            raise PoolTimeout(
+                f"No {self.name} database connection available after {self.timeout}s"
+            )
+        waited = time.monotonic() - start
+        self.checkouts += 1
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+        try:
+            conn = self._pool.getconn()
+            # After a database restart every idle connection may be dead, so
+            # keep replacing until a healthy (or freshly opened) one turns up.
+            for _ in range(self.max_size):
+                if self._is_healthy(conn):
+                    break
+                self.failed_healthchecks += 1
+                logger.warning(
+                    f"Discarding unhealthy {self.name} database connection from pool"
+                )
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        return conn
+
+    def putconn(self, conn: psycopg2.extensions.connection) -> None:
+        """Returns a connection to the pool, rolling back any open transaction."""
+        if self._pool is None or self._pid != os.getpid():
+            conn.close()
+            return
+        try:
+            if conn.closed:
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[psycopg2.extensions.connection]:
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def metrics(self) -> Dict[str, Any]:
+        in_use = 0
+        if self._pool is not None and self._pid == os.getpid():
+            in_use = len(self._pool._used)
+        return {
+            "name": self.name,
+            "open": self._pool is not None and self._pid == os.getpid(),
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "in_use": in_use,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "failed_healthchecks": self.failed_healthchecks,
+            "avg_wait_seconds": (
+                self.total_wait_seconds / self.checkouts if self.checkouts else 0.0
+            ),
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+
+standard_pool = PooledDatabase(
+    "standard",
+    STANDARD_DATABASE_URL,
+    min_size=settings.DB_POOL_MIN_SIZE,
+    max_size=settings.DB_POOL_MAX_SIZE,
+    timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    healthcheck_after=settings.DB_POOL_HEALTHCHECK_AFTER_SECONDS,
+)
+
+vector_pool = PooledDatabase(
+    "vector",
+    VECTOR_DATABASE_URL,
+    min_size=settings.DB_POOL_MIN_SIZE,
+    max_size=settings.DB_POOL_MAX_SIZE,
+    timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    healthcheck_after=settings.DB_POOL_HEALTHCHECK_AFTER_SECONDS,
+)
+
+
+def init_db_pools() -> None:
+    """
+    Opens both pools. Called once per API process (FastAPI lifespan) and once
+    per Celery worker process (worker_process_init).
+    """
+    standard_pool.open()
+    vector_pool.open()
+
+
+def close_db_pools() -> None:
+    standard_pool.close()
+    vector_pool.close()
+
+
+def get_db_pool_metrics() -> Dict[str, Dict[str, Any]]:
+    return {
+        "standard": standard_pool.metrics(),
+        "vector": vector_pool.metrics(),
+    }
+
+
 # --- Standard Database Connection ---
 
 
 def get_db_connection():
     """
-    Establishes and returns a connection to the standard PostgreSQL database.
+    Checks out a connection to the standard PostgreSQL database from the pool.
+    Return it with release_db_connection() instead of closing it.
     """
     try:
-        # Connect to the standard database using the URL
-        conn = psycopg2.connect(STANDARD_DATABASE_URL)
-        return conn
+        return standard_pool.getconn()
     except psycopg2.Error as e:
         print(f"Error connecting to standard database: {e}")
         # In a real application, you might want to log this error and handle it more gracefully
         raise
 
 
+def release_db_connection(conn) -> None:
+    """
+    Returns a connection obtained from get_db_connection() to the pool.
+    """
+    standard_pool.putconn(conn)
+
+
 def get_db_cursor(conn) -> psycopg2.extensions.cursor:
     """
     Returns a cursor for the given database connection.
@@ -42,37 +267,25 @@ def get_db_cursor(conn) -> psycopg2.extensions.cursor:
 # Dependency function for standard database connection
 def get_db_conn() -> Generator[psycopg2.extensions.connection, None, None]:
     """
-    FastAPI dependency that provides a connection to the standard database.
-    Ensures the connection is closed after the request.
+    FastAPI dependency that provides a pooled connection to the standard database.
+    Ensures the connection is returned to the pool after the request.
     """
     conn = get_db_connection()
     try:
         yield conn
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 
 # Dependency function for standard database cursor
-def get_db_cursor_dependency(
-    # conn: psycopg2.extensions.connection = Depends(get_db_conn), # Remove Depends here
-) -> Generator[psycopg2.extensions.cursor, None, None]:
+def get_db_cursor_dependency() -> Generator[psycopg2.extensions.cursor, None, None]:
     """
     FastAPI dependency that provides a cursor for the standard database.
-    This function itself should not use Depends in its signature.
-    It's intended to be used WITH Depends in a route.
-    To use this, a route would look like:
+    Manages its own pooled connection, so a route can simply use:
     async def my_route(cursor: psycopg2.extensions.cursor = Depends(get_db_cursor_dependency)):
         pass
-    And FastAPI would first call get_db_conn, then pass its result to this function.
-    However, the typical pattern is to depend on get_db_conn and then get a cursor.
-    Let's simplify this to match common patterns or adjust how it's used.
-
-    A more common pattern for a cursor dependency:
     """
-    conn = get_db_connection()  # Or, if you want to use the get_db_conn generator:
-    # This function would need to be called within a route that
-    # already has a 'conn' from 'Depends(get_db_conn)'
-    # For a standalone cursor dependency that manages its own connection:
+    conn = get_db_connection()
     cursor = None
     try:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
@@ -80,8 +293,7 @@ def get_db_cursor_dependency(
     finally:
         if cursor:
             cursor.close()
-        if conn:  # Ensure conn is closed if this function manages it
-            conn.close()
+        release_db_connection(conn)
 
 
 # --- Vector Database Connection ---
@@ -89,19 +301,25 @@ def get_db_cursor_dependency(
 
 def get_vector_db_connection():
     """
-    Establishes and returns a connection to the pgvector database.
+    Checks out a connection to the pgvector database from the pool.
     The connection method is the same as a regular PostgreSQL database.
+    Return it with release_vector_db_connection() instead of closing it.
     """
     try:
-        # Connect to the vector database using the URL
-        conn = psycopg2.connect(VECTOR_DATABASE_URL)
-        return conn
+        return vector_pool.getconn()
     except psycopg2.Error as e:
         print(f"Error connecting to vector database: {e}")
         # In a real application, you might want to log this error and handle it more gracefully
         raise
 
 
+def release_vector_db_connection(conn) -> None:
+    """
+    Returns a connection obtained from get_vector_db_connection() to the pool.
+    """
+    vector_pool.putconn(conn)
+
+
 def get_vector_db_cursor(conn) -> psycopg2.extensions.cursor:
     """
     Returns a cursor for the given vector database connection.
@@ -113,23 +331,21 @@ def get_vector_db_cursor(conn) -> psycopg2.extensions.cursor:
 # Dependency function for vector database connection
 def get_vector_db_conn() -> Generator[psycopg2.extensions.connection, None, None]:
     """
-    FastAPI dependency that provides a connection to the vector database.
-    Ensures the connection is closed after the request.
+    FastAPI dependency that provides a pooled connection to the vector database.
+    Ensures the connection is returned to the pool after the request.
     """
     conn = get_vector_db_connection()
     try:
         yield conn
     finally:
-        conn.close()
+        release_vector_db_connection(conn)
 
 
 # Dependency function for vector database cursor
-def get_vector_db_cursor_dependency(
-    # conn: psycopg2.extensions.connection = Depends(get_vector_db_conn), # Remove Depends here
-) -> Generator[psycopg2.extensions.cursor, None, None]:
+def get_vector_db_cursor_dependency() -> Generator[psycopg2.extensions.cursor, None, None]:
     """
     FastAPI dependency that provides a cursor for the vector database.
-    Manages its own connection for simplicity as a direct dependency.
+    Manages its own pooled connection for simplicity as a direct dependency.
     """
     conn = get_vector_db_connection()
     cursor = None
@@ -139,8 +355,22 @@ def get_vector_db_cursor_dependency(
     finally:
         if cursor:
             cursor.close()
-        if conn:
-            conn.close()
+        release_vector_db_connection(conn)
+
+
+@contextmanager
+def engine_connection(engine) -> Iterator[psycopg2.extensions.connection]:
+    """
+    Checks out the psycopg2 connection behind a SQLAlchemy engine's pool,
+    such as an agno PgVector's db_engine, so raw SQL on a PgVector table
+    reaches the database its db_url points at. Returned to the engine's
+    pool on exit.
+    """
+    pooled = engine.raw_connection()
+    try:
+        yield pooled.driver_connection
+    finally:
+        pooled.close()
 
 
 # --- How to use in FastAPI Endpoints ---
@@ -202,14 +432,14 @@ def get_vector_db_cursor_dependency(
 # @router.get("/vector_search/")
 # def search_vector_data(query_vector: List[float], vector_db_cursor: Psycopg2Cursor = Depends(get_vector_db_cursor_dependency)):
 #     try:
-#         # Example of a vector similarity search using the '<=>' operator (cosine distance)
-#         # The query vector also needs to be represented as a string
-#         query_vector_str = str(query_vector)
-#         vector_db_cursor.execute(
-#             "SELECT id, name, vector_embedding, vector_embedding <=> %s AS distance FROM vector_items ORDER BY distance LIMIT 10;",
-#             (query_vector_str,)
+#         # Example of a vector similarity search using the '<=>' operator (cosine distance).
+#         # Without an ANN index this is a sequential scan over the whole table: create one
+#         # with POST /vector_indexes/{table} and tune recall per query with hnsw.ef_search /
+#         # ivfflat.probes (see db.vector_index.vector_search).
+#         results = vector_search(
+#             vector_db_cursor, None, "vector_items", query_vector, k=10,
+#             column="vector_embedding", ef_search=40,
 #         )
-#         results = vector_db_cursor.fetchall()
 #         return results
 #     except psycopg2.Error as e:
 #         raise HTTPException(status_code=500, detail=f"Vector database search error: {e}")
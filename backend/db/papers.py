@@ -0,0 +1,143 @@
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from psycopg2.extras import execute_values
+
+from db.conn import get_db_connection, get_db_cursor, release_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+def find_paper_by_content_hash(content_sha256: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the paper row whose PDF content hashes to `content_sha256`, or None.
+    """
+    conn = get_db_connection()
+    cursor = None
+    try:
+        cursor = get_db_cursor(conn)
+        cursor.execute(
+            "SELECT uuid, title, original_file_path FROM papers WHERE content_sha256 = %s;",
+            (content_sha256,),
+        )
+        return cursor.fetchone()
+    finally:
+        if cursor:
+            cursor.close()
+        release_db_connection(conn)
+
+
+def find_paper_by_uuid(paper_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the paper row with uuid `paper_id`, or None.
+    """
+    conn = get_db_connection()
+    cursor = None
+    try:
+        cursor = get_db_cursor(conn)
+        cursor.execute(
+            "SELECT uuid, title, original_file_path FROM papers WHERE uuid = %s;",
+            (paper_id,),
+        )
+        return cursor.fetchone()
+    finally:
+        if cursor:
+            cursor.close()
+        release_db_connection(conn)
+
+
+def clean_author_names(author_names: Any, file_path: str) -> List[str]:
+    """
+    Strips author names and drops anything that is not a non-empty string,
+    keeping the first occurrence of each name.
+    """
+    if not isinstance(author_names, list):
+        logger.warning(
+            f"Authors data for {file_path} is not a list: {author_names}. Skipping author insertion."
+        )
+        return []
+
+    cleaned = []
+    for author_name in author_names:
+        if not isinstance(author_name, str) or not author_name.strip():
+            logger.warning(
+                f"Invalid or empty author name found: '{author_name}'. Skipping."
+            )
+            continue
+        if author_name.strip() not in cleaned:
+            cleaned.append(author_name.strip())
+    return cleaned
+
+
+INSERT_PAPERS_QUERY = """
+INSERT INTO papers (uuid, title, original_file_path, content_sha256)
+VALUES %s
+ON CONFLICT DO NOTHING
+RETURNING uuid;
+"""
+
+# Upserts every author and links them to their papers in one round trip.
+# Names are inserted in sorted order so concurrent workers lock author rows
+# in the same order and cannot deadlock each other.
+LINK_AUTHORS_QUERY = """
+WITH input AS (
+    SELECT * FROM unnest(%s::text[], %s::text[]) AS t(paper_id, name)
+),
+upserted AS (
+    INSERT INTO authors (name)
+    SELECT DISTINCT name FROM input ORDER BY name
+    ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+    RETURNING id, name
+)
+INSERT INTO paper_authors (paper_id, author_id)
+SELECT DISTINCT input.paper_id, upserted.id
+FROM input JOIN upserted ON upserted.name = input.name
+ON CONFLICT (paper_id, author_id) DO NOTHING;
+"""
+
+
+def persist_papers(cursor, papers: Iterable[Dict[str, Any]]) -> List[str]:
+    """
+    Inserts papers and their authors with a constant number of statements,
+    no matter how many papers or authors there are. The caller owns the
+    transaction, so several papers can be committed together.
+
+    Each paper is a dict with `uuid`, `title`, `original_file_path`,
+    `content_sha256` and a list of cleaned `authors`. Papers whose uuid or
+    content hash already exists are skipped. Returns the inserted uuids.
+    """
+    papers = list(papers)
+    if not papers:
+        return []
+
+    rows = [
+        (
+            paper["uuid"],
+            paper.get("title"),
+            paper.get("original_file_path"),
+            paper.get("content_sha256"),
+        )
+        for paper in papers
+    ]
+    inserted = execute_values(
+        cursor, INSERT_PAPERS_QUERY, rows, page_size=len(rows), fetch=True
+    )
+    inserted_ids = [row[0] for row in inserted]
+
+    inserted_set = set(inserted_ids)
+    link_paper_ids = []
+    link_names = []
+    for paper in papers:
+        if paper["uuid"] not in inserted_set:
+            continue
+        for author_name in paper.get("authors", []):
+            link_paper_ids.append(paper["uuid"])
+            link_names.append(author_name)
+
+    if link_names:
+        cursor.execute(LINK_AUTHORS_QUERY, (link_paper_ids, link_names))
+
+    logger.info(
+        f"persist_papers: inserted {len(inserted_ids)}/{len(papers)} papers with {len(link_names)} author links"
+    )
+    return inserted_ids
@@ -0,0 +1,32 @@
+import redis
+import redis.asyncio as aioredis
+
+from config import settings
+
+# --- Redis Clients ---
+# One client per process; redis-py keeps its own connection pool internally.
+
+_redis_client = None
+_async_redis_client = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Returns the shared synchronous Redis client (used from Celery tasks).
+    """
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _redis_client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """
+    Returns the shared asyncio Redis client (used from FastAPI handlers).
+    """
+    global _async_redis_client
+    if _async_redis_client is None:
+        _async_redis_client = aioredis.Redis.from_url(
+            settings.REDIS_URL, decode_responses=True
+        )
+    return _async_redis_client
@@ -0,0 +1,32 @@
+import logging
+from typing import List, Tuple
+
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+INSERT_REQUIREMENTS_QUERY = """
+INSERT INTO paper_requirements (paper_id, job_id, position, chunk_index, requirement)
+VALUES %s;
+"""
+
+
+def replace_paper_requirements(
+    cursor, paper_id: str, job_id: str, requirements: List[Tuple[int, str]]
+) -> int:
+    """
+    Replaces the requirements list of a paper with `requirements`, given as
+    (chunk_index, requirement) pairs in document order. The caller owns the
+    transaction. Returns the number of requirements stored.
+    """
+    cursor.execute("DELETE FROM paper_requirements WHERE paper_id = %s;", (paper_id,))
+    rows = [
+        (paper_id, job_id, position, chunk_index, requirement)
+        for position, (chunk_index, requirement) in enumerate(requirements)
+    ]
+    if rows:
+        execute_values(cursor, INSERT_REQUIREMENTS_QUERY, rows, page_size=1000)
+    logger.info(
+        f"replace_paper_requirements: stored {len(rows)} requirements for paper {paper_id} (job {job_id})"
+    )
+    return len(rows)
@@ -0,0 +1,282 @@
+import hashlib
+import logging
+import weakref
+from typing import Any, Dict, List, Optional, Sequence
+
+from psycopg2 import errors, sql
+
+from db.vector_index import _identifier, vector_to_literal
+
+logger = logging.getLogger(__name__)
+
+# Text search configuration of every stored tsvector column
+SEARCH_LANGUAGE = "english"
+# Stored tsvector column added to PgVector tables by ensure_chunk_search_column
+CHUNK_TSV_COLUMN = "content_tsv"
+
+
+def ensure_chunk_search_column(conn, schema: Optional[str], table_name: str) -> bool:
+    """
+    Adds a stored, generated tsvector of `content` and a GIN index on it to a
+    PgVector table, so keyword ranking doesn't re-parse every matching chunk
+    per query. PgVector and COPY writes don't name the column, so they keep
+    working unchanged. Adding the column rewrites the table once; the index
+    is built CONCURRENTLY. Returns True if the column was added.
+
+    Needs its own connection (switched to autocommit and back).
+    """
+    table = _identifier(schema, table_name)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = COALESCE(%s, current_schema())
+                  AND table_name = %s AND column_name = %s;
+                """,
+                (schema, table_name, CHUNK_TSV_COLUMN),
+            )
+            added = cursor.fetchone() is None
+            if added:
+                cursor.execute(
+                    sql.SQL(
+                        "ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} tsvector "
+                        "GENERATED ALWAYS AS (to_tsvector({language}, coalesce(content, ''))) STORED;"
+                    ).format(
+                        table=table,
+                        column=sql.Identifier(CHUNK_TSV_COLUMN),
+                        language=sql.Literal(SEARCH_LANGUAGE),
+                    )
+                )
+            cursor.execute(
+                sql.SQL(
+                    "CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table} USING gin ({column});"
+                ).format(
+                    index=sql.Identifier(f"{table_name}_{CHUNK_TSV_COLUMN}_idx"),
+                    table=table,
+                    column=sql.Identifier(CHUNK_TSV_COLUMN),
+                )
+            )
+    finally:
+        conn.autocommit = False
+    if added:
+        logger.info(
+            f"ensure_chunk_search_column: added {CHUNK_TSV_COLUMN} to {schema}.{table_name}"
+        )
+    return added
+
+
+class PreparedStatement:
+    """
+    A server-side prepared statement, PREPAREd lazily once per pooled
+    connection and then run with EXECUTE, so hot queries skip parsing and
+    planning. `query` is composed SQL using $1..$n placeholders.
+    """
+
+    def __init__(self, name: str, param_types: Sequence[str], query: sql.Composable):
+        self.name = name
+        self.param_types = tuple(param_types)
+        self.query = query
+        # Connections this statement has been prepared on
+        self._prepared = weakref.WeakSet()
+
+    def _prepare(self, cursor) -> None:
+        cursor.execute(
+            sql.SQL("PREPARE {} ({}) AS ").format(
+                sql.Identifier(self.name),
+                sql.SQL(", ").join(map(sql.SQL, self.param_types)),
+            )
+            + self.query
+        )
+        self._prepared.add(cursor.connection)
+
+    def execute(self, cursor, params: Sequence[Any], setup: str = "") -> None:
+        """
+        EXECUTEs the statement with `params`. `setup` (e.g. SET LOCAL
+        statements) is sent in the same round trip.
+        """
+        conn = cursor.connection
+        if conn not in self._prepared:
+            self._prepare(cursor)
+        statement = sql.SQL("{}EXECUTE {} ({});").format(
+            sql.SQL(setup),
+            sql.Identifier(self.name),
+            sql.SQL(", ").join(sql.Placeholder() * len(params)),
+        )
+        try:
+            cursor.execute(statement, params)
+        except errors.InvalidSqlStatementName:
+            # The session lost its prepared statements (e.g. DISCARD ALL)
+            conn.rollback()
+            self._prepare(cursor)
+            cursor.execute(statement, params)
+
+
+# Top `candidates` chunks by vector distance and by keyword rank, fused with
+# reciprocal rank fusion: score = sum(weight / (rrf_k + rank)). Only the
+# fused top `limit` rows are joined back for their content.
+# $1 query vector, $2 query text, $3 candidates, $4 rrf_k, $5 limit,
+# $6 semantic weight, $7 keyword weight
+HYBRID_CHUNKS_QUERY = """
+WITH semantic AS (
+    SELECT id, row_number() OVER (ORDER BY distance) AS rank
+    FROM (
+        SELECT id, embedding <=> $1 AS distance FROM {table}
+        ORDER BY embedding <=> $1
+        LIMIT $3
+    ) nearest
+),
+keyword AS (
+    SELECT id, row_number() OVER (ORDER BY score DESC) AS rank
+    FROM (
+        SELECT id, ts_rank_cd({tsv}, query) AS score
+        FROM {table}, websearch_to_tsquery({language}, $2) query
+        WHERE {tsv} @@ query
+        ORDER BY score DESC
+        LIMIT $3
+    ) matches
+),
+fused AS (
+    SELECT COALESCE(s.id, k.id) AS id,
+           COALESCE($6 / ($4 + s.rank), 0)
+               + COALESCE($7 / ($4 + k.rank), 0) AS score,
+           s.rank AS semantic_rank, k.rank AS keyword_rank
+    FROM semantic s FULL OUTER JOIN keyword k ON k.id = s.id
+    ORDER BY score DESC
+    LIMIT $5
+)
+SELECT f.id, t.name, t.content, t.meta_data, f.score, f.semantic_rank, f.keyword_rank
+FROM fused f JOIN {table} t ON t.id = f.id
+ORDER BY f.score DESC
+"""
+
+# The same fusion over papers: title matches and papers ranked by their
+# best-matching extracted requirement.
+# $1 query text, $2 candidates, $3 rrf_k, $4 limit
+HYBRID_PAPERS_QUERY = """
+WITH query AS (
+    SELECT websearch_to_tsquery({language}, $1) AS q
+),
+title AS (
+    SELECT paper_id, row_number() OVER (ORDER BY score DESC) AS rank
+    FROM (
+        SELECT p.uuid AS paper_id, ts_rank_cd(p.search_tsv, query.q) AS score
+        FROM papers p, query
+        WHERE p.search_tsv @@ query.q
+        ORDER BY score DESC
+        LIMIT $2
+    ) matches
+),
+requirement AS (
+    SELECT paper_id, row_number() OVER (ORDER BY score DESC) AS rank
+    FROM (
+        SELECT r.paper_id, max(ts_rank_cd(r.search_tsv, query.q)) AS score
+        FROM paper_requirements r, query
+        WHERE r.search_tsv @@ query.q
+        GROUP BY r.paper_id
+        ORDER BY score DESC
+        LIMIT $2
+    ) matches
+),
+fused AS (
+    SELECT COALESCE(t.paper_id, r.paper_id) AS paper_id,
+           COALESCE(1.0::float8 / ($3 + t.rank), 0)
+               + COALESCE(1.0::float8 / ($3 + r.rank), 0) AS score,
+           t.rank AS title_rank, r.rank AS requirement_rank
+    FROM title t FULL OUTER JOIN requirement r ON r.paper_id = t.paper_id
+    ORDER BY score DESC
+    LIMIT $4
+)
+SELECT f.paper_id, p.title, f.score, f.title_rank, f.requirement_rank
+FROM fused f JOIN papers p ON p.uuid = f.paper_id
+ORDER BY f.score DESC
+"""
+
+_chunk_statements: Dict[tuple, PreparedStatement] = {}
+
+papers_statement = PreparedStatement(
+    "hybrid_search_papers",
+    ("text", "integer", "integer", "integer"),
+    sql.SQL(HYBRID_PAPERS_QUERY).format(language=sql.Literal(SEARCH_LANGUAGE)),
+)
+
+
+def _chunks_statement(schema: Optional[str], table_name: str) -> PreparedStatement:
+    key = (schema, table_name)
+    if key not in _chunk_statements:
+        digest = hashlib.md5(f"{schema}.{table_name}".encode()).hexdigest()[:12]
+        _chunk_statements[key] = PreparedStatement(
+            f"hybrid_search_chunks_{digest}",
+            ("vector", "text", "integer", "integer", "integer", "float8", "float8"),
+            sql.SQL(HYBRID_CHUNKS_QUERY).format(
+                table=_identifier(schema, table_name),
+                tsv=sql.Identifier(CHUNK_TSV_COLUMN),
+                language=sql.Literal(SEARCH_LANGUAGE),
+            ),
+        )
+    return _chunk_statements[key]
+
+
+def _rows(cursor) -> List[Dict[str, Any]]:
+    columns = [desc[0] for desc in cursor.description]
+    return [
+        dict(row) if isinstance(row, dict) else dict(zip(columns, row))
+        for row in cursor.fetchall()
+    ]
+
+
+def hybrid_search_chunks(
+    cursor,
+    schema: Optional[str],
+    table_name: str,
+    query_vector: Sequence[float],
+    query_text: str,
+    k: int = 10,
+    candidates: int = 100,
+    rrf_k: int = 60,
+    semantic_weight: float = 1.0,
+    keyword_weight: float = 1.0,
+    ef_search: int = None,
+) -> List[Dict[str, Any]]:
+    """
+    The `k` best chunks of a PgVector table for a query, by reciprocal rank
+    fusion of cosine distance (HNSW when indexed) and full-text rank. Each
+    ranker contributes its top `candidates`; hnsw.ef_search defaults to
+    `candidates` so the vector ranker can return that many (pgvector caps it
+    at 1000). Runs in (and ends) its own transaction, in one round trip
+    besides BEGIN/ROLLBACK.
+    """
+    setup = f"SET LOCAL hnsw.ef_search = {min(int(ef_search or candidates), 1000)}; "
+    try:
+        _chunks_statement(schema, table_name).execute(
+            cursor,
+            (
+                vector_to_literal(query_vector),
+                query_text,
+                candidates,
+                rrf_k,
+                k,
+                semantic_weight,
+                keyword_weight,
+            ),
+            setup=setup,
+        )
+        return _rows(cursor)
+    finally:
+        cursor.connection.rollback()
+
+
+def hybrid_search_papers(
+    cursor, query_text: str, k: int = 10, candidates: int = 100, rrf_k: int = 60
+) -> List[Dict[str, Any]]:
+    """
+    The `k` best papers for a query, by reciprocal rank fusion of title and
+    extracted-requirement full-text rank. Runs in (and ends) its own
+    transaction.
+    """
+    try:
+        papers_statement.execute(cursor, (query_text, candidates, rrf_k, k))
+        return _rows(cursor)
+    finally:
+        cursor.connection.rollback()
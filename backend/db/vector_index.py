@@ -0,0 +1,274 @@
+import math
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import psycopg2
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+# pgvector operator classes and distance operators per distance metric
+INDEX_OPS = {
+    "cosine": "vector_cosine_ops",
+    "l2": "vector_l2_ops",
+    "ip": "vector_ip_ops",
+}
+DISTANCE_OPERATORS = {"cosine": "<=>", "l2": "<->", "ip": "<#>"}
+INDEX_METHODS = ("hnsw", "ivfflat")
+
+
+class VectorIndexError(ValueError):
+    """Raised for an unknown table, index method or distance metric."""
+
+
+def split_table_name(table: str):
+    """'schema.table' -> ('schema', 'table'); a bare name has no schema."""
+    schema, _, table_name = table.rpartition(".")
+    return schema or None, table_name
+
+
+def _identifier(schema: Optional[str], name: str) -> sql.Identifier:
+    return sql.Identifier(schema, name) if schema else sql.Identifier(name)
+
+
+def vector_index_name(table_name: str, method: str, column: str = "embedding") -> str:
+    return f"{table_name}_{column}_{method}_idx"
+
+
+def ensure_vector_column(cursor, schema: Optional[str], table_name: str, column: str):
+    """Raises VectorIndexError unless `column` is a vector column of the table."""
+    cursor.execute(
+        """
+        SELECT 1 FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = %s AND n.nspname = COALESCE(%s, current_schema())
+          AND a.attname = %s AND format_type(a.atttypid, NULL) = 'vector'
+          AND NOT a.attisdropped;
+        """,
+        (table_name, schema, column),
+    )
+    if cursor.fetchone() is None:
+        raise VectorIndexError(
+            f"{schema + '.' if schema else ''}{table_name}.{column} is not a vector column"
+        )
+
+
+def default_ivfflat_lists(row_count: int) -> int:
+    """pgvector's guidance: rows / 1000 up to 1M rows, sqrt(rows) above."""
+    if row_count < 1_000_000:
+        return max(row_count // 1000, 1)
+    return max(int(math.sqrt(row_count)), 1)
+
+
+def list_vector_indexes(
+    cursor, schema: Optional[str], table_name: str
+) -> List[Dict[str, Any]]:
+    """HNSW/IVFFlat indexes of a table with their build options and size."""
+    cursor.execute(
+        """
+        SELECT i.relname AS name, am.amname AS method,
+               i.reloptions AS options,
+               pg_relation_size(i.oid) AS size_bytes,
+               ix.indisvalid AS valid,
+               pg_get_indexdef(i.oid) AS definition
+        FROM pg_index ix
+        JOIN pg_class t ON t.oid = ix.indrelid
+        JOIN pg_class i ON i.oid = ix.indexrelid
+        JOIN pg_am am ON am.oid = i.relam
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE t.relname = %s AND n.nspname = COALESCE(%s, current_schema())
+          AND am.amname IN ('hnsw', 'ivfflat')
+        ORDER BY i.relname;
+        """,
+        (table_name, schema),
+    )
+    columns = [desc[0] for desc in cursor.description]
+    return [
+        dict(row) if isinstance(row, dict) else dict(zip(columns, row))
+        for row in cursor.fetchall()
+    ]
+
+
+def build_vector_index(
+    conn,
+    schema: Optional[str],
+    table_name: str,
+    method: str = "hnsw",
+    distance: str = "cosine",
+    column: str = "embedding",
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int = None,
+    maintenance_work_mem: str = None,
+    rebuild: bool = False,
+) -> Dict[str, Any]:
+    """
+    Creates an HNSW or IVFFlat index on a vector column with CREATE INDEX
+    CONCURRENTLY, so the table stays writable meanwhile. With `rebuild`, an
+    existing index of the same method is replaced: the new one is built
+    under a temporary name, then swapped in, so searches keep an index
+    throughout. IVFFlat `lists` defaults to default_ivfflat_lists(rows).
+
+    Needs its own connection (CONCURRENTLY can't run in a transaction); it is
+    switched to autocommit and back.
+    """
+    if method not in INDEX_METHODS:
+        raise VectorIndexError(f"Unknown index method {method!r}")
+    if distance not in INDEX_OPS:
+        raise VectorIndexError(f"Unknown distance {distance!r}")
+
+    table = _identifier(schema, table_name)
+    name = vector_index_name(table_name, method, column)
+
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            ensure_vector_column(cursor, schema, table_name, column)
+            indexes = {
+                index["name"]: index
+                for index in list_vector_indexes(cursor, schema, table_name)
+            }
+            current = indexes.get(name)
+            if current and current["valid"] and not rebuild:
+                return {"index": name, "created": False}
+            build_name = f"{name}_rebuild" if current and rebuild else name
+            if build_name in indexes:
+                # Left invalid by a failed CONCURRENTLY build
+                cursor.execute(
+                    sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {};").format(
+                        _identifier(schema, build_name)
+                    )
+                )
+
+            if maintenance_work_mem:
+                cursor.execute(
+                    "SET maintenance_work_mem = %s;", (maintenance_work_mem,)
+                )
+            if method == "hnsw":
+                options = {"m": m, "ef_construction": ef_construction}
+            else:
+                if lists is None:
+                    cursor.execute(sql.SQL("SELECT count(*) FROM {};").format(table))
+                    lists = default_ivfflat_lists(cursor.fetchone()[0])
+                options = {"lists": lists}
+
+            cursor.execute(
+                sql.SQL(
+                    "CREATE INDEX CONCURRENTLY {index} ON {table} "
+                    "USING {method} ({column} {ops}) WITH ({options});"
+                ).format(
+                    index=sql.Identifier(build_name),
+                    table=table,
+                    method=sql.SQL(method),
+                    column=sql.Identifier(column),
+                    ops=sql.SQL(INDEX_OPS[distance]),
+                    options=sql.SQL(", ").join(
+                        sql.SQL("{} = {}").format(sql.SQL(key), sql.Literal(value))
+                        for key, value in options.items()
+                    ),
+                )
+            )
+            if build_name != name:
+                cursor.execute(
+                    sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {};").format(
+                        _identifier(schema, name)
+                    )
+                )
+                cursor.execute(
+                    sql.SQL("ALTER INDEX {} RENAME TO {};").format(
+                        _identifier(schema, build_name), sql.Identifier(name)
+                    )
+                )
+    finally:
+        if maintenance_work_mem and not conn.closed:
+            # Also after a failed build: the setting is per session, and
+            # the connection goes back to a pool
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("RESET maintenance_work_mem;")
+            except psycopg2.Error as e:
+                logger.warning(
+                    f"build_vector_index: RESET maintenance_work_mem failed: {e}"
+                )
+        conn.autocommit = False
+
+    logger.info(
+        f"build_vector_index: {'rebuilt' if rebuild else 'created'} {name} on {table_name} ({method}, {distance}, {options})"
+    )
+    return {"index": name, "created": True, "method": method, "options": options}
+
+
+def drop_vector_index(conn, schema: Optional[str], index_name: str) -> None:
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {};").format(
+                    _identifier(schema, index_name)
+                )
+            )
+    finally:
+        conn.autocommit = False
+
+
+def set_search_params(
+    cursor, ef_search: int = None, probes: int = None, exact: bool = False
+) -> None:
+    """
+    Sets per-query ANN parameters for the current transaction: hnsw.ef_search
+    (candidate list size, >= k for k results) and ivfflat.probes (lists
+    scanned). `exact` disables index scans, forcing an exact search.
+    """
+    if ef_search is not None:
+        cursor.execute("SET LOCAL hnsw.ef_search = %s;", (int(ef_search),))
+    if probes is not None:
+        cursor.execute("SET LOCAL ivfflat.probes = %s;", (int(probes),))
+    if exact:
+        cursor.execute("SET LOCAL enable_indexscan = off;")
+
+
+def vector_to_literal(vector: Sequence[float]) -> str:
+    return "[" + ",".join(repr(float(v)) for v in vector) + "]"
+
+
+def vector_search(
+    cursor,
+    schema: Optional[str],
+    table_name: str,
+    query_vector: Sequence[float],
+    k: int = 10,
+    distance: str = "cosine",
+    column: str = "embedding",
+    id_column: str = "id",
+    ef_search: int = None,
+    probes: int = None,
+    exact: bool = False,
+) -> List[tuple]:
+    """
+    The `k` nearest rows to `query_vector` as (id, distance) pairs. Uses an
+    ANN index on the column when one matches `distance`, tuned by
+    `ef_search`/`probes`. Runs in (and ends) its own transaction.
+    """
+    if distance not in DISTANCE_OPERATORS:
+        raise VectorIndexError(f"Unknown distance {distance!r}")
+    try:
+        set_search_params(cursor, ef_search, probes, exact)
+        cursor.execute(
+            sql.SQL(
+                "SELECT {id}, {column} {op} %s::vector AS distance FROM {table} "
+                "ORDER BY {column} {op} %s::vector LIMIT %s;"
+            ).format(
+                id=sql.Identifier(id_column),
+                column=sql.Identifier(column),
+                op=sql.SQL(DISTANCE_OPERATORS[distance]),
+                table=_identifier(schema, table_name),
+            ),
+            (vector_to_literal(query_vector), vector_to_literal(query_vector), k),
+        )
+        return [
+            tuple(row.values()) if isinstance(row, dict) else tuple(row)
+            for row in cursor.fetchall()
+        ]
+    finally:
+        cursor.connection.rollback()
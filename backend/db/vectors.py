@@ -0,0 +1,132 @@
+import io
+import json
+import struct
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+# Columns of an agno PgVector table (schema version 1) written by COPY;
+# created_at/updated_at keep their defaults
+VECTOR_COLUMNS = (
+    "id",
+    "name",
+    "meta_data",
+    "filters",
+    "content",
+    "embedding",
+    "usage",
+    "content_hash",
+)
+_JSONB_COLUMNS = {"meta_data", "filters", "usage"}
+
+_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_BINARY_TRAILER = struct.pack(">h", -1)
+_NULL_FIELD = struct.pack(">i", -1)
+
+
+def _binary_field(column: str, value: Any) -> bytes:
+    if value is None:
+        return _NULL_FIELD
+    if column == "embedding":
+        # pgvector's binary format: dimensions, unused, then float4 values
+        data = struct.pack(f">hh{len(value)}f", len(value), 0, *value)
+    elif column in _JSONB_COLUMNS:
+        # jsonb's binary format is a version byte followed by the JSON text
+        data = b"\x01" + json.dumps(value).encode()
+    else:
+        data = value.encode()
+    return struct.pack(">i", len(data)) + data
+
+
+def encode_binary_copy(rows: Iterable[Dict[str, Any]]) -> bytes:
+    """Encodes rows keyed by VECTOR_COLUMNS as a COPY ... (FORMAT binary) stream."""
+    out = io.BytesIO()
+    out.write(_BINARY_HEADER)
+    field_count = struct.pack(">h", len(VECTOR_COLUMNS))
+    for row in rows:
+        out.write(field_count)
+        for column in VECTOR_COLUMNS:
+            out.write(_binary_field(column, row.get(column)))
+    out.write(_BINARY_TRAILER)
+    return out.getvalue()
+
+
+_TEXT_ESCAPES = str.maketrans(
+    {"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t", "\x00": ""}
+)
+
+
+def _text_field(column: str, value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if column == "embedding":
+        value = "[" + ",".join(repr(float(v)) for v in value) + "]"
+    elif column in _JSONB_COLUMNS:
+        value = json.dumps(value)
+    return value.translate(_TEXT_ESCAPES)
+
+
+def encode_text_copy(rows: Iterable[Dict[str, Any]]) -> bytes:
+    """Encodes rows keyed by VECTOR_COLUMNS as a COPY ... (FORMAT text) stream."""
+    lines = (
+        "\t".join(_text_field(column, row.get(column)) for column in VECTOR_COLUMNS)
+        for row in rows
+    )
+    return "".join(line + "\n" for line in lines).encode()
+
+
+def copy_upsert_vectors(
+    cursor,
+    schema: Optional[str],
+    table_name: str,
+    rows: List[Dict[str, Any]],
+    binary=True,
+) -> int:
+    """
+    Bulk-loads rows into a PgVector table: COPY into a temporary staging
+    table, then one INSERT ... ON CONFLICT (id) DO UPDATE into the target.
+    The caller owns the transaction. Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    target = (
+        sql.Identifier(schema, table_name) if schema else sql.Identifier(table_name)
+    )
+    columns = sql.SQL(", ").join(map(sql.Identifier, VECTOR_COLUMNS))
+    updates = sql.SQL(", ").join(
+        sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column))
+        for column in VECTOR_COLUMNS
+        if column != "id"
+    )
+
+    cursor.execute(
+        sql.SQL(
+            "CREATE TEMP TABLE vector_copy_stage (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP;"
+        ).format(target)
+    )
+    if binary:
+        payload = encode_binary_copy(rows)
+        copy_format = sql.SQL("binary")
+    else:
+        payload = encode_text_copy(rows)
+        copy_format = sql.SQL("text")
+    cursor.copy_expert(
+        sql.SQL("COPY vector_copy_stage ({}) FROM STDIN WITH (FORMAT {});")
+        .format(columns, copy_format)
+        .as_string(cursor),
+        io.BytesIO(payload),
+    )
+    cursor.execute(
+        sql.SQL(
+            "INSERT INTO {target} ({columns}) "
+            "SELECT DISTINCT ON (id) {columns} FROM vector_copy_stage "
+            "ON CONFLICT (id) DO UPDATE SET {updates}, updated_at = now();"
+        ).format(target=target, columns=columns, updates=updates)
+    )
+    logger.info(
+        f"copy_upsert_vectors: wrote {len(rows)} rows to {schema}.{table_name} ({'binary' if binary else 'text'} COPY)"
+    )
+    return len(rows)
@@ -0,0 +1,94 @@
+import time
+import random
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP statuses that mean "slow down / try again", as opposed to bad requests
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """
+    Exponential backoff with full jitter: a random delay in
+    [0, min(cap, base * 2**attempt)] seconds, `attempt` starting at 0.
+    """
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+def error_status_code(exc: BaseException) -> Optional[int]:
+    """HTTP status of an openai/httpx style error, or None if it has none."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    return error_status_code(exc) in RETRYABLE_STATUS_CODES
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Value of the Retry-After header on an error response, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class SharedBackoff:
+    """
+    A cool-down shared by every coroutine calling the same provider.
+
+    When one call is throttled (429) or the provider errors (5xx), all
+    callers pause until the cool-down expires instead of each retrying on
+    its own schedule, so raising concurrency doesn't become a retry storm.
+    """
+
+    def __init__(self, base: float = 1.0, cap: float = 60.0):
+        self.base = base
+        self.cap = cap
+        self._resume_at = 0.0
+        self.throttled = 0
+
+    def trip(self, attempt: int, exc: BaseException) -> float:
+        delay = retry_after_seconds(exc)
+        if delay is None:
+            delay = backoff_delay(attempt, self.base, self.cap)
+        self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        self.throttled += 1
+        return delay
+
+    async def wait(self) -> None:
+        while (remaining := self._resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(remaining)
+
+
+async def call_with_backoff(
+    call: Callable[[], Awaitable[T]],
+    gate: SharedBackoff,
+    max_attempts: int = 5,
+) -> T:
+    """
+    Awaits `call()`, retrying retryable (429/5xx) errors after the shared
+    cool-down. Other errors, and the last retryable one, are raised.
+    """
+    for attempt in range(max_attempts):
+        await gate.wait()
+        try:
+            return await call()
+        except Exception as e:
+            if not is_retryable_error(e) or attempt == max_attempts - 1:
+                raise
+            delay = gate.trip(attempt, e)
+            logger.warning(
+                f"call_with_backoff: status {error_status_code(e)} on attempt {attempt + 1}/{max_attempts}, backing off {delay:.1f}s"
+            )
+    raise RuntimeError("call_with_backoff: max_attempts must be at least 1")
@@ -0,0 +1,296 @@
+"""
+Bulk embedding of knowledge base chunks.
+
+Chunks are embedded EMBEDDING_BATCH_SIZE texts per embedding request, with
+up to EMBEDDING_CONCURRENCY requests in flight (throttling backs every
+request off together, see SharedBackoff). Embedded chunks are bulk-loaded in
+windows of EMBEDDING_WRITE_ROWS with COPY (binary format unless
+EMBEDDING_COPY_BINARY is off, or the server rejects it). Each window's COPY
+overlaps with the next window's embedding requests.
+
+HashEmbedder is a deterministic, local stand-in for the OpenAI embedder,
+selected with EMBEDDING_BACKEND=hash, for tests and benchmarks.
+"""
+
+import re
+import time
+import math
+import asyncio
+import hashlib
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import psycopg2
+from agno.document import Document
+from agno.embedder.base import Embedder
+from agno.embedder.openai import OpenAIEmbedder
+
+from config import settings
+from db.vectors import copy_upsert_vectors
+from helper_functions.backoff import SharedBackoff, call_with_backoff
+from helper_functions.llm_gateway import openai_client
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+
+
+@dataclass
+class HashEmbedder(Embedder):
+    """
+    Feature-hashing embedder: each word adds +-1 to a dimension picked by its
+    BLAKE2 hash, and the result is L2-normalised. Deterministic across
+    processes, needs no network, and texts sharing words score as similar.
+    """
+
+    dimensions: int = 1536
+
+    def get_embedding(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in _TOKEN.findall(text.lower()):
+            digest = int.from_bytes(
+                hashlib.blake2b(token.encode(), digest_size=8).digest(), "big"
+            )
+            vector[digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def get_embedding_and_usage(self, text: str):
+        return self.get_embedding(text), None
+
+    def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        return [self.get_embedding(text) for text in texts]
+
+
+def build_embedder() -> Embedder:
+    """The embedder selected by EMBEDDING_BACKEND."""
+    if settings.EMBEDDING_BACKEND == "hash":
+        return HashEmbedder(dimensions=settings.EMBEDDING_DIMENSIONS)
+    return OpenAIEmbedder(
+        dimensions=settings.EMBEDDING_DIMENSIONS, openai_client=openai_client("openai")
+    )
+
+
+def embed_batch(embedder: Embedder, texts: Sequence[str]) -> List[List[float]]:
+    """
+    Embeds `texts` with as few requests as `embedder` allows: one for the
+    OpenAI embedder, one call per text for embedders without a batch API.
+    """
+    if hasattr(embedder, "embed_batch"):
+        return embedder.embed_batch(texts)
+    if isinstance(embedder, OpenAIEmbedder):
+        response = embedder.response(list(texts))
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+    return [embedder.get_embedding(text) for text in texts]
+
+
+async def embed_texts(
+    embedder: Embedder,
+    texts: Sequence[str],
+    batch_size: int,
+    semaphore: asyncio.Semaphore,
+    gate: SharedBackoff,
+) -> List[List[float]]:
+    """Embeds `texts` in concurrent batches, keeping their order."""
+
+    async def embed_one_batch(batch: Sequence[str]) -> List[List[float]]:
+        async with semaphore:
+            return await call_with_backoff(
+                lambda: asyncio.to_thread(embed_batch, embedder, batch),
+                gate,
+                max_attempts=settings.LLM_MAX_ATTEMPTS,
+            )
+
+    batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+    results = await asyncio.gather(*(embed_one_batch(batch) for batch in batches))
+    return [embedding for batch in results for embedding in batch]
+
+
+def chunk_content_hash(content: str) -> str:
+    """The content hash PgVector stores for a chunk (see PgVector.insert)."""
+    return hashlib.md5(clean_chunk_content(content).encode()).hexdigest()
+
+
+def clean_chunk_content(content: str) -> str:
+    # PostgreSQL text can't hold NUL; PgVector substitutes U+FFFD
+    return content.replace("\x00", "\ufffd")
+
+
+def vector_rows(
+    documents: Sequence[Document], embeddings: Sequence[List[float]]
+) -> List[Dict[str, Any]]:
+    """Shapes embedded chunks into PgVector rows (see PgVector.upsert)."""
+    rows = []
+    for document, embedding in zip(documents, embeddings):
+        content = clean_chunk_content(document.content)
+        content_hash = chunk_content_hash(content)
+        rows.append(
+            {
+                "id": document.id or content_hash,
+                "name": document.name,
+                "meta_data": document.meta_data or {},
+                "filters": None,
+                "content": content,
+                "embedding": embedding,
+                "usage": document.usage,
+                "content_hash": content_hash,
+            }
+        )
+    return rows
+
+
+class VectorCopyWriter:
+    """
+    Writes row windows to one PgVector table with copy_upsert_vectors,
+    through `db_engine` (the PgVector's own engine) if given, else the
+    vector database pool (VECTOR_DATABASE_URL).
+    """
+
+    def __init__(
+        self,
+        schema: Optional[str],
+        table_name: str,
+        binary: bool = True,
+        db_engine=None,
+    ):
+        self.schema = schema
+        self.table_name = table_name
+        self.binary = binary
+        self.db_engine = db_engine
+
+    @contextmanager
+    def _connection(self):
+        from db.conn import (
+            engine_connection,
+            get_vector_db_connection,
+            release_vector_db_connection,
+        )
+
+        if self.db_engine is not None:
+            with engine_connection(self.db_engine) as conn:
+                yield conn
+            return
+        conn = get_vector_db_connection()
+        try:
+            yield conn
+        finally:
+            release_vector_db_connection(conn)
+
+    def write(self, rows: List[Dict[str, Any]]) -> int:
+        with self._connection() as conn:
+            return self._write(conn, rows)
+
+    def _write(self, conn, rows: List[Dict[str, Any]]) -> int:
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            try:
+                written = copy_upsert_vectors(
+                    cursor, self.schema, self.table_name, rows, self.binary
+                )
+            except psycopg2.Error as e:
+                if not self.binary:
+                    raise
+                # e.g. a pgvector build without binary I/O: use text from now on
+                logger.warning(
+                    f"VectorCopyWriter: binary COPY failed, falling back to text: {e}"
+                )
+                conn.rollback()
+                self.binary = False
+                written = copy_upsert_vectors(
+                    cursor, self.schema, self.table_name, rows, self.binary
+                )
+            conn.commit()
+            return written
+        except psycopg2.Error:
+            conn.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+
+
+async def aembed_and_load(
+    documents: Sequence[Document],
+    embedder: Embedder,
+    writer: VectorCopyWriter,
+    batch_size: int = None,
+    concurrency: int = None,
+    window_rows: int = None,
+) -> Dict[str, Any]:
+    """
+    Embeds and bulk-loads `documents`, one window of rows at a time. Returns
+    the number of chunks written and the throughput in chunks/sec.
+    """
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    concurrency = concurrency or settings.EMBEDDING_CONCURRENCY
+    window_rows = window_rows or settings.EMBEDDING_WRITE_ROWS
+    semaphore = asyncio.Semaphore(concurrency)
+    gate = SharedBackoff(
+        settings.LLM_BACKOFF_BASE_SECONDS, settings.LLM_BACKOFF_MAX_SECONDS
+    )
+
+    started = time.perf_counter()
+    embed_seconds = 0.0
+    copy_seconds = 0.0
+    written = 0
+    pending_copy = None
+
+    async def timed_write(rows):
+        copy_started = time.perf_counter()
+        count = await asyncio.to_thread(writer.write, rows)
+        return count, time.perf_counter() - copy_started
+
+    for start in range(0, len(documents), window_rows):
+        window = documents[start : start + window_rows]
+        embed_started = time.perf_counter()
+        embeddings = await embed_texts(
+            embedder, [doc.content for doc in window], batch_size, semaphore, gate
+        )
+        embed_seconds += time.perf_counter() - embed_started
+
+        if pending_copy is not None:
+            count, seconds = await pending_copy
+            written += count
+            copy_seconds += seconds
+        pending_copy = asyncio.create_task(timed_write(vector_rows(window, embeddings)))
+
+    if pending_copy is not None:
+        count, seconds = await pending_copy
+        written += count
+        copy_seconds += seconds
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "chunks": written,
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(written / elapsed, 1) if elapsed else 0.0,
+        "embed_seconds": round(embed_seconds, 3),
+        "copy_seconds": round(copy_seconds, 3),
+        "binary_copy": writer.binary,
+        "throttled": gate.throttled,
+    }
+    logger.info(
+        f"aembed_and_load: {written} chunks in {elapsed:.1f}s ({stats['chunks_per_sec']} chunks/sec)"
+    )
+    return stats
+
+
+def embed_and_load(
+    documents: Sequence[Document], vector_db, **options: Any
+) -> Dict[str, Any]:
+    """
+    aembed_and_load into an agno PgVector table with its own embedder, for
+    synchronous callers such as Celery tasks.
+    """
+    writer = VectorCopyWriter(
+        vector_db.schema,
+        vector_db.table_name,
+        settings.EMBEDDING_COPY_BINARY,
+        db_engine=vector_db.db_engine,
+    )
+    return asyncio.run(
+        aembed_and_load(documents, vector_db.embedder, writer, **options)
+    )
@@ -0,0 +1,204 @@
+"""
+The agentic-chunking knowledge base, built once per process and filled by a
+background job instead of on the request path.
+
+Ingestion is incremental. A source whose PDF bytes hash the same as at its
+last ingestion is skipped without being chunked or embedded. For a changed
+source, each chunk is identified by the same content hash PgVector stores,
+so only chunks that aren't in the table yet are embedded and bulk-loaded
+(see embedding_writer), and chunks the source no longer produces are
+deleted.
+"""
+
+import hashlib
+import logging
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+import redis
+from agno.agent import Agent as AgnoAgent
+from agno.document.chunking.agentic import AgenticChunking
+from agno.document.reader.pdf_reader import PDFReader
+from agno.knowledge.pdf_url import PDFUrlKnowledgeBase
+from agno.utils.http import fetch_with_retry
+from agno.vectordb.pgvector import PgVector
+from sqlalchemy import delete, select
+
+from config import settings
+from db.redis_conn import get_redis
+from db.search import ensure_chunk_search_column
+from helper_functions.embedding_writer import (
+    build_embedder,
+    chunk_content_hash,
+    embed_and_load,
+)
+from helper_functions.llm_gateway import GatewayOpenAIChat
+
+logger = logging.getLogger(__name__)
+
+# Redis key holding the SHA-256 of a source PDF as of its last ingestion
+KNOWLEDGE_SOURCE_KEY = "knowledge_source:{}:{}"
+
+_knowledge_base: Optional[PDFUrlKnowledgeBase] = None
+
+
+def get_knowledge_base() -> PDFUrlKnowledgeBase:
+    """
+    Returns this process's knowledge base (and with it one vector DB engine
+    and embedder), building it on first use.
+    """
+    global _knowledge_base
+    if _knowledge_base is None:
+        _knowledge_base = PDFUrlKnowledgeBase(
+            urls=settings.KNOWLEDGE_BASE_URLS,
+            vector_db=PgVector(
+                table_name=settings.KNOWLEDGE_TABLE_NAME,
+                db_url=settings.KNOWLEDGE_DB_URL,
+                embedder=build_embedder(),
+            ),
+            chunking_strategy=AgenticChunking(model=GatewayOpenAIChat(id="gpt-4o")),
+        )
+    return _knowledge_base
+
+
+@contextmanager
+def vector_table_connection(schema: Optional[str], table_name: str):
+    """
+    A psycopg2 connection to the database holding a vector table: the
+    knowledge base's own engine (KNOWLEDGE_DB_URL) for its table, the vector
+    database pool (VECTOR_DATABASE_URL) for any other.
+    """
+    from db.conn import (
+        engine_connection,
+        get_vector_db_connection,
+        release_vector_db_connection,
+    )
+
+    vector_db = get_knowledge_base().vector_db
+    if (schema, table_name) == (vector_db.schema, vector_db.table_name):
+        with engine_connection(vector_db.db_engine) as conn:
+            yield conn
+        return
+    conn = get_vector_db_connection()
+    try:
+        yield conn
+    finally:
+        release_vector_db_connection(conn)
+
+
+def build_knowledge_agent() -> AgnoAgent:
+    """
+    An agent answering from the shared knowledge base. Agents keep per-run
+    state, so each request gets its own; the knowledge base behind them is
+    what's expensive to build, and it is shared.
+    """
+    return AgnoAgent(
+        model=GatewayOpenAIChat(id="gpt-4o"),
+        knowledge=get_knowledge_base(),
+        search_knowledge=True,
+    )
+
+
+def _source_name(url: str) -> str:
+    # Same document name PDFUrlReader gives the chunks of `url`
+    return url.split("/")[-1].split(".")[0].replace("/", "_").replace(" ", "_")
+
+
+def _read_source(knowledge_base: PDFUrlKnowledgeBase, name: str, content: bytes):
+    pdf = BytesIO(content)
+    pdf.name = f"{name}.pdf"
+    reader = PDFReader(chunking_strategy=knowledge_base.reader.chunking_strategy)
+    return reader.read(pdf)
+
+
+def ingest_knowledge_source(
+    knowledge_base: PDFUrlKnowledgeBase, url: str, force: bool = False
+) -> Dict[str, Any]:
+    """
+    Brings the vector table up to date with one source PDF. Returns counts
+    of the chunks added, kept and removed.
+    """
+    name = _source_name(url)
+    source_key = KNOWLEDGE_SOURCE_KEY.format(settings.KNOWLEDGE_TABLE_NAME, url)
+    content = fetch_with_retry(url).content
+    source_sha256 = hashlib.sha256(content).hexdigest()
+
+    try:
+        previous_sha256 = get_redis().get(source_key)
+    except redis.RedisError as e:
+        logger.warning(f"ingest_knowledge_source: Could not read {source_key}: {e}")
+        previous_sha256 = None
+    if previous_sha256 == source_sha256 and not force:
+        logger.info(f"ingest_knowledge_source: {url} is unchanged, skipping")
+        return {"url": url, "unchanged": True}
+
+    chunks = {}
+    for document in _read_source(knowledge_base, name, content):
+        content_hash = chunk_content_hash(document.content)
+        # Stable ids so re-ingesting the same chunk updates it in place
+        document.id = f"{name}_{content_hash}"
+        chunks.setdefault(content_hash, document)
+
+    vector_db = knowledge_base.vector_db
+    table = vector_db.table
+    with vector_db.Session() as sess:
+        existing = set(
+            sess.execute(
+                select(table.c.content_hash).where(table.c.name == name)
+            ).scalars()
+        )
+
+    new_chunks = [doc for h, doc in chunks.items() if h not in existing]
+    stale_hashes = existing - chunks.keys()
+    load_stats = None
+    if new_chunks:
+        # Only these are embedded
+        load_stats = embed_and_load(new_chunks, vector_db)
+    if stale_hashes:
+        with vector_db.Session() as sess:
+            sess.execute(
+                delete(table).where(
+                    table.c.name == name, table.c.content_hash.in_(stale_hashes)
+                )
+            )
+            sess.commit()
+
+    try:
+        get_redis().set(source_key, source_sha256)
+    except redis.RedisError as e:
+        logger.warning(f"ingest_knowledge_source: Could not record {source_key}: {e}")
+
+    logger.info(
+        f"ingest_knowledge_source: {url}: {len(new_chunks)} chunks added, {len(chunks) - len(new_chunks)} kept, {len(stale_hashes)} removed"
+    )
+    return {
+        "url": url,
+        "unchanged": False,
+        "added": len(new_chunks),
+        "kept": len(chunks) - len(new_chunks),
+        "removed": len(stale_hashes),
+        "load": load_stats,
+    }
+
+
+def ingest_knowledge_base(
+    urls: List[str] = None, force: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Incrementally ingests `urls` (by default KNOWLEDGE_BASE_URLS) into the
+    knowledge base's vector table, creating the table (and the full-text
+    column /search ranks chunks by) if needed.
+    """
+    from db.conn import engine_connection
+
+    knowledge_base = get_knowledge_base()
+    vector_db = knowledge_base.vector_db
+    if not vector_db.exists():
+        vector_db.create()
+    with engine_connection(vector_db.db_engine) as conn:
+        ensure_chunk_search_column(conn, vector_db.schema, vector_db.table_name)
+    return [
+        ingest_knowledge_source(knowledge_base, url, force)
+        for url in (urls or settings.KNOWLEDGE_BASE_URLS)
+    ]
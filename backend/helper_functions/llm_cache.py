@@ -0,0 +1,277 @@
+"""
+Shared cache of LLM responses, keyed by model, system prompt, input and
+temperature.
+
+Only deterministic calls (temperature <= LLM_CACHE_MAX_TEMPERATURE, 0 by
+default) are cached, so re-running metadata extraction, requirement
+extraction or markdown formatting on the same document doesn't pay for the
+same completion twice. Lookups go to a small in-process LRU first and then to
+Redis, which is shared by the API and every Celery worker. Entries expire
+after LLM_CACHE_TTL_SECONDS in both layers; the local layer is additionally
+bounded by LLM_CACHE_LOCAL_MAX_BYTES. Redis being unavailable only disables
+the shared layer, it never fails the LLM call.
+"""
+
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import redis
+from pydantic import TypeAdapter, ValidationError
+
+from config import settings
+from db.redis_conn import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+# Redis key holding a cached LLM response
+LLM_CACHE_KEY = "llm_cache:{}"
+
+
+class LLMCache:
+    def __init__(self, ttl_seconds: int, local_max_bytes: int, max_value_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.local_max_bytes = local_max_bytes
+        self.max_value_bytes = max_value_bytes
+        self._local = OrderedDict()  # key -> (expires_at, value, size in bytes)
+        self._local_bytes = 0
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.redis_errors = 0
+
+    def cacheable(self, temperature: Optional[float]) -> bool:
+        """True for calls deterministic enough to be served from the cache."""
+        return (
+            settings.LLM_CACHE_ENABLED
+            and temperature is not None
+            and temperature <= settings.LLM_CACHE_MAX_TEMPERATURE
+        )
+
+    def key_for(
+        self,
+        model: str,
+        system_prompt: str,
+        user_input: str,
+        temperature: float,
+        **options: Any,
+    ) -> str:
+        """Builds the cache key for one LLM call."""
+        key_material = json.dumps(
+            {
+                "model": model,
+                "system_prompt": system_prompt,
+                "input": hashlib.sha256(user_input.encode()).hexdigest(),
+                "temperature": temperature,
+                "options": options,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(key_material.encode()).hexdigest()
+
+    # --- In-process LRU ---
+
+    def _local_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                self._local_pop(key)
+                return None
+            self._local.move_to_end(key)
+            return value
+
+    def _local_pop(self, key: str) -> None:
+        _, _, size = self._local.pop(key)
+        self._local_bytes -= size
+
+    def _local_put(self, key: str, value: str) -> None:
+        with self._lock:
+            if key in self._local:
+                self._local_pop(key)
+            size = len(value.encode())
+            self._local[key] = (time.monotonic() + self.ttl_seconds, value, size)
+            self._local_bytes += size
+            while self._local_bytes > self.local_max_bytes and self._local:
+                self._local_pop(next(iter(self._local)))
+                self.evictions += 1
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    # --- Two-level lookups ---
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._local_get(key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+        try:
+            value = get_redis().get(LLM_CACHE_KEY.format(key))
+        except redis.RedisError as e:
+            logger.warning(f"LLMCache: Redis lookup failed: {e}")
+            self._count("redis_errors")
+            value = None
+        if value is None:
+            self._count("misses")
+            return None
+        self._count("redis_hits")
+        self._local_put(key, value)
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        if len(value.encode()) > self.max_value_bytes:
+            return
+        self._local_put(key, value)
+        self._count("stores")
+        try:
+            get_redis().set(LLM_CACHE_KEY.format(key), value, ex=self.ttl_seconds)
+        except redis.RedisError as e:
+            logger.warning(f"LLMCache: Redis store failed: {e}")
+            self._count("redis_errors")
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._local:
+                self._local_pop(key)
+        try:
+            get_redis().delete(LLM_CACHE_KEY.format(key))
+        except redis.RedisError as e:
+            logger.warning(f"LLMCache: Redis delete failed: {e}")
+            self._count("redis_errors")
+
+    async def aget(self, key: str) -> Optional[str]:
+        value = self._local_get(key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+        try:
+            value = await get_async_redis().get(LLM_CACHE_KEY.format(key))
+        except redis.RedisError as e:
+            logger.warning(f"LLMCache: Redis lookup failed: {e}")
+            self._count("redis_errors")
+            value = None
+        if value is None:
+            self._count("misses")
+            return None
+        self._count("redis_hits")
+        self._local_put(key, value)
+        return value
+
+    async def aput(self, key: str, value: str) -> None:
+        if len(value.encode()) > self.max_value_bytes:
+            return
+        self._local_put(key, value)
+        self._count("stores")
+        try:
+            await get_async_redis().set(
+                LLM_CACHE_KEY.format(key), value, ex=self.ttl_seconds
+            )
+        except redis.RedisError as e:
+            logger.warning(f"LLMCache: Redis store failed: {e}")
+            self._count("redis_errors")
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.local_hits + self.redis_hits
+        lookups = hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "redis_errors": self.redis_errors,
+            "local_entries": len(self._local),
+            "local_bytes": self._local_bytes,
+            "local_max_bytes": self.local_max_bytes,
+        }
+
+
+llm_cache = LLMCache(
+    settings.LLM_CACHE_TTL_SECONDS,
+    settings.LLM_CACHE_LOCAL_MAX_BYTES,
+    settings.LLM_CACHE_MAX_VALUE_BYTES,
+)
+
+
+def _agent_cache_key(
+    agent, adapter: TypeAdapter, user_prompt: str, system_prompt: str, temperature
+):
+    # The output schema, not the type's repr, so editing the output model
+    # (a field added, renamed or retyped) invalidates its entries
+    return llm_cache.key_for(
+        agent.model.model_name,
+        system_prompt,
+        user_prompt,
+        temperature,
+        base_url=agent.model.base_url,
+        output_schema=json.dumps(adapter.json_schema(), sort_keys=True),
+    )
+
+
+def run_agent_sync_cached(agent, user_prompt: str, system_prompt: str):
+    """
+    Returns `agent.run_sync(user_prompt).output`, served from llm_cache when
+    the agent runs at a cacheable temperature. `system_prompt` must be the
+    prompt the agent was built with. A cached value that no longer validates
+    against the output type is dropped and counts as a miss.
+    """
+    temperature = (agent.model_settings or {}).get("temperature")
+    if not llm_cache.cacheable(temperature):
+        return agent.run_sync(user_prompt).output
+
+    adapter = TypeAdapter(agent.output_type)
+    key = _agent_cache_key(agent, adapter, user_prompt, system_prompt, temperature)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        try:
+            return adapter.validate_json(cached)
+        except ValidationError as e:
+            logger.warning(
+                f"run_agent_sync_cached: Dropping cached output that no longer validates: {e}"
+            )
+            llm_cache.delete(key)
+
+    output = agent.run_sync(user_prompt).output
+    llm_cache.put(key, adapter.dump_json(output).decode())
+    return output
+
+
+async def cached_completion_text(
+    create: Callable[[], Awaitable[Any]],
+    model: str,
+    system_prompt: str,
+    user_content: str,
+    temperature: float,
+    **options: Any,
+) -> str:
+    """
+    Returns the message content of a chat completion, awaiting `create()`
+    only on a cache miss (or when the temperature isn't cacheable).
+    """
+    if not llm_cache.cacheable(temperature):
+        completion = await create()
+        return completion.choices[0].message.content
+
+    key = llm_cache.key_for(model, system_prompt, user_content, temperature, **options)
+    cached = await llm_cache.aget(key)
+    if cached is not None:
+        return cached
+
+    completion = await create()
+    content = completion.choices[0].message.content
+    if content is not None:
+        await llm_cache.aput(key, content)
+    return content
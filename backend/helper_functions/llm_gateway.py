@@ -0,0 +1,497 @@
+"""
+Shared gateway to the LLM providers: OpenAI and the local Ollama server.
+
+Each provider gets one long-lived, pooled HTTP client per process, sync and
+async, with keep-alive (and HTTP/2 where the server negotiates it and h2 is
+installed). Every request through them, whether from a pydantic-ai agent, an
+agno model or embedder, the OpenAI SDK or LangChain, first waits for one of
+the provider's concurrency slots (LLM_OPENAI_CONCURRENCY,
+LLM_OLLAMA_CONCURRENCY) and is then counted in its latency and token
+metrics. Build models and clients with the functions below instead of
+constructing providers directly, so calls reuse warm connections.
+
+A provider's slots are one semaphore per process, shared by the sync and
+async clients and by every thread and event loop. Async connections can't
+move between event loops, so the async client keeps one connection pool per
+loop; the sync one is shared by all threads. Ollama's slots are instead
+scheduled cluster-wide by priority class (see helper_functions.llm_scheduler),
+since every process shares the one local model.
+"""
+
+import os
+import json
+import time
+import random
+import socket
+import asyncio
+import inspect
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache, wraps
+from typing import Any, Dict, Optional
+
+import httpx
+from agno.models.openai import OpenAIChat
+from openai import AsyncOpenAI, OpenAI
+from pydantic_ai.models.openai import OpenAIModel
+from pydantic_ai.providers.openai import OpenAIProvider
+
+from config import settings
+from helper_functions.llm_scheduler import (
+    PRIORITIES,
+    PriorityScheduler,
+    current_priority,
+)
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (enables httpx's HTTP/2 support)
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Latencies kept per provider for the percentiles in gateway_metrics()
+LATENCY_SAMPLES = 1000
+
+
+@dataclass(frozen=True)
+class LLMProvider:
+    name: str
+    base_url: Optional[str]
+    api_key: Optional[str]
+    concurrency: int
+    # Slots scheduled cluster-wide by priority, instead of per process
+    scheduled: bool = False
+    reserved_slots: int = 0
+
+
+def get_provider(name: str) -> LLMProvider:
+    if name == "openai":
+        return LLMProvider(
+            "openai",
+            settings.OPENAI_BASE_URL or None,
+            os.getenv("OPENAI_API_KEY"),
+            settings.LLM_OPENAI_CONCURRENCY,
+        )
+    if name == "ollama":
+        # Ollama ignores the key, but the OpenAI SDK requires one
+        return LLMProvider(
+            "ollama",
+            settings.OLLAMA_BASE_URL,
+            "ollama",
+            settings.LLM_OLLAMA_CONCURRENCY,
+            scheduled=settings.LLM_OLLAMA_SCHEDULED,
+            reserved_slots=settings.LLM_OLLAMA_RESERVED_SLOTS,
+        )
+    raise ValueError(f"Unknown LLM provider {name!r}")
+
+
+class ProviderMetrics:
+    """Request, latency and token counters of one provider in this process."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        # Priority class -> [waiting, started, total wait, max wait, waits]
+        self._classes = {
+            priority: [0, 0, 0.0, 0.0, deque(maxlen=LATENCY_SAMPLES)]
+            for priority in PRIORITIES
+        }
+
+    def queued(self, priority: str) -> None:
+        with self._lock:
+            self.waiting += 1
+            self._classes[priority][0] += 1
+
+    def dequeued(self, priority: str) -> None:
+        # Gave up waiting for a slot (e.g. the caller was cancelled)
+        with self._lock:
+            self.waiting -= 1
+            self._classes[priority][0] -= 1
+
+    def started(self, waited: float, priority: str) -> None:
+        with self._lock:
+            self.waiting -= 1
+            self.in_flight += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            queue = self._classes[priority]
+            queue[0] -= 1
+            queue[1] += 1
+            queue[2] += waited
+            queue[3] = max(queue[3], waited)
+            queue[4].append(waited)
+
+    def finished(
+        self, seconds: float, response: Optional[httpx.Response] = None
+    ) -> None:
+        usage = _usage(response) if response is not None else {}
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+            if response is None or response.status_code >= 400:
+                self.errors += 1
+            self._latencies.append(seconds)
+            self.prompt_tokens += usage.get("prompt_tokens") or 0
+            self.completion_tokens += usage.get("completion_tokens") or 0
+            self.total_tokens += usage.get("total_tokens") or 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "avg_wait_seconds": (
+                    self.total_wait_seconds / self.requests if self.requests else 0.0
+                ),
+                "max_wait_seconds": self.max_wait_seconds,
+                "p50_latency_seconds": _percentile(latencies, 0.50),
+                "p99_latency_seconds": _percentile(latencies, 0.99),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.total_tokens,
+                "priorities": {
+                    priority: {
+                        "waiting": waiting,
+                        "requests": started,
+                        "avg_wait_seconds": total / started if started else 0.0,
+                        "p99_wait_seconds": _percentile(sorted(waits), 0.99),
+                        "max_wait_seconds": longest,
+                    }
+                    for priority, (
+                        waiting,
+                        started,
+                        total,
+                        longest,
+                        waits,
+                    ) in self._classes.items()
+                },
+            }
+
+
+def _percentile(ordered: list, p: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+
+def _usage(response: httpx.Response) -> Dict[str, int]:
+    # Token usage of a (fully read) JSON completion or embedding response
+    if not response.is_success or not _is_json(response):
+        return {}
+    try:
+        usage = json.loads(response.content).get("usage")
+    except (ValueError, AttributeError):
+        return {}
+    return usage if isinstance(usage, dict) else {}
+
+
+def _is_json(response: httpx.Response) -> bool:
+    # Streamed (text/event-stream) responses are passed through unread
+    return response.headers.get("content-type", "").startswith("application/json")
+
+
+def _transport_options() -> Dict[str, Any]:
+    return {
+        "http2": settings.LLM_HTTP2 and HTTP2_AVAILABLE,
+        "limits": httpx.Limits(
+            max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    }
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.LLM_HTTP_TIMEOUT_SECONDS,
+        connect=settings.LLM_HTTP_CONNECT_TIMEOUT_SECONDS,
+    )
+
+
+async def _acquire_slot_async(
+    slots: threading.BoundedSemaphore,
+    poll_seconds: float = 0.02,
+    max_poll_seconds: float = 0.25,
+) -> None:
+    # Polls instead of parking a thread on the semaphore: waiters must not
+    # fill the loop's default executor, which the requests holding slots
+    # need for DNS lookups when they open connections
+    delay = poll_seconds
+    while not slots.acquire(blocking=False):
+        await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+        delay = min(delay * 2, max_poll_seconds)
+
+
+async def _aclose_stale(transport: httpx.AsyncHTTPTransport) -> None:
+    """Closes the connection pool of an event loop that has been closed."""
+    connections = list(transport._pool.connections)
+    try:
+        await transport.aclose()
+        return
+    except RuntimeError as e:
+        # Closing a stream schedules a callback on its loop, which is closed
+        logger.debug(f"Shutting down the sockets of a closed event loop's pool: {e}")
+    # Ends the connections now; the sockets are freed with the transport
+    for connection in connections:
+        stream = getattr(
+            getattr(connection, "_connection", None), "_network_stream", None
+        )
+        sock = stream.get_extra_info("socket") if stream else None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class _AsyncGatewayTransport(httpx.AsyncBaseTransport):
+    """Pooled async transport that holds a concurrency slot per request."""
+
+    def __init__(self, provider: LLMProvider, metrics: ProviderMetrics):
+        self.provider = provider
+        self.metrics = metrics
+        self.scheduler = provider_scheduler(provider.name)
+        self.slots = provider_slots(provider.name)
+        # id(event loop) -> (loop, transport); keyed by id because uvloop
+        # loops can't be weakly referenced
+        self._pools: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+
+    async def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        stale = []
+        with self._lock:
+            pool = self._pools.get(id(loop))
+            if pool is None or pool[0] is not loop:
+                # Take over the pools of loops that have been closed since
+                for key, (pool_loop, transport) in list(self._pools.items()):
+                    if pool_loop.is_closed():
+                        stale.append(transport)
+                        del self._pools[key]
+                pool = (loop, httpx.AsyncHTTPTransport(**_transport_options()))
+                self._pools[id(loop)] = pool
+        for transport in stale:
+            await _aclose_stale(transport)
+        return pool[1]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport = await self._transport()
+        priority = current_priority()
+        queued_at = time.perf_counter()
+        self.metrics.queued(priority)
+        try:
+            if self.scheduler:
+                token = await self.scheduler.acquire_async(priority)
+            else:
+                await _acquire_slot_async(self.slots)
+        except BaseException:
+            self.metrics.dequeued(priority)
+            raise
+        started = time.perf_counter()
+        self.metrics.started(started - queued_at, priority)
+        response = None
+        try:
+            response = await transport.handle_async_request(request)
+            if _is_json(response):
+                # Read inside the slot, so the cap covers the whole call
+                await response.aread()
+        finally:
+            self.metrics.finished(time.perf_counter() - started, response)
+            if self.scheduler:
+                await asyncio.to_thread(self.scheduler.release, token)
+            else:
+                self.slots.release()
+        return response
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._pools.pop(id(loop), None)
+        if pool is not None:
+            await pool[1].aclose()
+
+
+class _GatewayTransport(httpx.BaseTransport):
+    """Pooled, thread-safe sync transport that holds a concurrency slot per request."""
+
+    def __init__(self, provider: LLMProvider, metrics: ProviderMetrics):
+        self.provider = provider
+        self.metrics = metrics
+        self.scheduler = provider_scheduler(provider.name)
+        self.slots = provider_slots(provider.name)
+        self._transport = httpx.HTTPTransport(**_transport_options())
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        priority = current_priority()
+        queued_at = time.perf_counter()
+        self.metrics.queued(priority)
+        try:
+            if self.scheduler:
+                token = self.scheduler.acquire(priority)
+            else:
+                self.slots.acquire()
+        except BaseException:
+            self.metrics.dequeued(priority)
+            raise
+        started = time.perf_counter()
+        self.metrics.started(started - queued_at, priority)
+        response = None
+        try:
+            response = self._transport.handle_request(request)
+            if _is_json(response):
+                response.read()
+        finally:
+            self.metrics.finished(time.perf_counter() - started, response)
+            if self.scheduler:
+                self.scheduler.release(token)
+            else:
+                self.slots.release()
+        return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+def _shared(factory):
+    """
+    lru_cache for the client factories, also safe on first use from many
+    threads at once (a bare lru_cache may build, and hand out, several).
+    """
+    cached = lru_cache(maxsize=None)(factory)
+    lock = threading.RLock()
+    signature = inspect.signature(factory)
+
+    @wraps(factory)
+    def wrapper(*args):
+        # Defaults filled in, so f() and f("openai") share one instance
+        bound = signature.bind(*args)
+        bound.apply_defaults()
+        with lock:
+            return cached(*bound.args)
+
+    return wrapper
+
+
+@_shared
+def provider_metrics(name: str) -> ProviderMetrics:
+    return ProviderMetrics(name)
+
+
+@_shared
+def provider_slots(name: str) -> threading.BoundedSemaphore:
+    """The process-wide concurrency slots of provider `name`, sync and async."""
+    return threading.BoundedSemaphore(get_provider(name).concurrency)
+
+
+@_shared
+def provider_scheduler(name: str) -> Optional[PriorityScheduler]:
+    """The cluster-wide slot scheduler of provider `name`, if it is scheduled."""
+    provider = get_provider(name)
+    if not provider.scheduled:
+        return None
+    return PriorityScheduler(
+        name,
+        provider.concurrency,
+        reserved=provider.reserved_slots,
+        lease_seconds=settings.LLM_SCHEDULER_LEASE_SECONDS,
+    )
+
+
+@_shared
+def async_http_client(name: str = "openai") -> httpx.AsyncClient:
+    """This process's pooled async HTTP client for provider `name`."""
+    provider = get_provider(name)
+    return httpx.AsyncClient(
+        transport=_AsyncGatewayTransport(provider, provider_metrics(name)),
+        timeout=_timeout(),
+    )
+
+
+@_shared
+def http_client(name: str = "openai") -> httpx.Client:
+    """This process's pooled sync HTTP client for provider `name`."""
+    provider = get_provider(name)
+    return httpx.Client(
+        transport=_GatewayTransport(provider, provider_metrics(name)),
+        timeout=_timeout(),
+    )
+
+
+@_shared
+def async_openai_client(name: str = "openai") -> AsyncOpenAI:
+    provider = get_provider(name)
+    return AsyncOpenAI(
+        base_url=provider.base_url,
+        api_key=provider.api_key,
+        http_client=async_http_client(name),
+    )
+
+
+@_shared
+def openai_client(name: str = "openai") -> OpenAI:
+    provider = get_provider(name)
+    return OpenAI(
+        base_url=provider.base_url,
+        api_key=provider.api_key,
+        http_client=http_client(name),
+    )
+
+
+@_shared
+def openai_provider(name: str = "openai") -> OpenAIProvider:
+    """A pydantic-ai provider for `name`, shared by every model built on it."""
+    return OpenAIProvider(openai_client=async_openai_client(name))
+
+
+def openai_model(model_name: str, provider: str = "openai") -> OpenAIModel:
+    """A pydantic-ai model served by `provider` through the gateway."""
+    return OpenAIModel(model_name=model_name, provider=openai_provider(provider))
+
+
+@dataclass
+class GatewayOpenAIChat(OpenAIChat):
+    """agno's OpenAIChat, sending its sync and async calls through the gateway."""
+
+    gateway_provider: str = "openai"
+
+    def get_client(self) -> OpenAI:
+        return openai_client(self.gateway_provider)
+
+    def get_async_client(self) -> AsyncOpenAI:
+        return async_openai_client(self.gateway_provider)
+
+
+def gateway_metrics() -> Dict[str, Dict[str, Any]]:
+    """
+    Per-provider request, latency and token counters of this process, and
+    the cluster-wide queue of scheduled providers.
+    """
+    metrics = {}
+    for name in ("openai", "ollama"):
+        scheduler = provider_scheduler(name)
+        metrics[name] = {
+            **provider_metrics(name).stats(),
+            "concurrency": get_provider(name).concurrency,
+            "http2": settings.LLM_HTTP2 and HTTP2_AVAILABLE,
+        }
+        if scheduler:
+            metrics[name]["cluster"] = scheduler.queue_stats()
+    return metrics
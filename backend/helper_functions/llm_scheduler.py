@@ -0,0 +1,229 @@
+"""
+Cluster-wide priority scheduling of requests to a shared LLM server.
+
+The local Ollama model serves the API and every Celery worker, so its
+request slots are kept in Redis rather than per process. Each request
+first joins a waiting list ordered by priority class, then by arrival. A
+slot only goes to a waiter with no higher-priority waiter ahead of it, and
+batch requests leave `reserved` slots free for interactive ones. A single
+upload therefore waits at most for one in-flight request, however deep the
+batch backlog is. Requests already running are never interrupted.
+
+Code picks its class with `with llm_priority(BATCH): ...`. The class is
+kept in a context variable, so it follows the call into pydantic-ai's
+event loop and tasks. Requests outside such a block are interactive.
+"""
+
+import time
+import uuid
+import random
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import redis
+
+from db.redis_conn import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, most urgent first
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+
+SCHEDULER_KEY = "llm_scheduler:{}:{}"
+
+_priority: ContextVar[str] = ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: str):
+    """Runs the block's LLM requests in priority class `priority`."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority {priority!r}")
+    reset = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(reset)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+# KEYS: slot holders (token -> lease expiry ms), waiters (token -> class *
+# 1e13 + arrival ms), waiter heartbeats (token -> last poll ms)
+# ARGV: token, class rank, limit, slots closed to this class, lease ms,
+# waiter timeout ms
+# Returns 1 if the slot was taken, else 0 (the token stays queued).
+_TRY_ACQUIRE = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local token, rank = ARGV[1], tonumber(ARGV[2])
+local limit, closed = tonumber(ARGV[3]), tonumber(ARGV[4])
+local lease, waiter_timeout = tonumber(ARGV[5]), tonumber(ARGV[6])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local gone = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now - waiter_timeout)
+for _, stale in ipairs(gone) do
+    redis.call('ZREM', KEYS[2], stale)
+    redis.call('ZREM', KEYS[3], stale)
+end
+
+redis.call('ZADD', KEYS[2], 'NX', rank * 1e13 + now, token)
+redis.call('ZADD', KEYS[3], now, token)
+for i = 1, 3 do
+    redis.call('PEXPIRE', KEYS[i], lease + waiter_timeout)
+end
+
+local free = limit - closed - redis.call('ZCARD', KEYS[1])
+if redis.call('ZRANK', KEYS[2], token) < free then
+    redis.call('ZREM', KEYS[2], token)
+    redis.call('ZREM', KEYS[3], token)
+    redis.call('ZADD', KEYS[1], now + lease, token)
+    return 1
+end
+return 0
+"""
+
+
+class PriorityScheduler:
+    """
+    `limit` cluster-wide request slots of one LLM server, granted strictly by
+    priority class and then arrival, with `reserved` slots only interactive
+    requests may take. A slot whose holder died is reclaimed after
+    `lease_seconds`, a waiter that stopped polling after `waiter_timeout`.
+    If Redis is unavailable, requests are let through unscheduled.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        reserved: int = 0,
+        lease_seconds: float = 660.0,
+        poll_seconds: float = 0.02,
+        max_poll_seconds: float = 0.25,
+        waiter_timeout: float = 10.0,
+    ):
+        self.name = name
+        self.limit = limit
+        self.reserved = min(reserved, limit - 1)
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.max_poll_seconds = max_poll_seconds
+        self.waiter_timeout = waiter_timeout
+        self.keys = [
+            SCHEDULER_KEY.format(name, part) for part in ("slots", "waiting", "seen")
+        ]
+        self._script = None
+
+    def _try_acquire(self, token: str, priority: str) -> bool:
+        if self._script is None:
+            self._script = get_redis().register_script(_TRY_ACQUIRE)
+        rank = PRIORITIES.index(priority)
+        closed = self.reserved if priority != INTERACTIVE else 0
+        return bool(
+            self._script(
+                keys=self.keys,
+                args=[
+                    token,
+                    rank,
+                    self.limit,
+                    closed,
+                    int(self.lease_seconds * 1000),
+                    int(self.waiter_timeout * 1000),
+                ],
+            )
+        )
+
+    def _poll_delays(self):
+        # Short at first, so a freed slot is picked up quickly, then backing
+        # off (with jitter, so waiters don't poll in lockstep)
+        delay = self.poll_seconds
+        while True:
+            yield delay * random.uniform(0.5, 1.0)
+            delay = min(delay * 2, self.max_poll_seconds)
+
+    def acquire(self, priority: str = None) -> Optional[str]:
+        """
+        Blocks until a slot is free for `priority` (default: the current
+        class). Returns a token for release(), or None if Redis is unavailable.
+        """
+        priority = priority or current_priority()
+        token = uuid.uuid4().hex
+        try:
+            for delay in self._poll_delays():
+                if self._try_acquire(token, priority):
+                    return token
+                time.sleep(delay)
+        except redis.RedisError as e:
+            self._unavailable(e)
+            return None
+        except BaseException:
+            self._leave(token)
+            raise
+
+    async def acquire_async(self, priority: str = None) -> Optional[str]:
+        """acquire() for coroutines; Redis calls run in a worker thread."""
+        priority = priority or current_priority()
+        token = uuid.uuid4().hex
+        try:
+            for delay in self._poll_delays():
+                if await asyncio.to_thread(self._try_acquire, token, priority):
+                    return token
+                await asyncio.sleep(delay)
+        except redis.RedisError as e:
+            self._unavailable(e)
+            return None
+        except BaseException:
+            # Cancelled while waiting: stop holding a place in the queue
+            await asyncio.to_thread(self._leave, token)
+            raise
+
+    def release(self, token: Optional[str]) -> None:
+        if token is None:
+            return
+        try:
+            get_redis().zrem(self.keys[0], token)
+        except redis.RedisError as e:
+            logger.warning(
+                f"PriorityScheduler: Could not release {self.name} slot: {e}"
+            )
+
+    def _leave(self, token: str) -> None:
+        # Drops a waiter, or a slot granted as the wait was interrupted
+        try:
+            with get_redis().pipeline() as pipe:
+                for key in self.keys:
+                    pipe.zrem(key, token)
+                pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"PriorityScheduler: Could not leave {self.name} queue: {e}")
+
+    def _unavailable(self, error: Exception) -> None:
+        logger.warning(
+            f"PriorityScheduler: Not scheduling {self.name} requests: {error}"
+        )
+
+    def queue_stats(self) -> Dict[str, int]:
+        """Cluster-wide slots in use and waiters per priority class."""
+        try:
+            with get_redis().pipeline() as pipe:
+                pipe.zcard(self.keys[0])
+                for rank in range(len(PRIORITIES)):
+                    pipe.zcount(self.keys[1], rank * 1e13, (rank + 1) * 1e13 - 1)
+                in_use, *waiting = pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"PriorityScheduler: No {self.name} queue stats: {e}")
+            return {}
+        return {
+            "slots": self.limit,
+            "reserved_for_interactive": self.reserved,
+            "slots_in_use": in_use,
+            **{f"waiting_{name}": count for name, count in zip(PRIORITIES, waiting)},
+        }
@@ -0,0 +1,162 @@
+"""
+Content-addressed, size-bounded disk cache for PDF -> markdown conversions.
+
+Entries are keyed by the SHA-256 of the PDF bytes plus the converter versions
+and conversion options, so a re-upload of the same document (or a re-run of
+metadata extraction / chunking experiments) skips pymupdf4llm entirely.
+The least recently used entries are evicted once the cache grows past its
+byte budget; recency is tracked with the entry file's mtime so it survives
+restarts and is shared by every process that mounts the cache directory.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from importlib import metadata
+from typing import Any, Dict, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    """Returns the SHA-256 hex digest of a file, read in chunks."""
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def converter_version() -> str:
+    """Version string of the markdown converter stack, part of every cache key."""
+    versions = []
+    for package in ("pymupdf4llm", "PyMuPDF"):
+        try:
+            versions.append(f"{package}=={metadata.version(package)}")
+        except metadata.PackageNotFoundError:
+            versions.append(f"{package}==unknown")
+    return ";".join(versions)
+
+
+class MarkdownCache:
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key_for(
+        self,
+        content_sha256: str,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Builds the cache key for a PDF hash, converter version and options."""
+        key_material = json.dumps(
+            {
+                "pdf": content_sha256,
+                "converter": converter_version(),
+                "options": options or {},
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(key_material.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.md")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                md_text = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        # Bump recency for LRU eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return md_text
+
+    def put(self, key: str, md_text: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(md_text)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".md"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self) -> int:
+        """Removes least recently used entries until the cache fits max_bytes."""
+        entries = self._entries()
+        total_bytes = sum(size for _, size, _ in entries)
+        if total_bytes <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+            evicted += 1
+
+        with self._lock:
+            self.evictions += evicted
+        logger.info(f"MarkdownCache: evicted {evicted} entries from {self.cache_dir}")
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+markdown_cache = MarkdownCache(settings.MD_CACHE_DIR, settings.MD_CACHE_MAX_BYTES)
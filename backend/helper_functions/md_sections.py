@@ -0,0 +1,162 @@
+"""
+Splits markdown into sections for the LLM formatting pass and packs them
+into requests by token count.
+
+One request per heading spends most of a paper's requests on per-call
+overhead for tiny sections, while one huge section can outgrow the model's
+output limit. pack_sections merges adjacent sections up to a token budget
+and splits oversized ones at paragraph (then line) boundaries, so each
+request is close to, but within, the budget. Packing never changes text:
+the batches' texts joined in order are exactly the sections joined.
+"""
+
+import re
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Iterator, List, Tuple
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# A markdown heading (e.g. "# Heading", "## Subheading")
+_HEADING = re.compile(r"^#{1,6}\s+")
+# Splits after a blank line, keeping the newlines with the paragraph
+_PARAGRAPH_END = re.compile(r"(?<=\n\n)")
+# Boundaries tried, in order, to split a section over the token budget
+_SPLITTERS = (_PARAGRAPH_END.split, lambda text: text.splitlines(keepends=True))
+
+# Encoding of models tiktoken doesn't know yet (e.g. gpt-4.1)
+DEFAULT_ENCODING = "o200k_base"
+
+TokenCounter = Callable[[str], int]
+
+
+def split_markdown_into_sections(md_text: str) -> List[str]:
+    """
+    Splits markdown before every heading. Joining the sections gives back
+    `md_text` exactly.
+    """
+    sections = []
+    current_section_lines = []
+    for line in md_text.splitlines(keepends=True):
+        if _HEADING.match(line) and current_section_lines:
+            sections.append("".join(current_section_lines))
+            current_section_lines = []
+        current_section_lines.append(line)
+    if current_section_lines:
+        sections.append("".join(current_section_lines))
+    return sections
+
+
+@lru_cache(maxsize=None)
+def token_counter(model: str) -> TokenCounter:
+    """Counts tokens of `model`'s tokenizer, or estimates them if it can't be loaded."""
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        # The encoding is downloaded on first use, which fails offline
+        logger.warning(
+            f"token_counter: no tokenizer for {model} ({e}); estimating 4 chars per token"
+        )
+        return estimate_tokens
+
+    def count(text: str) -> int:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    return count
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+@dataclass
+class SectionBatch:
+    """The text of one LLM request and the sections it came from."""
+
+    text: str
+    tokens: int
+    sections: List[int] = field(default_factory=list)
+    # A piece of one section that was over the budget on its own
+    partial: bool = False
+
+
+def _pack(
+    pieces: List[Tuple[str, int]], budget: int
+) -> Iterator[Tuple[List[str], int]]:
+    # Greedily groups consecutive (text, tokens) pieces up to `budget`
+    group, group_tokens = [], 0
+    for text, tokens in pieces:
+        if group and group_tokens + tokens > budget:
+            yield group, group_tokens
+            group, group_tokens = [], 0
+        group.append(text)
+        group_tokens += tokens
+    if group:
+        yield group, group_tokens
+
+
+def split_oversized(
+    text: str, budget: int, count_tokens: TokenCounter
+) -> List[Tuple[str, int]]:
+    """
+    Splits `text` into consecutive (piece, tokens) of at most `budget` tokens,
+    at paragraph boundaries, else at line boundaries, else (a single line
+    over the budget) into equal character slices.
+    """
+    tokens = count_tokens(text)
+    if tokens <= budget:
+        return [(text, tokens)]
+
+    for split in _SPLITTERS:
+        parts = [part for part in split(text) if part]
+        if len(parts) > 1:
+            pieces = []
+            for part in parts:
+                pieces.extend(split_oversized(part, budget, count_tokens))
+            return [("".join(group), n) for group, n in _pack(pieces, budget)]
+
+    slices = -(-tokens // budget)
+    size = -(-len(text) // slices)
+    return [
+        piece
+        for start in range(0, len(text), size)
+        for piece in split_oversized(text[start : start + size], budget, count_tokens)
+    ]
+
+
+def pack_sections(
+    sections: List[str], budget: int, count_tokens: TokenCounter = estimate_tokens
+) -> List[SectionBatch]:
+    """
+    Packs consecutive sections into batches of at most `budget` tokens (as
+    counted per section). A section over the budget gets batches of its own,
+    split by split_oversized. "".join(batch.text for batch in batches) ==
+    "".join(sections).
+    """
+    batches = []
+    current = SectionBatch("", 0)
+    for i, section in enumerate(sections):
+        tokens = count_tokens(section)
+        if current.sections and (tokens > budget or current.tokens + tokens > budget):
+            batches.append(current)
+            current = SectionBatch("", 0)
+        if tokens > budget:
+            batches.extend(
+                SectionBatch(piece, piece_tokens, [i], partial=True)
+                for piece, piece_tokens in split_oversized(
+                    section, budget, count_tokens
+                )
+            )
+            continue
+        current.text += section
+        current.tokens += tokens
+        current.sections.append(i)
+    if current.sections:
+        batches.append(current)
+    return batches
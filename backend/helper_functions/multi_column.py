@@ -52,187 +52,289 @@ Usage
 
 import os
 import sys
+import math
 import fitz
 
+# Grid cells per page axis used by BBoxGrid
+GRID_CELLS = 16
 
-def column_boxes(page, footer_margin=50, header_margin=50, no_image_text=True):
-    """Determine bboxes which wrap a column."""
-    paths = page.get_drawings()
-    bboxes = []
 
-    # path rectangles
-    path_rects = []
+class BBoxList:
+    """A list of bboxes, items may be set to None once they have been consumed.
 
-    # image bboxes
-    img_bboxes = []
+    candidates() answers "which items may touch this rectangle" by returning
+    every item, i.e. callers fall back to a linear scan.
+    """
 
-    # bboxes of non-horizontal text
-    # avoid when expanding horizontal text boxes
-    vert_bboxes = []
+    def __init__(self, bboxes=()):
+        self.items = []
+        for bb in bboxes:
+            self.append(bb)
 
-    # compute relevant page area
-    clip = +page.rect
-    clip.y1 -= footer_margin  # Remove footer area
-    clip.y0 += header_margin  # Remove header area
+    def __len__(self):
+        return len(self.items)
 
-    def can_extend(temp, bb, bboxlist):
-        """Determines whether rectangle 'temp' can be extended by 'bb'
-        without intersecting any of the rectangles contained in 'bboxlist'.
+    def __iter__(self):
+        return iter(self.items)
 
-        Items of bboxlist may be None if they have been removed.
+    def __getitem__(self, i):
+        return self.items[i]
 
-        Returns:
-            True if 'temp' has no intersections with items of 'bboxlist'.
-        """
-        for b in bboxlist:
-            if not intersects_bboxes(temp, vert_bboxes) and (
-                b == None or b == bb or (temp & b).is_empty
-            ):
-                continue
-            return False
+    def __setitem__(self, i, bb):
+        self.items[i] = bb
 
-        return True
+    def append(self, bb):
+        self.items.append(bb)
 
-    def in_bbox(bb, bboxes):
-        """Return 1-based number if a bbox contains bb, else return 0."""
-        for i, bbox in enumerate(bboxes):
-            if bb in bbox:
-                return i + 1
-        return 0
-
-    def intersects_bboxes(bb, bboxes):
-        """Return True if a bbox intersects bb, else return False."""
-        for bbox in bboxes:
-            if not (bb & bbox).is_empty:
-                return True
-        return False
+    def candidates(self, x0, y0, x1, y1):
+        """Ascending indices of the non-None items that may touch the closed
+        rectangle (x0, y0, x1, y1)."""
+        return [i for i, b in enumerate(self.items) if b is not None]
 
-    def extend_right(bboxes, width, path_bboxes, vert_bboxes, img_bboxes):
-        """Extend a bbox to the right page border.
-
-        Whenever there is no text to the right of a bbox, enlarge it up
-        to the right page border.
-
-        Args:
-            bboxes: (list[IRect]) bboxes to check
-            width: (int) page width
-            path_bboxes: (list[IRect]) bboxes with a background color
-            vert_bboxes: (list[IRect]) bboxes with vertical text
-            img_bboxes: (list[IRect]) bboxes of images
-        Returns:
-            Potentially modified bboxes.
-        """
-        for i, bb in enumerate(bboxes):
-            # do not extend text with background color
-            if in_bbox(bb, path_bboxes):
-                continue
 
-            # do not extend text in images
-            if in_bbox(bb, img_bboxes):
-                continue
+class BBoxGrid(BBoxList):
+    """A BBoxList backed by a uniform grid over the page.
 
-            # temp extends bb to the right page border
-            temp = +bb
-            temp.x1 = width
+    Every item is registered in the grid cells its closed rectangle covers,
+    coordinates outside the page being clamped to the border cells.
+    Rectangles touching (or contained in) a query rectangle always share a
+    cell with it, so candidates() is a superset of the true hits and callers
+    still apply the exact PyMuPDF predicate to each candidate. Items with
+    inverted coordinates are always returned.
+    """
 
-            # do not cut through colored background or images
-            if intersects_bboxes(temp, path_bboxes + vert_bboxes + img_bboxes):
-                continue
+    def __init__(self, bboxes=(), area=None, cells=GRID_CELLS):
+        area = fitz.Rect(area) if area is not None else fitz.Rect(0, 0, 612, 792)
+        self.x0, self.y0 = area.x0, area.y0
+        self.cells = cells
+        self.cell_width = max(area.width / cells, 1)
+        self.cell_height = max(area.height / cells, 1)
+        self.grid = {}
+        self.unplaced = set()
+        self.coords = {}
+        super().__init__(bboxes)
+
+    def _cell(self, value, origin, size):
+        cell = (
+            math.floor((max(value, origin) - origin) / size)
+            if value < math.inf
+            else self.cells
+        )
+        return min(cell, self.cells - 1)
 
-            # also, do not intersect other text bboxes
-            check = can_extend(temp, bb, bboxes)
-            if check:
-                bboxes[i] = temp  # replace with enlarged bbox
-
-        return [b for b in bboxes if b != None]
-
-    def clean_nblocks(nblocks):
-        """Do some elementary cleaning."""
-
-        # 1. remove any duplicate blocks.
-        blen = len(nblocks)
-        if blen < 2:
-            return nblocks
-        start = blen - 1
-        for i in range(start, -1, -1):
-            bb1 = nblocks[i]
-            bb0 = nblocks[i - 1]
-            if bb0 == bb1:
-                del nblocks[i]
-
-        # 2. repair sequence in special cases:
-        # consecutive bboxes with almost same bottom value are sorted ascending
-        # by x-coordinate.
-        y1 = nblocks[0].y1  # first bottom coordinate
-        i0 = 0  # its index
-        i1 = -1  # index of last bbox with same bottom
-
-        # Iterate over bboxes, identifying segments with approx. same bottom value.
-        # Replace every segment by its sorted version.
-        for i in range(1, len(nblocks)):
-            b1 = nblocks[i]
-            if abs(b1.y1 - y1) > 10:  # different bottom
-                if i1 > i0:  # segment length > 1? Sort it!
-                    nblocks[i0 : i1 + 1] = sorted(
-                        nblocks[i0 : i1 + 1], key=lambda b: b.x0
-                    )
-                y1 = b1.y1  # store new bottom value
-                i0 = i  # store its start index
-            i1 = i  # store current index
-        if i1 > i0:  # segment waiting to be sorted
-            nblocks[i0 : i1 + 1] = sorted(nblocks[i0 : i1 + 1], key=lambda b: b.x0)
-        return nblocks
+    def _cells(self, x0, y0, x1, y1):
+        xs = range(
+            self._cell(x0, self.x0, self.cell_width),
+            self._cell(x1, self.x0, self.cell_width) + 1,
+        )
+        ys = range(
+            self._cell(y0, self.y0, self.cell_height),
+            self._cell(y1, self.y0, self.cell_height) + 1,
+        )
+        return [(cx, cy) for cx in xs for cy in ys]
+
+    def _place(self, i, bb):
+        if bb is None:
+            return
+        if not (bb.x0 <= bb.x1 and bb.y0 <= bb.y1):
+            self.unplaced.add(i)
+            return
+        self.coords[i] = tuple(bb)
+        for cell in self._cells(*bb):
+            self.grid.setdefault(cell, set()).add(i)
+
+    def _unplace(self, i, bb):
+        if bb is None:
+            return
+        if i in self.unplaced:
+            self.unplaced.discard(i)
+            return
+        for cell in self._cells(*self.coords.pop(i)):
+            self.grid[cell].discard(i)
+
+    def __setitem__(self, i, bb):
+        self._unplace(i, self.items[i])
+        self.items[i] = bb
+        self._place(i, bb)
+
+    def append(self, bb):
+        self.items.append(bb)
+        self._place(len(self.items) - 1, bb)
+
+    def candidates(self, x0, y0, x1, y1):
+        if not (x0 <= x1 and y0 <= y1):
+            return super().candidates(x0, y0, x1, y1)
+        found = set()
+        for cell in self._cells(x0, y0, x1, y1):
+            found.update(self.grid.get(cell, ()))
+        # drop grid neighbours that don't even touch the query rectangle
+        coords = self.coords
+        found = [
+            i
+            for i in found
+            if coords[i][0] <= x1
+            and x0 <= coords[i][2]
+            and coords[i][1] <= y1
+            and y0 <= coords[i][3]
+        ]
+        return sorted(self.unplaced.union(found))
+
+
+def in_bbox(bb, bboxes):
+    """Return 1-based number if a bbox contains bb, else return 0."""
+    for i in bboxes.candidates(*bb):
+        if bb in bboxes[i]:
+            return i + 1
+    return 0
+
+
+def intersects_bboxes(bb, bboxes):
+    """Return True if a bbox intersects bb, else return False."""
+    for i in bboxes.candidates(*bb):
+        if not (bb & bboxes[i]).is_empty:
+            return True
+    return False
+
+
+def can_extend(temp, bb, bboxlist, vert_bboxes):
+    """Determines whether rectangle 'temp' can be extended by 'bb'
+    without intersecting any of the rectangles contained in 'bboxlist'.
+
+    Items of bboxlist may be None if they have been removed.
+
+    Returns:
+        True if 'temp' has no intersections with items of 'bboxlist'.
+    """
+    if not len(bboxlist):
+        return True
+    # text boxes may never be extended across vertical text
+    if intersects_bboxes(temp, vert_bboxes):
+        return False
+    for i in bboxlist.candidates(*temp):
+        b = bboxlist[i]
+        if b == bb or (temp & b).is_empty:
+            continue
+        return False
 
-    # extract vector graphics
-    for p in paths:
-        path_rects.append(p["rect"].irect)
-    path_bboxes = path_rects
+    return True
 
-    # sort path bboxes by ascending top, then left coordinates
-    path_bboxes.sort(key=lambda b: (b.y0, b.x0))
 
-    # bboxes of images on page, no need to sort them
-    for item in page.get_images():
-        img_bboxes.extend(page.get_image_rects(item[0]))
+def extend_right(bboxes, width, path_bboxes, vert_bboxes, img_bboxes, obstacles):
+    """Extend a bbox to the right page border.
 
-    # blocks of text on page
-    blocks = page.get_text(
-        "dict",
-        flags=fitz.TEXTFLAGS_TEXT,
-        clip=clip,
-    )["blocks"]
+    Whenever there is no text to the right of a bbox, enlarge it up
+    to the right page border.
 
-    # Make block rectangles, ignoring non-horizontal text
-    for b in blocks:
-        bbox = fitz.IRect(b["bbox"])  # bbox of the block
+    Args:
+        bboxes: (BBoxList) bboxes to check
+        width: (int) page width
+        path_bboxes: (BBoxList) bboxes with a background color
+        vert_bboxes: (BBoxList) bboxes with vertical text
+        img_bboxes: (BBoxList) bboxes of images
+        obstacles: (BBoxList) all of path, vert and img bboxes
+    Returns:
+        Potentially modified bboxes.
+    """
+    for i, bb in enumerate(bboxes):
+        # do not extend text with background color
+        if in_bbox(bb, path_bboxes):
+            continue
 
-        # ignore text written upon images
-        if no_image_text and in_bbox(bbox, img_bboxes):
+        # do not extend text in images
+        if in_bbox(bb, img_bboxes):
             continue
 
-        # confirm first line to be horizontal
-        line0 = b["lines"][0]  # get first line
-        if line0["dir"] != (1, 0):  # only accept horizontal text
-            vert_bboxes.append(bbox)
+        # temp extends bb to the right page border
+        temp = +bb
+        temp.x1 = width
+
+        # do not cut through colored background or images
+        if intersects_bboxes(temp, obstacles):
             continue
 
-        srect = fitz.EMPTY_IRECT()
-        for line in b["lines"]:
-            lbbox = fitz.IRect(line["bbox"])
-            text = "".join([s["text"].strip() for s in line["spans"]])
-            if len(text) > 1:
-                srect |= lbbox
-        bbox = +srect
+        # also, do not intersect other text bboxes
+        check = can_extend(temp, bb, bboxes, vert_bboxes)
+        if check:
+            bboxes[i] = temp  # replace with enlarged bbox
 
-        if not bbox.is_empty:
-            bboxes.append(bbox)
+    return [b for b in bboxes if b != None]
+
+
+def clean_nblocks(nblocks):
+    """Do some elementary cleaning."""
+
+    # 1. remove any duplicate blocks.
+    blen = len(nblocks)
+    if blen < 2:
+        return nblocks
+    start = blen - 1
+    for i in range(start, -1, -1):
+        bb1 = nblocks[i]
+        bb0 = nblocks[i - 1]
+        if bb0 == bb1:
+            del nblocks[i]
+
+    # 2. repair sequence in special cases:
+    # consecutive bboxes with almost same bottom value are sorted ascending
+    # by x-coordinate.
+    y1 = nblocks[0].y1  # first bottom coordinate
+    i0 = 0  # its index
+    i1 = -1  # index of last bbox with same bottom
+
+    # Iterate over bboxes, identifying segments with approx. same bottom value.
+    # Replace every segment by its sorted version.
+    for i in range(1, len(nblocks)):
+        b1 = nblocks[i]
+        if abs(b1.y1 - y1) > 10:  # different bottom
+            if i1 > i0:  # segment length > 1? Sort it!
+                nblocks[i0 : i1 + 1] = sorted(nblocks[i0 : i1 + 1], key=lambda b: b.x0)
+            y1 = b1.y1  # store new bottom value
+            i0 = i  # store its start index
+        i1 = i  # store current index
+    if i1 > i0:  # segment waiting to be sorted
+        nblocks[i0 : i1 + 1] = sorted(nblocks[i0 : i1 + 1], key=lambda b: b.x0)
+    return nblocks
+
+
+def join_column_boxes(
+    bboxes, path_rects, vert_rects, img_rects, page_rect, use_index=True
+):
+    """Join horizontal text bboxes into column bboxes.
+
+    Args:
+        bboxes: (list[IRect]) horizontal text bboxes
+        path_rects: (list[IRect]) bboxes with a background color
+        vert_rects: (list[IRect]) bboxes with vertical text
+        img_rects: (list[IRect]) bboxes of images
+        page_rect: (Rect) the page rectangle
+        use_index: look bboxes up in a BBoxGrid instead of scanning them
+    Returns:
+        The column bboxes, like column_boxes().
+    """
+    if use_index:
+
+        def make(rects):
+            return BBoxGrid(rects, page_rect)
+
+    else:
+        make = BBoxList
+
+    path_bboxes = make(path_rects)
+    vert_bboxes = make(vert_rects)
+    img_bboxes = make(img_rects)
+    obstacles = make(path_rects + vert_rects + img_rects)
 
     # Sort text bboxes by ascending background, top, then left coordinates
-    bboxes.sort(key=lambda k: (in_bbox(k, path_bboxes), k.y0, k.x0))
+    bboxes = sorted(bboxes, key=lambda k: (in_bbox(k, path_bboxes), k.y0, k.x0))
 
     # Extend bboxes to the right where possible
     bboxes = extend_right(
-        bboxes, int(page.rect.width), path_bboxes, vert_bboxes, img_bboxes
+        make(bboxes),
+        int(page_rect.width),
+        path_bboxes,
+        vert_bboxes,
+        img_bboxes,
+        obstacles,
     )
 
     # immediately return of no text found
@@ -243,18 +345,18 @@ def column_boxes(page, footer_margin=50, header_margin=50, no_image_text=True):
     # Join bboxes to establish some column structure
     # --------------------------------------------------------------------
     # the final block bboxes on page
-    nblocks = [bboxes[0]]  # pre-fill with first bbox
-    bboxes = bboxes[1:]  # remaining old bboxes
+    nblocks = make([bboxes[0]])  # pre-fill with first bbox
+    bboxes = make(bboxes[1:])  # remaining old bboxes
 
     for i, bb in enumerate(bboxes):  # iterate old bboxes
         check = False  # indicates unwanted joins
 
         # check if bb can extend one of the new blocks
-        for j in range(len(nblocks)):
+        for j in nblocks.candidates(bb.x0, -math.inf, bb.x1, math.inf):
             nbb = nblocks[j]  # a new block
 
             # never join across columns
-            if bb == None or nbb.x1 < bb.x0 or bb.x1 < nbb.x0:
+            if nbb.x1 < bb.x0 or bb.x1 < nbb.x0:
                 continue
 
             # never join across different background colors
@@ -262,7 +364,7 @@ def column_boxes(page, footer_margin=50, header_margin=50, no_image_text=True):
                 continue
 
             temp = bb | nbb  # temporary extension of new block
-            check = can_extend(temp, nbb, nblocks)
+            check = can_extend(temp, nbb, nblocks, vert_bboxes)
             if check == True:
                 break
 
@@ -272,7 +374,7 @@ def column_boxes(page, footer_margin=50, header_margin=50, no_image_text=True):
             temp = nblocks[j]  # new bbox added
 
         # check if some remaining bbox is contained in temp
-        check = can_extend(temp, bb, bboxes)
+        check = can_extend(temp, bb, bboxes, vert_bboxes)
         if check == False:
             nblocks.append(bb)
         else:
@@ -280,10 +382,79 @@ def column_boxes(page, footer_margin=50, header_margin=50, no_image_text=True):
         bboxes[i] = None
 
     # do some elementary cleaning
-    nblocks = clean_nblocks(nblocks)
+    return clean_nblocks(list(nblocks))
 
-    # return identified text bboxes
-    return nblocks
+
+def column_boxes(
+    page, footer_margin=50, header_margin=50, no_image_text=True, use_index=True
+):
+    """Determine bboxes which wrap a column."""
+    paths = page.get_drawings()
+    bboxes = []
+
+    # path rectangles
+    path_rects = []
+
+    # image bboxes
+    img_bboxes = []
+
+    # bboxes of non-horizontal text
+    # avoid when expanding horizontal text boxes
+    vert_bboxes = []
+
+    # compute relevant page area
+    clip = +page.rect
+    clip.y1 -= footer_margin  # Remove footer area
+    clip.y0 += header_margin  # Remove header area
+
+    # extract vector graphics
+    for p in paths:
+        path_rects.append(p["rect"].irect)
+    path_bboxes = path_rects
+
+    # sort path bboxes by ascending top, then left coordinates
+    path_bboxes.sort(key=lambda b: (b.y0, b.x0))
+
+    # bboxes of images on page, no need to sort them
+    for item in page.get_images():
+        img_bboxes.extend(page.get_image_rects(item[0]))
+    img_index = BBoxGrid(img_bboxes, page.rect) if use_index else BBoxList(img_bboxes)
+
+    # blocks of text on page
+    blocks = page.get_text(
+        "dict",
+        flags=fitz.TEXTFLAGS_TEXT,
+        clip=clip,
+    )["blocks"]
+
+    # Make block rectangles, ignoring non-horizontal text
+    for b in blocks:
+        bbox = fitz.IRect(b["bbox"])  # bbox of the block
+
+        # ignore text written upon images
+        if no_image_text and in_bbox(bbox, img_index):
+            continue
+
+        # confirm first line to be horizontal
+        line0 = b["lines"][0]  # get first line
+        if line0["dir"] != (1, 0):  # only accept horizontal text
+            vert_bboxes.append(bbox)
+            continue
+
+        srect = fitz.EMPTY_IRECT()
+        for line in b["lines"]:
+            lbbox = fitz.IRect(line["bbox"])
+            text = "".join([s["text"].strip() for s in line["spans"]])
+            if len(text) > 1:
+                srect |= lbbox
+        bbox = +srect
+
+        if not bbox.is_empty:
+            bboxes.append(bbox)
+
+    return join_column_boxes(
+        bboxes, path_bboxes, vert_bboxes, img_bboxes, page.rect, use_index
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+"""
+OCR of PDFs with tesseract, for pages that need it.
+
+Every page's text layer is read with pymupdf first, which is cheap (no
+rendering). Pages with enough legible text keep it, and only the rest are
+rasterised and OCRed, in a process pool. Each worker renders one page at a
+time, so at most OCR_WORKERS page images exist at once. OCR time and peak
+memory therefore scale with the pages that need OCR, not with the
+document.
+"""
+
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List
+
+import pymupdf
+import pytesseract
+from PIL import Image
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OCRError(RuntimeError):
+    """tesseract failed on a page (or isn't installed)."""
+
+
+def has_text_layer(page: pymupdf.Page) -> bool:
+    """
+    Whether a page's text layer is usable as is: at least OCR_MIN_TEXT_CHARS
+    non-space characters, mostly letters and digits (broken font encodings
+    extract as symbols and U+FFFD).
+    """
+    text = "".join(page.get_text("text").split())
+    if len(text) < settings.OCR_MIN_TEXT_CHARS:
+        return False
+    legible = sum(1 for char in text if char.isalnum())
+    return legible / len(text) >= settings.OCR_MIN_LEGIBLE_RATIO
+
+
+def _ocr_page(pdf_path: str, page_number: int) -> str:
+    # Runs in a pool worker: renders and OCRs one page
+    with pymupdf.open(pdf_path) as doc:
+        pixmap = doc[page_number].get_pixmap(dpi=settings.OCR_DPI)
+    image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    del pixmap
+    try:
+        return pytesseract.image_to_string(image, lang=settings.OCR_LANGUAGE)
+    except (pytesseract.TesseractError, pytesseract.TesseractNotFoundError) as e:
+        # pytesseract's errors can't be unpickled, which would break the pool
+        # instead of reaching the caller
+        raise OCRError(
+            f"OCR of page {page_number + 1} of {pdf_path} failed: {e}"
+        ) from e
+
+
+def _init_worker() -> None:
+    # One tesseract thread per process; the pool provides the parallelism
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def extract_pages_with_ocr(pdf_path: str) -> List[str]:
+    """
+    The text of every page of a PDF, in page order: its text layer where
+    usable (see has_text_layer), else tesseract's OCR of the page rendered
+    at OCR_DPI.
+    """
+    with pymupdf.open(pdf_path) as doc:
+        texts: List[str] = []
+        scanned: List[int] = []
+        for page in doc:
+            if has_text_layer(page):
+                texts.append(page.get_text("text"))
+            else:
+                texts.append("")
+                scanned.append(page.number)
+        page_count = doc.page_count
+
+    max_workers = min(settings.OCR_WORKERS or os.cpu_count() or 1, len(scanned))
+    logger.info(
+        f"extract_pages_with_ocr: OCRing {len(scanned)}/{page_count} pages of {pdf_path} on {max_workers} processes"
+    )
+    ocred = 0
+    if max_workers > 1:
+        try:
+            with ProcessPoolExecutor(
+                max_workers=max_workers, initializer=_init_worker
+            ) as pool:
+                try:
+                    futures = [pool.submit(_ocr_page, pdf_path, n) for n in scanned]
+                except AssertionError as e:
+                    # e.g. daemonic worker processes that may not fork children
+                    raise BrokenProcessPool(e) from e
+                try:
+                    for page_number, future in zip(scanned, futures):
+                        texts[page_number] = future.result()
+                        ocred += 1
+                except BaseException:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+            return texts
+        except BrokenProcessPool as e:
+            logger.warning(
+                f"extract_pages_with_ocr: Process pool unavailable ({e}), OCRing the remaining {len(scanned) - ocred} pages of {pdf_path} serially"
+            )
+    for page_number in scanned[ocred:]:
+        texts[page_number] = _ocr_page(pdf_path, page_number)
+    return texts
+
+
+def extract_text_with_ocr(pdf_path: str) -> str:
+    """extract_pages_with_ocr's pages joined into one string."""
+    return "".join(extract_pages_with_ocr(pdf_path))
@@ -3,19 +3,46 @@ import unicodedata
 import pathlib
 import logging
 import json
-import time  # Keep for potential future use, but not used in simplified version
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional
 
+import pymupdf
 import pymupdf4llm
+from chonkie import RecursiveChunker
 
-from agents.parse import pdf_metadata_agent
+from agents.parse import PDF_METADATA_SYSTEM_PROMPT, pdf_metadata_agent
+from config import settings
+from helper_functions.llm_cache import run_agent_sync_cached
+from helper_functions.md_cache import file_sha256, markdown_cache
 from pydantic_ai import (  # Keep for context, agent might raise these
     exceptions as pydantic_ai_exceptions,
 )
 
-
 logger = logging.getLogger(__name__)
 
 
+# clean_extracted_text's patterns, compiled once
+_LEADING_INDEX = re.compile(r"^\d+:\s*\'?")
+# A run of words hyphenated across whitespace ("a- b- c"). Starting at the
+# hyphen lets the regex engine skip straight to hyphens instead of trying
+# every letter.
+_HYPHENATED_RUN = re.compile(r"-(?<=[a-zA-Z]-)\s+[a-zA-Z](?:-\s+[a-zA-Z])*")
+_HYPHEN_BREAK = re.compile(r"-\s+([a-zA-Z])")
+
+
+def _join_hyphenated(match: re.Match) -> str:
+    # Same result as re.sub(r"([a-zA-Z])-\s+([a-zA-Z])", r"\1\2", ...): its
+    # matches can't share a letter, so in a run only every other break joins.
+    run = match.group(0)
+    if "-" not in run[1:]:
+        return run[-1]
+    return "".join(
+        brk.group(1) if i % 2 == 0 else brk.group(0)
+        for i, brk in enumerate(_HYPHEN_BREAK.finditer(run))
+    )
+
+
 def clean_extracted_text(text: str) -> str:
     """
     Applies a series of robust post-processing steps to text extracted from PDFs
@@ -24,105 +51,301 @@ def clean_extracted_text(text: str) -> str:
     if not isinstance(text, str):
         return ""
 
-    text = re.sub(r"^\d+:\s*\'?", "", text)
-    text = unicodedata.normalize("NFKC", text)
-    text = re.sub(r"([a-zA-Z])-\s+([a-zA-Z])", r"\1\2", text)
-    text = text.replace("\xa0", " ").replace("\u200b", "")
-    text = re.sub(r"(?<!\n)\n(?!\n)", " ", text)
-    text = re.sub(r"\n{2,}", "\n\n", text)
-    text = re.sub(r"\s+", " ", text)
-    text = text.strip()
+    # Same output as the original eight passes (leading index, NFKC, hyphen
+    # joins, NBSP/ZWSP, single newlines, blank lines, whitespace runs,
+    # strip) in four: NFKC already turns NBSP into a space, and collapsing
+    # whitespace covers both newline passes and the strip.
+    text = _LEADING_INDEX.sub("", text, count=1)
+    if not text.isascii():
+        text = unicodedata.normalize("NFKC", text)
+    text = _HYPHENATED_RUN.sub(_join_hyphenated, text)
+    text = text.replace("\u200b", "")
+    return " ".join(text.split())
+
 
-    return text
+def clean_extracted_texts(texts: Iterable[str]) -> List[str]:
+    """clean_extracted_text for a batch of pages or chunks."""
+    return [clean_extracted_text(text) for text in texts]
 
 
-def get_pdf_metadata(
-    md_text: str, max_retries: int = 3, retry_delay: int = 5
-):  # Added retry parameters
+def iter_pdf_pages(file_path: str) -> Iterator[str]:
     """
-    Calls the PDF metadata agent with the provided markdown text, logs the raw response,
-    and retries on failure.
+    Plain text of a PDF one page at a time, so only the current page is in
+    memory.
     """
-    attempt = 0
-    last_exception = None
-    while attempt < max_retries:
-        logger.info(
-            f"get_pdf_metadata: Attempt {attempt + 1}/{max_retries}. Calling agent with prompt based on md_text snippet (first 500 chars)."
-        )
-        try:
-            agent_run_result = pdf_metadata_agent.run_sync(md_text[:500])
-            logger.info(f"agent response is \n {agent_run_result}")
-            content = agent_run_result.output
-            logger.info(f"CONTENT: {content}")
-
-            # Check if content is not None and has title or authors, indicating a good response
-            # This check might need to be adjusted based on what a "good response" means for your PDFData object
-            if content and (hasattr(content, "title") or hasattr(content, "authors")):
-                # Convert the PDFData object to a dictionary
-                if hasattr(content, "model_dump"):
-                    return content.model_dump()  # For Pydantic v2+
-                elif hasattr(content, "dict"):
-                    return content.dict()  # For Pydantic v1
-                else:
-                    logger.error(
-                        "PDFData object does not have .model_dump() or .dict() method but was considered valid."
-                    )
-                    # This case should ideally not be hit if the content check above is robust
-                    raise TypeError(
-                        "Cannot convert PDFData object to dictionary despite initial validation."
-                    )
+    with pymupdf.open(file_path) as doc:
+        for page in doc:
+            yield page.get_text()
+
+
+_TRAILING_HYPHEN = re.compile(r"[a-zA-Z]-$")
+
+
+def iter_clean_text(pages: Iterable[str]) -> Iterator[str]:
+    """
+    clean_extracted_text applied page by page. Pages are separated by a space,
+    except that a word hyphenated across a page break is joined, as it is
+    within a page.
+    """
+    pending = ""
+    for page in pages:
+        text = clean_extracted_text(page)
+        if not text:
+            continue
+        if pending:
+            if _TRAILING_HYPHEN.search(pending) and text[0].isalpha():
+                yield pending[:-1]
             else:
-                logger.warning(
-                    f"Agent returned empty or incomplete content on attempt {attempt + 1}: {content}"
-                )
-                # This will lead to a retry if content is not satisfactory
-
-            # If the agent returns something that isn't an exception but isn't valid,
-            # we might want to treat it as a failure to trigger a retry.
-            # For now, we assume pydantic_ai will raise an exception for most failures.
-            # If it successfully returns but with empty/invalid data, the above 'if content' check handles it.
-
-        except pydantic_ai_exceptions.UnexpectedModelBehavior as e:
-            last_exception = e
-            logger.warning(
-                f"get_pdf_metadata: Attempt {attempt + 1} failed with UnexpectedModelBehavior: {e}. Retrying in {retry_delay} seconds..."
-            )
-            time.sleep(retry_delay)
-        except Exception as e:  # Catch other potential exceptions during the agent call
-            last_exception = e
-            logger.error(
-                f"get_pdf_metadata: Attempt {attempt + 1} failed with an unexpected error: {e}. Retrying in {retry_delay} seconds..."
-            )
-            time.sleep(retry_delay)
+                yield pending + " "
+        pending = text
+    if pending:
+        yield pending
+
+
+def iter_text_chunks(
+    texts: Iterable[str], chunker: RecursiveChunker = None, window_chars: int = None
+) -> Iterator[str]:
+    """
+    Chunks a stream of text without ever holding all of it. Text is buffered
+    until CHUNK_STREAM_WINDOW_CHARS, then chunked; every chunk but the last is
+    emitted, and the last one, which ends at the buffer's end rather than a
+    natural break, is carried into the next window. Peak memory is about one
+    window plus one piece of input.
+    """
+    chunker = chunker or RecursiveChunker()
+    window_chars = window_chars or settings.CHUNK_STREAM_WINDOW_CHARS
+    parts, size = [], 0
+    for text in texts:
+        parts.append(text)
+        size += len(text)
+        if size < window_chars:
+            continue
+        chunks = chunker("".join(parts))
+        if len(chunks) < 2:
+            continue
+        for chunk in chunks[:-1]:
+            yield chunk.text
+        parts, size = [chunks[-1].text], len(chunks[-1].text)
+    buffer = "".join(parts)
+    if buffer.strip():
+        for chunk in chunker(buffer):
+            yield chunk.text
+
+
+def iter_pdf_chunks(file_path: str) -> Iterator[str]:
+    """
+    Chunks of a PDF's cleaned text for requirement extraction, emitted while
+    its pages are still being read (pages -> cleaner -> chunker).
+    """
+    return iter_text_chunks(iter_clean_text(iter_pdf_pages(file_path)))
+
+
+class PDFMetadataError(Exception):
+    """Raised when the metadata agent answers without a usable title/authors."""
+
+
+def metadata_prompt(md_text: str, embedded: dict = None) -> str:
+    """
+    Builds the metadata agent prompt: the first 500 characters of markdown,
+    preceded by the title/author from the PDF's info dictionary when set.
+    """
+    hints = [
+        f"{label}: {embedded[key].strip()}"
+        for key, label in (("title", "Embedded title"), ("author", "Embedded author"))
+        if embedded and (embedded.get(key) or "").strip()
+    ]
+    if not hints:
+        return md_text[:500]
+    return "\n".join(hints) + "\n\n" + md_text[:500]
+
+
+def get_pdf_metadata(md_text: str, attempt: int = 1, embedded: dict = None):
+    """
+    Calls the PDF metadata agent once with the provided markdown text and logs
+    the raw response. Failures are raised rather than retried in place so the
+    caller can reschedule the attempt (see extract_metadata_task) instead of
+    sleeping on a worker slot.
+    """
+    logger.info(
+        f"get_pdf_metadata: Attempt {attempt}. Calling agent with prompt based on md_text snippet (first 500 chars)."
+    )
+    try:
+        content = run_agent_sync_cached(
+            pdf_metadata_agent,
+            metadata_prompt(md_text, embedded),
+            PDF_METADATA_SYSTEM_PROMPT,
+        )
+    except pydantic_ai_exceptions.UnexpectedModelBehavior as e:
+        logger.warning(
+            f"get_pdf_metadata: Attempt {attempt} failed with UnexpectedModelBehavior: {e}."
+        )
+        raise
+    except Exception as e:  # Catch other potential exceptions during the agent call
+        logger.error(
+            f"get_pdf_metadata: Attempt {attempt} failed with an unexpected error: {e}."
+        )
+        raise
 
-        attempt += 1
+    logger.info(f"CONTENT: {content}")
 
+    # Check if content is not None and has title or authors, indicating a good response
+    # This check might need to be adjusted based on what a "good response" means for your PDFData object
+    if not content or not (hasattr(content, "title") or hasattr(content, "authors")):
+        logger.warning(
+            f"Agent returned empty or incomplete content on attempt {attempt}: {content}"
+        )
+        raise PDFMetadataError(
+            f"Agent returned empty or invalid PDF metadata on attempt {attempt}."
+        )
+
+    # Convert the PDFData object to a dictionary
+    if hasattr(content, "model_dump"):
+        return content.model_dump()  # For Pydantic v2+
+    elif hasattr(content, "dict"):
+        return content.dict()  # For Pydantic v1
     logger.error(
-        f"get_pdf_metadata: Failed after {max_retries} attempts. Last exception: {last_exception}"
+        "PDFData object does not have .model_dump() or .dict() method but was considered valid."
+    )
+    raise TypeError(
+        "Cannot convert PDFData object to dictionary despite initial validation."
+    )
+
+
+def _convert_page_range(
+    file_path: str, pages: List[int], hdr_info: pymupdf4llm.IdentifyHeaders
+) -> str:
+    return pymupdf4llm.to_markdown(file_path, pages=pages, hdr_info=hdr_info)
+
+
+def page_ranges(page_count: int, pages_per_range: int) -> List[List[int]]:
+    """Splits 0..page_count-1 into consecutive ranges of pages_per_range pages."""
+    return [
+        list(range(start, min(start + pages_per_range, page_count)))
+        for start in range(0, page_count, pages_per_range)
+    ]
+
+
+# Called with (pages_converted, page_count) as a conversion advances
+ProgressCallback = Optional[Callable[[int, int], None]]
+
+
+def pdf_to_markdown(file_path: str, on_progress: ProgressCallback = None) -> str:
+    """
+    Runs pymupdf4llm on a PDF. Documents with MD_PARALLEL_MIN_PAGES pages or
+    more are split into page ranges converted in a process pool and joined in
+    page order, reporting each finished range to `on_progress`. Header levels
+    are identified once over the whole document and shared by every range,
+    so the output is identical to the serial path, which likewise
+    concatenates the per-page markdown.
+    """
+    with pymupdf.open(file_path) as doc:
+        page_count = doc.page_count
+        if doc.is_reflowable or page_count < settings.MD_PARALLEL_MIN_PAGES:
+            md_text = pymupdf4llm.to_markdown(doc)
+            if on_progress:
+                on_progress(page_count, page_count)
+            return md_text
+        hdr_info = pymupdf4llm.IdentifyHeaders(doc)
+
+    ranges = page_ranges(page_count, settings.MD_PARALLEL_PAGES_PER_RANGE)
+    max_workers = min(settings.MD_PARALLEL_WORKERS or os.cpu_count() or 1, len(ranges))
+    logger.info(
+        f"pdf_to_markdown: Converting {page_count} pages of {file_path} in {len(ranges)} ranges on {max_workers} processes"
     )
-    if last_exception:
-        raise last_exception
-    else:
-        # This case would be if all retries resulted in non-exception but "bad" (e.g. empty) content
-        raise Exception(
-            f"Failed to get valid PDF metadata after {max_retries} attempts. Last content was empty or invalid."
+    try:
+        parts = []
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            converted = pool.map(
+                _convert_page_range,
+                [file_path] * len(ranges),
+                ranges,
+                [hdr_info] * len(ranges),
+            )
+            for pages, part in zip(ranges, converted):
+                parts.append(part)
+                if on_progress:
+                    on_progress(pages[-1] + 1, page_count)
+    except (AssertionError, OSError) as e:
+        # e.g. daemonic worker processes that may not fork children
+        logger.warning(
+            f"pdf_to_markdown: Process pool unavailable ({e}), converting {file_path} serially"
         )
+        md_text = pymupdf4llm.to_markdown(file_path, hdr_info=hdr_info)
+        if on_progress:
+            on_progress(page_count, page_count)
+        return md_text
+    return "".join(parts)
+
+
+def convert_pdf_to_markdown(
+    file_path: str, content_sha256: str = None, on_progress: ProgressCallback = None
+) -> str:
+    """
+    Converts a PDF to markdown with pymupdf4llm, serving repeat conversions of
+    the same bytes (same converter version and options) from markdown_cache.
+    """
+    if not settings.MD_CACHE_ENABLED:
+        return pdf_to_markdown(file_path, on_progress)
+
+    if content_sha256 is None:
+        content_sha256 = file_sha256(file_path)
+    cache_key = markdown_cache.key_for(content_sha256)
+
+    md_text = markdown_cache.get(cache_key)
+    if md_text is not None:
+        logger.info(f"convert_pdf_to_markdown: Cache hit for {file_path}")
+        return md_text
+
+    logger.info(f"convert_pdf_to_markdown: Cache miss for {file_path}, converting")
+    md_text = pdf_to_markdown(file_path, on_progress)
+    markdown_cache.put(cache_key, md_text)
+    return md_text
+
+
+def save_pdf_markdown(
+    file_path: str, content_sha256: str = None, on_progress: ProgressCallback = None
+) -> str:
+    """
+    Converts a PDF to markdown and writes it next to the PDF as `<name>.md`.
+    """
+    md_text = convert_pdf_to_markdown(file_path, content_sha256, on_progress)
+    md_file_name = f"{file_path[:-4]}.md"
+    pathlib.Path(md_file_name).write_bytes(md_text.encode())
+    logger.info(f"save_pdf_markdown: Markdown content saved to: {md_file_name}")
+    return md_text
+
+
+def extract_front_matter(file_path: str, pages: int = None):
+    """
+    Reads just what metadata extraction needs: the PDF's info dictionary and
+    the markdown of its first `pages` pages (FAST_METADATA_PAGES by default).
+    Returns (embedded_metadata, md_text).
+    """
+    if pages is None:
+        pages = settings.FAST_METADATA_PAGES
+    with pymupdf.open(file_path) as doc:
+        embedded = {key: value for key, value in (doc.metadata or {}).items() if value}
+        front_pages = list(range(min(pages, doc.page_count)))
+        # Header levels from the front pages' font sizes only; the default
+        # scans every page of the document
+        hdr_info = pymupdf4llm.IdentifyHeaders(doc, pages=front_pages)
+        md_text = pymupdf4llm.to_markdown(doc, pages=front_pages, hdr_info=hdr_info)
+    return embedded, md_text
 
 
 def parse_pdf(file_path: str):  # Return type will be whatever get_pdf_metadata returns
     """
-    Parses a PDF to markdown, then calls get_pdf_metadata to extract metadata.
+    Extracts title and authors from the first page(s) and embedded metadata of
+    a PDF. The full markdown conversion is a separate stage (save_pdf_markdown,
+    run by convert_pdf_markdown_task).
     """
     logger.info(f"parse_pdf: Starting PDF parsing for: {file_path}")
 
     try:
-        md_text = pymupdf4llm.to_markdown(file_path)
-        md_file_name = f"{file_path[:-4]}.md"
-        pathlib.Path(md_file_name).write_bytes(md_text.encode())
-        logger.info(f"parse_pdf: Markdown content saved to: {md_file_name}")
+        embedded, md_text = extract_front_matter(file_path)
 
         # Call the simplified get_pdf_metadata
-        raw_metadata_result = get_pdf_metadata(md_text)
+        raw_metadata_result = get_pdf_metadata(md_text, embedded=embedded)
 
         logger.info(
             f"parse_pdf: Result from get_pdf_metadata for {file_path}: {raw_metadata_result}"
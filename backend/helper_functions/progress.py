@@ -0,0 +1,129 @@
+"""
+Per-task progress events, pushed through Redis instead of polled.
+
+Every event is appended to a short-lived Redis list (so a client connecting
+late, or reconnecting, can replay what it missed) and published on the
+task's pub/sub channel. Events carry a sequence number, which doubles as the
+Server-Sent Events id for Last-Event-ID resumption.
+
+Ingestion stages publish, in order: uploaded, converted, metadata_extracted,
+persisted, then pages_converted while the full markdown conversion runs and
+markdown_converted once it's done. Requirement extraction jobs publish
+chunked, chunk_extracted (or chunk_failed) per chunk, then
+requirements_persisted. A failed stage publishes failed.
+"""
+
+import json
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+
+import redis
+
+from config import settings
+from db.redis_conn import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_CHANNEL = "task_progress:{}"
+PROGRESS_LOG_KEY = "task_progress_log:{}"
+PROGRESS_SEQ_KEY = "task_progress_seq:{}"
+
+# Stages after which nothing more is published for a task
+TERMINAL_STAGES = {"markdown_converted", "requirements_persisted", "failed"}
+
+
+def _event(task_id: str, stage: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    return {"task_id": task_id, "stage": stage, "time": time.time(), **data}
+
+
+def publish_progress(task_id: Optional[str], stage: str, **data: Any) -> None:
+    """
+    Records and publishes a progress event for `task_id` (from Celery tasks).
+    Redis errors are logged, never raised: progress is best effort.
+    """
+    if not task_id:
+        return
+    event = _event(task_id, stage, data)
+    log_key = PROGRESS_LOG_KEY.format(task_id)
+    try:
+        client = get_redis()
+        seq_key = PROGRESS_SEQ_KEY.format(task_id)
+        event["seq"] = client.incr(seq_key)
+        payload = json.dumps(event)
+        with client.pipeline() as pipe:
+            pipe.rpush(log_key, payload)
+            pipe.expire(log_key, settings.PROGRESS_EVENTS_TTL_SECONDS)
+            pipe.expire(seq_key, settings.PROGRESS_EVENTS_TTL_SECONDS)
+            pipe.publish(PROGRESS_CHANNEL.format(task_id), payload)
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(
+            f"publish_progress: Could not publish {stage} for {task_id}: {e}"
+        )
+
+
+async def apublish_progress(task_id: str, stage: str, **data: Any) -> None:
+    """publish_progress for the API's event loop."""
+    event = _event(task_id, stage, data)
+    log_key = PROGRESS_LOG_KEY.format(task_id)
+    try:
+        client = get_async_redis()
+        seq_key = PROGRESS_SEQ_KEY.format(task_id)
+        event["seq"] = await client.incr(seq_key)
+        payload = json.dumps(event)
+        async with client.pipeline() as pipe:
+            pipe.rpush(log_key, payload)
+            pipe.expire(log_key, settings.PROGRESS_EVENTS_TTL_SECONDS)
+            pipe.expire(seq_key, settings.PROGRESS_EVENTS_TTL_SECONDS)
+            pipe.publish(PROGRESS_CHANNEL.format(task_id), payload)
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(
+            f"apublish_progress: Could not publish {stage} for {task_id}: {e}"
+        )
+
+
+async def progress_events(
+    task_id: str, last_seq: int = 0, timeout: float = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields the progress events of `task_id` with a sequence number above
+    `last_seq`: first those already recorded, then live ones, until a
+    terminal stage is seen or `timeout` seconds pass without an event.
+    """
+    if timeout is None:
+        timeout = settings.PROGRESS_STREAM_IDLE_TIMEOUT_SECONDS
+    client = get_async_redis()
+    pubsub = client.pubsub()
+    # Subscribe before replaying so nothing published in between is lost
+    await pubsub.subscribe(PROGRESS_CHANNEL.format(task_id))
+    try:
+        recorded = await client.lrange(PROGRESS_LOG_KEY.format(task_id), 0, -1)
+        for event in sorted((json.loads(p) for p in recorded), key=lambda e: e["seq"]):
+            if event["seq"] <= last_seq:
+                continue
+            last_seq = event["seq"]
+            yield event
+            if event["stage"] in TERMINAL_STAGES:
+                return
+
+        deadline = asyncio.get_running_loop().time() + timeout
+        while (remaining := deadline - asyncio.get_running_loop().time()) > 0:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=remaining
+            )
+            if message is None:
+                continue
+            event = json.loads(message["data"])
+            if event["seq"] <= last_seq:
+                continue
+            last_seq = event["seq"]
+            deadline = asyncio.get_running_loop().time() + timeout
+            yield event
+            if event["stage"] in TERMINAL_STAGES:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
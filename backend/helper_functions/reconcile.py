@@ -0,0 +1,241 @@
+"""
+Reconciles the OCR and markdown extractions of a PDF locally, asking the
+LLM only about the regions where they disagree.
+
+The two extractions are aligned page by page as word sequences (difflib,
+ignoring case and markdown syntax). Text they agree on keeps the markdown,
+formatting included. A disagreement goes to the LLM only if the OCR side
+has words and either side has at least RECONCILE_MIN_WORDS of them.
+Smaller ones, such as an OCR typo or a stray page number, keep the
+markdown. Regions are sent with a few words of context, in token-budgeted
+batches, so prompts are a small fraction of the two documents. A page
+only one extraction found text on is taken from that one as is.
+"""
+
+import re
+import json
+import asyncio
+import logging
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Dict, List, Tuple
+
+from agents.reconcile import RECONCILE_SYSTEM_PROMPT, reconcile_agent
+from config import settings
+from helper_functions.llm_cache import run_agent_sync_cached
+from helper_functions.md_sections import token_counter
+
+logger = logging.getLogger(__name__)
+
+# A word: letters/digits, optionally joined by apostrophes or hyphens.
+# Markdown syntax (#, *, _, |, links' brackets) is not part of any word.
+_WORD = re.compile(r"[^\W_]+(?:['’-][^\W_]+)*")
+# A word hyphenated across an OCR line break
+_OCR_HYPHENATED = re.compile(r"(?<=[^\W\d_])-[ \t]*\n\s*(?=[^\W\d_])")
+# Divergences separated by fewer agreeing words are one region
+_MERGE_GAP_WORDS = 3
+
+Word = Tuple[str, int, int]  # (normalized word, start, end)
+
+
+@dataclass
+class Region:
+    """A divergent region: markdown[start:end] of a page, and what OCR read there."""
+
+    id: int
+    page: int
+    start: int
+    end: int
+    markdown: str
+    ocr: str
+    before: str
+    after: str
+
+
+@dataclass
+class Reconciliation:
+    text: str
+    pages: int
+    # Divergent regions sent to the LLM, and smaller ones kept from markdown
+    regions: int
+    kept_markdown: int
+    requests: int
+    # Tokens of the region prompts, and of both extractions in full
+    prompt_tokens: int
+    document_tokens: int
+
+
+def _words(text: str) -> List[Word]:
+    return [(m.group().lower(), m.start(), m.end()) for m in _WORD.finditer(text)]
+
+
+def _divergences(md_words: List[Word], ocr_words: List[Word]):
+    """(i1, i2, j1, j2) word ranges where the extractions disagree, merged when close."""
+    matcher = SequenceMatcher(
+        None, [w[0] for w in md_words], [w[0] for w in ocr_words], autojunk=False
+    )
+    merged = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if merged and i1 - merged[-1][1] < _MERGE_GAP_WORDS:
+            merged[-1] = (merged[-1][0], i2, merged[-1][2], j2)
+        else:
+            merged.append((i1, i2, j1, j2))
+    return merged
+
+
+def align_page(
+    page: int, markdown: str, ocr: str, first_id: int = 0
+) -> Tuple[List[Region], int]:
+    """
+    The regions of one page the LLM should reconcile, and the number of
+    smaller divergences left as markdown.
+    """
+    md_words, ocr_words = _words(markdown), _words(ocr)
+    context = settings.RECONCILE_CONTEXT_WORDS
+    regions, kept = [], 0
+    for i1, i2, j1, j2 in _divergences(md_words, ocr_words):
+        if j1 == j2 or max(i2 - i1, j2 - j1) < settings.RECONCILE_MIN_WORDS:
+            kept += 1
+            continue
+        if i1 == i2:
+            # OCR-only words: widen both sides by the agreeing word next to
+            # them, so every region has a place in the markdown
+            if i1 > 0 and j1 > 0:
+                i1, j1 = i1 - 1, j1 - 1
+            elif i2 < len(md_words):
+                i2, j2 = i2 + 1, min(j2 + 1, len(ocr_words))
+            else:
+                kept += 1
+                continue
+        start, end = md_words[i1][1], md_words[i2 - 1][2]
+        before = md_words[max(i1 - context, 0)][1]
+        after = md_words[min(i2 + context, len(md_words)) - 1][2]
+        regions.append(
+            Region(
+                id=first_id + len(regions),
+                page=page,
+                start=start,
+                end=end,
+                markdown=markdown[start:end],
+                ocr=ocr[ocr_words[j1][1] : ocr_words[j2 - 1][2]],
+                before=markdown[before:start],
+                after=markdown[end:after],
+            )
+        )
+    return regions, kept
+
+
+def _region_prompt(regions: List[Region]) -> str:
+    return json.dumps(
+        {
+            "regions": [
+                {
+                    "id": region.id,
+                    "before": region.before,
+                    "markdown": region.markdown,
+                    "ocr": region.ocr,
+                    "after": region.after,
+                }
+                for region in regions
+            ]
+        },
+        ensure_ascii=False,
+    )
+
+
+def _batches(regions: List[Region], budget: int, count_tokens) -> List[List[Region]]:
+    batches, batch, batch_tokens = [], [], 0
+    for region in regions:
+        tokens = count_tokens(_region_prompt([region]))
+        if batch and batch_tokens + tokens > budget:
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(region)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def _resolve(prompt: str, regions: List[Region]) -> Dict[int, str]:
+    try:
+        output = await asyncio.to_thread(
+            run_agent_sync_cached, reconcile_agent, prompt, RECONCILE_SYSTEM_PROMPT
+        )
+    except Exception as e:
+        logger.warning(
+            f"reconcile: Keeping the markdown of {len(regions)} regions, LLM call failed: {e}"
+        )
+        return {}
+    ids = {region.id for region in regions}
+    return {r.id: r.text for r in output.resolutions if r.id in ids}
+
+
+async def reconcile_extractions(
+    markdown_pages: List[str], ocr_pages: List[str]
+) -> Reconciliation:
+    """
+    Merges per-page markdown and OCR extractions of one PDF into a single
+    text. Regions the LLM can't resolve keep their markdown. If the page
+    counts differ, the documents are aligned as a whole.
+    """
+    if len(markdown_pages) != len(ocr_pages):
+        logger.warning(
+            f"reconcile_extractions: {len(markdown_pages)} markdown pages but {len(ocr_pages)} OCR pages, aligning whole documents"
+        )
+        markdown_pages, ocr_pages = ["".join(markdown_pages)], ["".join(ocr_pages)]
+    # Budgeted in the tokens of the model reconcile_agent calls
+    count_tokens = token_counter(reconcile_agent.model.model_name)
+    document_tokens = count_tokens("".join(markdown_pages)) + count_tokens(
+        "".join(ocr_pages)
+    )
+    markdown_pages = list(markdown_pages)
+    ocr_pages = [_OCR_HYPHENATED.sub("", ocr) for ocr in ocr_pages]
+
+    regions, kept = [], 0
+    for page, (markdown, ocr) in enumerate(zip(markdown_pages, ocr_pages)):
+        if not _WORD.search(markdown):
+            # Nothing to reconcile against: a scanned page, or a blank one
+            markdown_pages[page] = ocr if _WORD.search(ocr) else markdown
+            continue
+        page_regions, page_kept = align_page(page, markdown, ocr, len(regions))
+        regions.extend(page_regions)
+        kept += page_kept
+
+    prompts = [
+        (_region_prompt(batch), batch)
+        for batch in _batches(regions, settings.RECONCILE_BATCH_TOKENS, count_tokens)
+    ]
+    resolutions = {}
+    for resolved in await asyncio.gather(*(_resolve(*prompt) for prompt in prompts)):
+        resolutions.update(resolved)
+
+    by_page: Dict[int, List[Region]] = {}
+    for region in regions:
+        by_page.setdefault(region.page, []).append(region)
+    parts = []
+    for page, markdown in enumerate(markdown_pages):
+        cursor = 0
+        for region in by_page.get(page, []):
+            parts.append(markdown[cursor : region.start])
+            parts.append(resolutions.get(region.id, region.markdown))
+            cursor = region.end
+        parts.append(markdown[cursor:])
+
+    result = Reconciliation(
+        text="".join(parts),
+        pages=len(markdown_pages),
+        regions=len(regions),
+        kept_markdown=kept,
+        requests=len(prompts),
+        prompt_tokens=sum(count_tokens(prompt) for prompt, _ in prompts),
+        document_tokens=document_tokens,
+    )
+    logger.info(
+        f"reconcile_extractions: {result.regions} divergent regions ({result.kept_markdown} minor ones kept as markdown) "
+        f"over {result.pages} pages in {result.requests} requests, {result.prompt_tokens} prompt tokens "
+        f"for {result.document_tokens} document tokens"
+    )
+    return result
@@ -0,0 +1,53 @@
+"""
+Cluster-wide concurrency limits for Celery tasks, kept in Redis.
+
+A slot is a member of a sorted set scored by the time it was taken. Slots
+older than the lease are dropped on every acquire, so a worker that dies
+while holding one can't leak it for longer than `lease_seconds`.
+"""
+
+import time
+import uuid
+import logging
+from typing import Optional
+
+import redis
+
+from db.redis_conn import get_redis
+
+logger = logging.getLogger(__name__)
+
+SEMAPHORE_KEY = "semaphore:{}"
+
+
+def acquire_slot(name: str, limit: int, lease_seconds: float) -> Optional[str]:
+    """
+    Takes one of `limit` slots of semaphore `name`. Returns a token to pass to
+    release_slot, or None if all slots are taken. If Redis is unavailable
+    the limit is not enforced and a token is returned anyway.
+    """
+    key = SEMAPHORE_KEY.format(name)
+    token = uuid.uuid4().hex
+    now = time.time()
+    try:
+        client = get_redis()
+        with client.pipeline() as pipe:
+            pipe.zremrangebyscore(key, "-inf", now - lease_seconds)
+            pipe.zadd(key, {token: now})
+            pipe.zrank(key, token)
+            pipe.expire(key, int(lease_seconds) + 1)
+            _, _, rank, _ = pipe.execute()
+        if rank is not None and rank < limit:
+            return token
+        client.zrem(key, token)
+        return None
+    except redis.RedisError as e:
+        logger.warning(f"acquire_slot: Not enforcing {name} limit: {e}")
+        return token
+
+
+def release_slot(name: str, token: str) -> None:
+    try:
+        get_redis().zrem(SEMAPHORE_KEY.format(name), token)
+    except redis.RedisError as e:
+        logger.warning(f"release_slot: Could not release {name} slot: {e}")
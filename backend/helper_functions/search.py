@@ -0,0 +1,237 @@
+"""
+Hybrid search over knowledge base chunks and papers, behind /search.
+
+Chunks are ranked by pgvector similarity and by full-text rank over their
+stored tsvector, papers by title and extracted-requirement full-text rank;
+each pair of rankings is merged with reciprocal rank fusion in a single
+prepared statement (see db.search). The query is embedded once and looked
+up in both databases concurrently.
+
+Hot queries are answered from small in-process TTL caches: one of whole
+results (SEARCH_CACHE_*) and one of query embeddings
+(SEARCH_EMBEDDING_CACHE_*), since embedding the query is usually the
+slowest step. Results can lag ingestion by up to SEARCH_CACHE_TTL_SECONDS.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from psycopg2 import errors
+
+from config import settings
+from db.conn import engine_connection, get_db_connection, release_db_connection
+from db.search import (
+    ensure_chunk_search_column,
+    hybrid_search_chunks,
+    hybrid_search_papers,
+)
+from helper_functions.knowledge_base import get_knowledge_base
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SCOPES = ("all", "chunks", "papers")
+
+
+class TTLCache:
+    """A thread-safe LRU of at most `max_entries`, expiring after `ttl_seconds`."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+result_cache = TTLCache(
+    settings.SEARCH_CACHE_MAX_ENTRIES, settings.SEARCH_CACHE_TTL_SECONDS
+)
+embedding_cache = TTLCache(
+    settings.SEARCH_EMBEDDING_CACHE_MAX_ENTRIES,
+    settings.SEARCH_EMBEDDING_CACHE_TTL_SECONDS,
+)
+
+
+def normalize_query(query: str) -> str:
+    """Collapses whitespace and case, so trivially different queries share cache entries."""
+    return " ".join(query.lower().split())
+
+
+def embed_query(query: str) -> List[float]:
+    embedding = embedding_cache.get(query)
+    if embedding is None:
+        embedding = get_knowledge_base().vector_db.embedder.get_embedding(query)
+        embedding_cache.put(query, embedding)
+    return embedding
+
+
+# Knowledge base tables this process has found searchable
+_searchable_tables = set()
+_searchable_lock = threading.Lock()
+
+
+def _ensure_searchable(vector_db) -> bool:
+    """
+    Whether the knowledge base table exists, adding its full-text column
+    first if needed: ingest_knowledge_base adds it, but tables created before
+    (or without) an ingestion lack it.
+    """
+    table = (vector_db.schema, vector_db.table_name)
+    if table in _searchable_tables:
+        return True
+    with _searchable_lock:
+        if table in _searchable_tables:
+            return True
+        if not vector_db.exists():
+            return False
+        with engine_connection(vector_db.db_engine) as conn:
+            ensure_chunk_search_column(conn, vector_db.schema, vector_db.table_name)
+        _searchable_tables.add(table)
+    return True
+
+
+def _search_chunks(query: str, k: int, ef_search: Optional[int]):
+    vector_db = get_knowledge_base().vector_db
+    if not _ensure_searchable(vector_db):
+        logger.info(
+            f"_search_chunks: No knowledge base table {vector_db.table_name} yet, no chunk results"
+        )
+        return []
+    embedding = embed_query(query)
+    with engine_connection(vector_db.db_engine) as conn:
+        with conn.cursor() as cursor:
+            try:
+                return hybrid_search_chunks(
+                    cursor,
+                    vector_db.schema,
+                    vector_db.table_name,
+                    embedding,
+                    query,
+                    k=k,
+                    candidates=settings.SEARCH_CANDIDATES,
+                    rrf_k=settings.SEARCH_RRF_K,
+                    semantic_weight=settings.SEARCH_SEMANTIC_WEIGHT,
+                    keyword_weight=settings.SEARCH_KEYWORD_WEIGHT,
+                    ef_search=ef_search,
+                )
+            except (errors.UndefinedTable, errors.UndefinedColumn) as e:
+                # Dropped or recreated since it was checked: check it again
+                # on the next search
+                _searchable_tables.discard((vector_db.schema, vector_db.table_name))
+                logger.warning(f"_search_chunks: No chunk results: {e}")
+                return []
+
+
+def _search_papers(query: str, k: int):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            return hybrid_search_papers(
+                cursor,
+                query,
+                k=k,
+                candidates=settings.SEARCH_CANDIDATES,
+                rrf_k=settings.SEARCH_RRF_K,
+            )
+    finally:
+        release_db_connection(conn)
+
+
+async def hybrid_search(
+    query: str, k: int = 10, scope: str = "all", ef_search: int = None
+) -> Dict[str, Any]:
+    """
+    The `k` best chunks and/or papers (per `scope`) for `query`, served from
+    result_cache when the same search ran within SEARCH_CACHE_TTL_SECONDS.
+    A scope whose search fails returns no results and its error under
+    "errors", without failing the other scope; such responses aren't cached.
+    """
+    query = normalize_query(query)
+    key = (query, k, scope, ef_search)
+    started = time.perf_counter()
+    cached = result_cache.get(key)
+    if cached is not None:
+        return {**cached, "cached": True, "took_ms": _elapsed_ms(started)}
+
+    searches = {}
+    if scope in ("all", "chunks"):
+        searches["chunks"] = run_in_threadpool(_search_chunks, query, k, ef_search)
+    if scope in ("all", "papers"):
+        searches["papers"] = run_in_threadpool(_search_papers, query, k)
+    results, search_errors = {}, {}
+    outcomes = await asyncio.gather(*searches.values(), return_exceptions=True)
+    for name, outcome in zip(searches, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(
+                f"hybrid_search: {name} search for '{query}' failed: {outcome}"
+            )
+            results[name], search_errors[name] = [], str(outcome)
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            results[name] = outcome
+
+    response = {"query": query, **results}
+    if search_errors:
+        response["errors"] = search_errors
+    else:
+        result_cache.put(key, response)
+    took_ms = _elapsed_ms(started)
+    logger.info(
+        f"hybrid_search: '{query}' ({scope}, k={k}) in {took_ms:.1f}ms: "
+        + ", ".join(f"{len(rows)} {name}" for name, rows in results.items())
+    )
+    return {**response, "cached": False, "took_ms": took_ms}
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def search_cache_stats() -> Dict[str, Any]:
+    return {"results": result_cache.stats(), "embeddings": embedding_cache.stats()}
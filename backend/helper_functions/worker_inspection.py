@@ -0,0 +1,100 @@
+"""
+Background sampling of Celery worker inspection.
+
+`celery.control.inspect().active()` broadcasts to every worker and waits for
+their replies, so running it per dashboard request multiplies broker traffic
+and request latency by the number of pollers. ActiveTasksSampler runs it on a
+fixed interval in the API process and serves the last snapshot from memory;
+a request only triggers an inspection itself when the snapshot is older than
+the staleness bound (e.g. the sampler fell behind), and concurrent requests
+share that one inspection.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class ActiveTasksSampler:
+    def __init__(
+        self,
+        inspect_active: Callable[[], Optional[Dict[str, Any]]],
+        interval_seconds: float,
+        max_staleness_seconds: float,
+    ):
+        self.inspect_active = inspect_active
+        self.interval_seconds = interval_seconds
+        self.max_staleness_seconds = max_staleness_seconds
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._sampled_at = 0.0  # time.monotonic() of the last sample
+        self._sampled_at_wall = 0.0
+        self._error: Optional[str] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def age(self) -> Optional[float]:
+        """Seconds since the last sample, None before the first one."""
+        if not self._sampled_at:
+            return None
+        return time.monotonic() - self._sampled_at
+
+    def _is_fresh(self, max_age: float) -> bool:
+        age = self.age()
+        return age is not None and age <= max_age
+
+    async def refresh(self, max_age: float = 0.0) -> None:
+        """
+        Samples the workers unless a sample younger than `max_age` seconds
+        already exists (e.g. taken by a concurrent caller while waiting).
+        """
+        async with self._lock:
+            if max_age and self._is_fresh(max_age):
+                return
+            try:
+                snapshot = await run_in_threadpool(self.inspect_active)
+                error = None
+            except Exception as e:
+                # Broker down or workers unreachable: keep serving the error
+                # until the next sample instead of retrying per request
+                logger.warning(f"ActiveTasksSampler: inspection failed: {e}")
+                snapshot, error = None, str(e)
+            self._snapshot, self._error = snapshot, error
+            self._sampled_at = time.monotonic()
+            self._sampled_at_wall = time.time()
+
+    async def get(self) -> Dict[str, Any]:
+        """
+        Returns the latest sample, refreshing it first if it is older than
+        max_staleness_seconds.
+        """
+        if not self._is_fresh(self.max_staleness_seconds):
+            await self.refresh(max_age=self.max_staleness_seconds)
+        return {
+            "active": self._snapshot,
+            "error": self._error,
+            "sampled_at": self._sampled_at_wall,
+            "age_seconds": self.age(),
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,6 @@
+-- depends: 0001_initial_schema
+
+ALTER TABLE papers ADD COLUMN IF NOT EXISTS content_sha256 TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS papers_content_sha256_idx
+    ON papers (content_sha256);
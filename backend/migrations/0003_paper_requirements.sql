@@ -0,0 +1,12 @@
+-- depends: 0002_paper_content_hash
+
+CREATE TABLE IF NOT EXISTS paper_requirements (
+    id SERIAL PRIMARY KEY,
+    paper_id TEXT NOT NULL REFERENCES papers(uuid) ON DELETE CASCADE,
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    requirement TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (paper_id, position)
+);
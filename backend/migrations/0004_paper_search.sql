@@ -0,0 +1,14 @@
+-- depends: 0003_paper_requirements
+
+-- Stored full-text vectors for /search, kept up to date by PostgreSQL itself
+ALTER TABLE papers ADD COLUMN IF NOT EXISTS search_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(title, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS papers_search_tsv_idx
+    ON papers USING gin (search_tsv);
+
+ALTER TABLE paper_requirements ADD COLUMN IF NOT EXISTS search_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', requirement)) STORED;
+
+CREATE INDEX IF NOT EXISTS paper_requirements_search_tsv_idx
+    ON paper_requirements USING gin (search_tsv);
@@ -1,6 +1,5 @@
 import os
 import asyncio
-import openai
 import fitz  # PyMuPDF
 import pymupdf4llm
 
@@ -9,13 +8,12 @@ from langchain_experimental.graph_transformers import LLMGraphTransformer
 from langchain_openai import ChatOpenAI
 from langchain_core.documents import Document
 
-from pdf2image import convert_from_path
-import pytesseract
+from helper_functions.llm_gateway import async_http_client, http_client, openai_client
+from helper_functions.ocr import extract_pages_with_ocr
+from helper_functions.reconcile import reconcile_extractions
 
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
+if not os.getenv("OPENAI_API_KEY"):
     raise ValueError("OPENAI_API_KEY environment variable not set.")
-openai.api_key = openai_api_key
 
 os.environ["NEO4J_URI"] = "bolt://neo4j:7687"
 os.environ["NEO4J_USERNAME"] = "neo4j"
@@ -26,27 +24,23 @@ graph = Neo4jGraph(refresh_schema=False)
 llm = ChatOpenAI(
     temperature=0,
     model_name="gpt-4.1",  # Or your preferred model
+    http_client=http_client("openai"),
+    http_async_client=async_http_client("openai"),
 )
 llm_transformer = LLMGraphTransformer(llm=llm)
 
 
-def extract_text_from_pdf(pdf_path):
-    doc = pymupdf4llm.to_markdown(pdf_path)
-    return doc
-
-
-def extract_text_with_ocr(pdf_path):
-    pages = convert_from_path(pdf_path)
-    text = ""
-    for page in pages:
-        text += pytesseract.image_to_string(page)
-    return text
+def extract_pages_from_pdf(pdf_path):
+    chunks = pymupdf4llm.to_markdown(pdf_path, page_chunks=True)
+    return [chunk["text"] for chunk in chunks]
 
 
 async def main():
     pdf_path = "036_ISA_Project_Air_Traffic_Requirements.pdf"
-    md_text = extract_text_from_pdf(pdf_path)
-    ocr_text = extract_text_with_ocr(pdf_path)
+    md_pages = extract_pages_from_pdf(pdf_path)
+    ocr_pages = extract_pages_with_ocr(pdf_path)
+    # Only the regions where the two extractions disagree go to the LLM
+    reconciled = await reconcile_extractions(md_pages, ocr_pages)
 
     PROMPT = """
 You are an expert Requirements Engineer, trained in NASA's guidelines for writing good requirements (see Appendix C: "How to Write a Good Requirement—Checklist"). Your task is to analyze the provided document and:
@@ -81,16 +75,14 @@ Main System: Transport Modelling System
 - Ensure all entities are connected in the hierarchy, with requirements attached at the correct level.
 - Use as many layers of entities as needed to reflect the document's structure.
 
-1. OCR extraction (may contain errors or missing formatting)
-2. Markdown extraction (may miss some text, but preserves structure)
+The document below was merged from an OCR extraction and a markdown extraction.
     Your task:
-    - Carefully compare both versions.
-    - Merge them to produce a complete, accurate, and well-structured set of requirements.
+    - Produce a complete, accurate, and well-structured set of requirements from it.
     - Rewrite every requirement according to NASA's guidelines: <Entity> <shall/will/should> <requirement>.
     - Organize requirements into a hierarchy of entities, as previously described.
 """
 
-    response = openai.chat.completions.create(
+    response = openai_client("openai").chat.completions.create(
         model="gpt-4o",
         messages=[
             {
@@ -99,9 +91,7 @@ Main System: Transport Modelling System
             },
             {
                 "role": "user",
-                "content": PROMPT
-                + f"OCR extraction (may contain errors or missing formatting) {ocr_text}"
-                + f"Markdown extraction (may miss some text, but preserves structure) {md_text}",
+                "content": PROMPT + f"Document: {reconciled.text}",
             },
         ],
         temperature=0,
@@ -140,7 +130,7 @@ Main System: Transport Modelling System
     # {md_text}
     # """
 
-    # response = openai.chat.completions.create(
+    # response = openai_client("openai").chat.completions.create(
     #     model="gpt-4o",
     #     messages=[
     #         {"role": "system", "content": "You are a helpful assistant."},
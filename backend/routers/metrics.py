@@ -0,0 +1,47 @@
+from fastapi import APIRouter
+
+from db.conn import get_db_pool_metrics
+from helper_functions.llm_cache import llm_cache
+from helper_functions.llm_gateway import gateway_metrics
+from helper_functions.search import search_cache_stats
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"],
+)
+
+
+@router.get("/db_pools")
+async def db_pool_metrics():
+    """
+    Checkout, wait-time and health-check counters for this API process's
+    database connection pools.
+    """
+    return get_db_pool_metrics()
+
+
+@router.get("/llm_cache")
+async def llm_cache_metrics():
+    """
+    Hit/miss, eviction and size counters for this API process's LLM response
+    cache (the Redis layer is shared, the counters are per process).
+    """
+    return llm_cache.stats()
+
+
+@router.get("/llm")
+async def llm_gateway_metrics():
+    """
+    Per-provider request counts, queueing, latency percentiles and token usage
+    of this API process's LLM gateway.
+    """
+    return gateway_metrics()
+
+
+@router.get("/search_cache")
+async def search_cache_metrics():
+    """
+    Hit/miss and size counters for this API process's /search result and
+    query embedding caches.
+    """
+    return search_cache_stats()
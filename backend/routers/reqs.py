@@ -1,18 +1,78 @@
 import os
+import json
 import uuid
+import hashlib
+from typing import Optional
+
 from fastapi import APIRouter, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from celery.result import AsyncResult
 
-from tasks.pdf_tasks import get_pdf_data_task
+from celery_app import celery
+from config import settings
+from db.papers import find_paper_by_content_hash
+from db.redis_conn import get_async_redis
+from helper_functions.progress import apublish_progress
+from tasks.pdf_tasks import ingest_pdf
 
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads/")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Redis key holding the in-flight ingestion for a given PDF content hash
+UPLOAD_HASH_KEY = "upload:sha256:{}"
+
 router = APIRouter(
     prefix="/requirements",
     tags=["Requirements"],
 )
 
 
+def _write_chunk(out, hasher, chunk: bytes) -> None:
+    # hashlib releases the GIL for large buffers, so hashing here keeps the
+    # event loop free as well as the disk write.
+    hasher.update(chunk)
+    out.write(chunk)
+
+
+async def stream_upload_to_disk(file: UploadFile, file_path: str) -> str:
+    """
+    Streams an upload to `file_path` in fixed-size chunks and returns the
+    SHA-256 hex digest of its content. Blocking I/O runs in the threadpool.
+    """
+    hasher = hashlib.sha256()
+    out = await run_in_threadpool(open, file_path, "wb")
+    try:
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            await run_in_threadpool(_write_chunk, out, hasher, chunk)
+    finally:
+        await run_in_threadpool(out.close)
+    return hasher.hexdigest()
+
+
+async def claim_upload_hash(content_sha256: str, claim: dict) -> Optional[dict]:
+    """
+    Records `claim` as the ingestion for `content_sha256`. Returns the existing
+    claim instead if another upload of the same content is still in flight.
+    """
+    redis_client = get_async_redis()
+    key = UPLOAD_HASH_KEY.format(content_sha256)
+    ttl = settings.UPLOAD_DEDUP_TTL_SECONDS
+
+    if await redis_client.set(key, json.dumps(claim), nx=True, ex=ttl):
+        return None
+
+    existing = json.loads(await redis_client.get(key) or "{}")
+    task_id = existing.get("task_id")
+    if task_id:
+        state = await run_in_threadpool(lambda: AsyncResult(task_id, app=celery).state)
+        if state != "FAILURE":
+            return existing
+
+    # The previous ingestion failed (or the claim expired mid-read): take over.
+    await redis_client.set(key, json.dumps(claim), ex=ttl)
+    return None
+
+
 @router.get("/")
 async def test_req():
     return "OK"
@@ -22,13 +82,51 @@ async def test_req():
 async def upload_req(file: UploadFile = File(...)):
     if file.content_type != "application/pdf":
         return {"error": "Only PDF files are allowed."}
-    file_name = f"{uuid.uuid4().hex}.pdf"
-    file_path = os.path.join(UPLOAD_DIR, file_name)
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    paper_id = uuid.uuid4().hex
+    file_path = os.path.join(UPLOAD_DIR, f"{paper_id}.pdf")
+    part_path = f"{file_path}.part"
+
+    try:
+        content_sha256 = await stream_upload_to_disk(file, part_path)
+    except Exception:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    existing_paper = await run_in_threadpool(find_paper_by_content_hash, content_sha256)
+    if existing_paper:
+        os.remove(part_path)
+        return {
+            "message": f"PDF file {file.filename} was already ingested as paper {existing_paper['uuid']}.",
+            "paper_id": existing_paper["uuid"],
+            "content_sha256": content_sha256,
+            "duplicate": True,
+        }
+
+    task_id = uuid.uuid4().hex
+    claim = {"task_id": task_id, "paper_id": paper_id, "file_path": file_path}
+    existing_claim = await claim_upload_hash(content_sha256, claim)
+    if existing_claim:
+        os.remove(part_path)
+        return {
+            "message": f"PDF file {file.filename} is already being ingested x: {existing_claim['task_id']}.",
+            "task_id": existing_claim["task_id"],
+            "paper_id": existing_claim["paper_id"],
+            "content_sha256": content_sha256,
+            "duplicate": True,
+        }
 
-    x = get_pdf_data_task.delay(file_path)
+    os.replace(part_path, file_path)
+    await apublish_progress(
+        task_id, "uploaded", paper_id=paper_id, content_sha256=content_sha256
+    )
+    x = ingest_pdf(file_path, content_sha256, task_id=task_id)
 
     return {
-        "message": f"PDF file {file.filename} uploaded successfully to {file_path} x: {x.id}."
+        "message": f"PDF file {file.filename} uploaded successfully to {file_path} x: {x.id}.",
+        "task_id": x.id,
+        "progress_url": f"/tasks/progress/{x.id}",
+        "paper_id": paper_id,
+        "content_sha256": content_sha256,
+        "duplicate": False,
     }
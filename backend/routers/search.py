@@ -0,0 +1,30 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from config import settings
+from helper_functions.search import hybrid_search
+
+router = APIRouter(
+    prefix="/search",
+    tags=["Search"],
+)
+
+
+@router.get("/")
+async def search(
+    q: str,
+    k: int = Query(10, ge=1, le=settings.SEARCH_MAX_K),
+    scope: Literal["all", "chunks", "papers"] = "all",
+    ef_search: Optional[int] = Query(None, ge=1, le=1000),
+):
+    """
+    Hybrid search: knowledge base chunks ranked by vector similarity and
+    full-text rank, papers by title and requirement full-text rank, each
+    merged with reciprocal rank fusion. Repeated queries are served from a
+    short-lived cache (`cached` in the response). A scope whose search
+    fails comes back empty, with its error under `errors`.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty.")
+    return await hybrid_search(q, k, scope, ef_search)
@@ -1,5 +1,16 @@
-from fastapi import APIRouter
+import json
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from celery import states
 from celery.result import AsyncResult
+from pydantic import BaseModel
+from sse_starlette.sse import EventSourceResponse
+
+from config import settings
+from helper_functions.progress import progress_events
+from helper_functions.worker_inspection import ActiveTasksSampler
 from celery_app import (
     celery,
 )  # Adjust this import to your Celery app instance
@@ -10,6 +21,23 @@ router = APIRouter(
 )
 
 
+def _inspect_active():
+    inspector = celery.control.inspect(timeout=settings.WORKER_INSPECT_TIMEOUT_SECONDS)
+    return inspector.active()
+
+
+# Started and stopped by the API lifespan (main.py)
+active_tasks_sampler = ActiveTasksSampler(
+    _inspect_active,
+    settings.WORKER_INSPECT_INTERVAL_SECONDS,
+    settings.WORKER_INSPECT_MAX_STALENESS_SECONDS,
+)
+
+
+class TaskStatusesRequest(BaseModel):
+    task_ids: List[str]
+
+
 @router.get("/task_status/{task_id}")
 async def get_task_status(task_id: str):
     try:
@@ -32,33 +60,130 @@ async def get_task_status(task_id: str):
                 "status": task_result.status,
                 "error": str(task_result.info),  # Contains exception if task failed
             }
+    elif task_result.status == "PROGRESS":
+        # Progress meta, e.g. metadata attempts recorded by extract_metadata_task
+        return {
+            "task_id": task_id,
+            "status": task_result.status,
+            "info": task_result.info,
+        }
     else:
         return {"task_id": task_id, "status": task_result.status}
 
 
-@router.get("/active_tasks")
-async def get_active_tasks():
+@router.get("/progress/{task_id}")
+async def stream_task_progress(
+    task_id: str, last_event_id: Optional[str] = Header(default=None)
+):
+    """
+    Server-Sent Events stream of a task's progress (uploaded, converted,
+    metadata_extracted, persisted, pages_converted, markdown_converted or
+    failed), pushed from Redis instead of polled. Reconnecting clients send
+    Last-Event-ID and only receive the events they missed.
+    """
     try:
-        inspector = celery.control.inspect()
-        active_tasks_data = inspector.active()
-
-        if not active_tasks_data:
-            return {"message": "No active workers found or no tasks currently active."}
-
-        # The structure of active_tasks_data is usually:
-        # {'worker_name@host': [{'id': 'task_id', 'name': 'task_name', ...}, ...]}
-        # You might want to flatten or reformat this for easier consumption
-        all_active_tasks = []
-        for worker_name, tasks in active_tasks_data.items():
-            if tasks:  # Ensure there are tasks for this worker
-                for task_info in tasks:
-                    task_info["worker"] = worker_name  # Add worker name to task info
-                    all_active_tasks.append(task_info)
-
-        if not all_active_tasks:
-            return {"message": "No tasks currently active across all workers."}
-
-        return {"active_tasks": all_active_tasks}
+        last_seq = int(last_event_id) if last_event_id else 0
+    except ValueError:
+        last_seq = 0
+
+    async def event_stream():
+        async for event in progress_events(task_id, last_seq):
+            yield {
+                "id": str(event["seq"]),
+                "event": event["stage"],
+                "data": json.dumps(event),
+            }
+
+    return EventSourceResponse(
+        event_stream(), ping=settings.PROGRESS_STREAM_PING_SECONDS
+    )
+
+
+@router.post("/task_statuses")
+async def get_task_statuses(request: TaskStatusesRequest):
+    """
+    Status of many tasks at once, in the same shape as /task_status/{task_id},
+    read from the result backend with a single MGET instead of one round trip
+    per task. Unknown task IDs are reported as PENDING, as Celery does.
+    """
+    task_ids = list(dict.fromkeys(request.task_ids))
+    if len(task_ids) > settings.TASK_STATUS_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.TASK_STATUS_MAX_IDS} task IDs per request.",
+        )
+    if not task_ids:
+        return {"statuses": []}
+
+    try:
+        metas = await run_in_threadpool(_fetch_task_metas, task_ids)
     except Exception as e:
+        return {
+            "error": f"Celery app not configured or available for status check: {str(e)}"
+        }
+    return {
+        "statuses": [
+            _task_status_from_meta(task_id, meta)
+            for task_id, meta in zip(task_ids, metas)
+        ]
+    }
+
+
+def _fetch_task_metas(task_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+    backend = celery.backend
+    payloads = backend.mget([backend.get_key_for_task(t) for t in task_ids])
+    return [
+        backend.decode_result(payload) if payload is not None else None
+        for payload in payloads
+    ]
+
+
+def _task_status_from_meta(
+    task_id: str, meta: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    if meta is None:
+        return {"task_id": task_id, "status": states.PENDING}
+    status = meta["status"]
+    if status == states.SUCCESS:
+        return {"task_id": task_id, "status": status, "result": meta["result"]}
+    if status in states.READY_STATES:
+        return {"task_id": task_id, "status": status, "error": str(meta["result"])}
+    if status == "PROGRESS":
+        return {"task_id": task_id, "status": status, "info": meta["result"]}
+    return {"task_id": task_id, "status": status}
+
+
+@router.get("/active_tasks")
+async def get_active_tasks():
+    """
+    Active tasks per worker, served from the background inspection sample
+    (see ActiveTasksSampler) rather than a broadcast per request.
+    """
+    sample = await active_tasks_sampler.get()
+    freshness = {
+        "sampled_at": sample["sampled_at"],
+        "age_seconds": sample["age_seconds"],
+    }
+    if sample["error"]:
         # This can happen if the broker is down or workers are not reachable
-        return {"error": f"Could not inspect active tasks: {str(e)}"}
+        return {"error": f"Could not inspect active tasks: {sample['error']}"}
+
+    active_tasks_data = sample["active"]
+    if not active_tasks_data:
+        return {
+            "message": "No active workers found or no tasks currently active.",
+            **freshness,
+        }
+
+    # The structure of active_tasks_data is usually:
+    # {'worker_name@host': [{'id': 'task_id', 'name': 'task_name', ...}, ...]}
+    all_active_tasks = []
+    for worker_name, tasks in active_tasks_data.items():
+        for task_info in tasks or []:
+            # Copy so the shared snapshot isn't mutated per request
+            all_active_tasks.append({**task_info, "worker": worker_name})
+
+    if not all_active_tasks:
+        return {"message": "No tasks currently active across all workers.", **freshness}
+
+    return {"active_tasks": all_active_tasks, **freshness}
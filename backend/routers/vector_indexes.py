@@ -0,0 +1,145 @@
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from db.vector_index import (
+    VectorIndexError,
+    drop_vector_index,
+    ensure_vector_column,
+    list_vector_indexes,
+    split_table_name,
+    vector_search,
+)
+from helper_functions.knowledge_base import vector_table_connection
+from tasks.vector_tasks import build_vector_index_task
+
+router = APIRouter(
+    prefix="/vector_indexes",
+    tags=["Vector indexes"],
+)
+
+
+class VectorIndexRequest(BaseModel):
+    method: Literal["hnsw", "ivfflat"] = "hnsw"
+    distance: Literal["cosine", "l2", "ip"] = "cosine"
+    column: str = "embedding"
+    # HNSW build parameters
+    m: int = 16
+    ef_construction: int = 64
+    # IVFFlat lists; defaults to rows / 1000 (sqrt(rows) above 1M rows)
+    lists: Optional[int] = None
+    maintenance_work_mem: Optional[str] = None
+    rebuild: bool = False
+
+
+class VectorSearchRequest(BaseModel):
+    vector: List[float]
+    k: int = 10
+    distance: Literal["cosine", "l2", "ip"] = "cosine"
+    column: str = "embedding"
+    id_column: str = "id"
+    ef_search: Optional[int] = None
+    probes: Optional[int] = None
+    exact: bool = False
+
+
+def _with_vector_conn(fn, schema, table_name, *args):
+    # Runs fn(conn, schema, table_name, *args) on the table's database
+    with vector_table_connection(schema, table_name) as conn:
+        return fn(conn, schema, table_name, *args)
+
+
+def _list_indexes(conn, schema, table_name):
+    with conn.cursor() as cursor:
+        indexes = list_vector_indexes(cursor, schema, table_name)
+    conn.rollback()
+    return indexes
+
+
+def _validate_table(conn, schema, table_name, column):
+    try:
+        with conn.cursor() as cursor:
+            ensure_vector_column(cursor, schema, table_name, column)
+    finally:
+        conn.rollback()
+
+
+def _drop_index(schema, table_name, index_name):
+    with vector_table_connection(schema, table_name) as conn:
+        drop_vector_index(conn, schema, index_name)
+
+
+def _search(conn, schema, table_name, request: VectorSearchRequest):
+    with conn.cursor() as cursor:
+        return vector_search(
+            cursor,
+            schema,
+            table_name,
+            request.vector,
+            request.k,
+            request.distance,
+            request.column,
+            request.id_column,
+            request.ef_search,
+            request.probes,
+            request.exact,
+        )
+
+
+@router.get("/{table}")
+async def get_vector_indexes(table: str):
+    """HNSW/IVFFlat indexes of a vector table ("schema.table")."""
+    schema, table_name = split_table_name(table)
+    indexes = await run_in_threadpool(
+        _with_vector_conn, _list_indexes, schema, table_name
+    )
+    return {"table": table, "indexes": indexes}
+
+
+@router.post("/{table}")
+async def create_vector_index(table: str, request: VectorIndexRequest):
+    """
+    Queues creation (or, with `rebuild`, replacement) of an ANN index on a
+    vector table. Index builds can take minutes, so this returns a task id.
+    """
+    schema, table_name = split_table_name(table)
+    try:
+        await run_in_threadpool(
+            _with_vector_conn, _validate_table, schema, table_name, request.column
+        )
+    except VectorIndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    task = build_vector_index_task.delay(table, **request.model_dump())
+    return {"task_id": task.id, "status_url": f"/tasks/task_status/{task.id}"}
+
+
+@router.delete("/{table}/{index_name}")
+async def delete_vector_index(table: str, index_name: str):
+    schema, table_name = split_table_name(table)
+    indexes = await run_in_threadpool(
+        _with_vector_conn, _list_indexes, schema, table_name
+    )
+    if index_name not in {index["name"] for index in indexes}:
+        raise HTTPException(
+            status_code=404, detail=f"{index_name} is not a vector index of {table}"
+        )
+    await run_in_threadpool(_drop_index, schema, table_name, index_name)
+    return {"table": table, "dropped": index_name}
+
+
+@router.post("/{table}/search")
+async def search_vector_table(table: str, request: VectorSearchRequest):
+    """
+    k nearest rows to a vector, with per-query ef_search (HNSW) / probes
+    (IVFFlat), or an exact scan for comparison.
+    """
+    schema, table_name = split_table_name(table)
+    try:
+        rows = await run_in_threadpool(
+            _with_vector_conn, _search, schema, table_name, request
+        )
+    except VectorIndexError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": [{"id": row[0], "distance": row[1]} for row in rows]}
@@ -0,0 +1,18 @@
+import logging
+from typing import List
+
+from celery_app import celery
+from helper_functions.knowledge_base import ingest_knowledge_base
+
+logger = logging.getLogger(__name__)
+
+
+@celery.task
+def ingest_knowledge_base_task(urls: List[str] = None, force: bool = False):
+    """
+    Incrementally ingests the knowledge base's source PDFs (llm_io queue:
+    agentic chunking and embedding are LLM calls). Unchanged sources are
+    skipped; `force` re-chunks them, still embedding only new chunks.
+    """
+    logger.info(f"Starting ingest_knowledge_base_task for {urls or 'all sources'}")
+    return ingest_knowledge_base(urls, force)
@@ -1,112 +1,334 @@
 import os
+import uuid
 
-# import uuid # No longer needed as file_path will be used as UUID
 import psycopg2  # For database error handling
+from typing import List
+from celery import chain
 from celery_app import celery
-from helper_functions.parse import parse_pdf
-from db.conn import get_db_connection  # Import your DB connection function
+from config import settings
+from helper_functions.backoff import backoff_delay
+from helper_functions.llm_scheduler import BATCH, INTERACTIVE, llm_priority
+from helper_functions.md_cache import file_sha256
+from helper_functions.progress import publish_progress
+from helper_functions.parse import (
+    extract_front_matter,
+    get_pdf_metadata,
+    parse_pdf,
+    save_pdf_markdown,
+)
+from db.conn import (  # Import your DB connection functions
+    get_db_connection,
+    release_db_connection,
+)
+from db.papers import clean_author_names, persist_papers
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Papers committed per transaction when ingesting a backlog
+BACKLOG_BATCH_SIZE = 50
+
+
+def build_paper_record(file_path: str, parsed_data: dict, content_sha256: str = None):
+    """
+    Shapes parse_pdf output into the record persist_papers expects.
+    """
+    # Extract the base filename without extension to use as UUID
+    base_name = os.path.basename(file_path)
+    paper_uuid_from_path, _ = os.path.splitext(base_name)
+    return {
+        "uuid": paper_uuid_from_path,
+        "title": parsed_data.get("title"),
+        "original_file_path": file_path,
+        "content_sha256": content_sha256,
+        "authors": clean_author_names(parsed_data.get("authors", []), file_path),
+    }
 
-@celery.task
-def get_pdf_data_task(file_path: str):
-    logger.info(f"Starting get_pdf_data_task for: {file_path}")
-    parsed_data_from_helper = parse_pdf(file_path)
-    logger.info(f"Parsed data from helper: {parsed_data_from_helper}")
 
+def persist_paper_records(records: List[dict]) -> List[str]:
+    """
+    Persists a batch of paper records in a single transaction.
+    """
     conn = None
     cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        inserted_ids = persist_papers(cursor, records)
+        conn.commit()
+        return inserted_ids
+    except psycopg2.Error as e:
+        logger.error(f"Database error while persisting {len(records)} papers: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            release_db_connection(conn)
 
-        # Extract the base filename without extension to use as UUID
-        base_name = os.path.basename(file_path)
-        paper_uuid_from_path, _ = os.path.splitext(base_name)
 
-        # 1. Insert into papers table
-        paper_title = parsed_data_from_helper.get("title")  # Assumes 'title' key exists
+@celery.task
+def convert_pdf_markdown_task(
+    file_path: str, content_sha256: str = None, progress_task_id: str = None
+):
+    """
+    Full PDF -> markdown conversion, queued at MARKDOWN_TASK_PRIORITY once
+    the paper's title and authors are persisted. Progress is published under
+    `progress_task_id`, the id of the ingestion that queued it.
+    """
+    logger.info(f"Starting convert_pdf_markdown_task for: {file_path}")
 
-        insert_paper_query = """
-        INSERT INTO papers (uuid, title, original_file_path)
-        VALUES (%s, %s, %s) RETURNING uuid;
-        """
-        # Use the extracted paper_uuid_from_path as the uuid, and full file_path for original_file_path
-        cursor.execute(
-            insert_paper_query, (paper_uuid_from_path, paper_title, file_path)
-        )
-        paper_id_tuple = cursor.fetchone()
-        if not paper_id_tuple:
-            logger.error(f"Failed to insert paper for {file_path}. No ID returned.")
-            raise Exception(f"Failed to insert paper for {file_path}")
-
-        # paper_id now correctly holds the extracted uuid (e.g., e7727547c53448c68e437d8880fcc196)
-        paper_id = paper_id_tuple[0]
-        logger.info(
-            f"Inserted paper with UUID: {paper_id} for original file: {file_path}"
+    def on_progress(pages_converted: int, page_count: int):
+        publish_progress(
+            progress_task_id,
+            "pages_converted",
+            pages_converted=pages_converted,
+            page_count=page_count,
         )
 
-        # 2. Insert authors and link to paper
-        author_names = parsed_data_from_helper.get("authors", [])
-        if not isinstance(author_names, list):
-            logger.warning(
-                f"Authors data for {file_path} is not a list: {author_names}. Skipping author insertion."
-            )
-            author_names = []
-
-        for author_name in author_names:
-            if not isinstance(author_name, str) or not author_name.strip():
-                logger.warning(
-                    f"Invalid or empty author name found: '{author_name}'. Skipping."
-                )
-                continue
-
-            insert_author_query = """
-            INSERT INTO authors (name) VALUES (%s)
-            ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
-            RETURNING id;
-            """
-            cursor.execute(insert_author_query, (author_name.strip(),))
-            author_id_tuple = cursor.fetchone()
-            if not author_id_tuple:
-                logger.error(
-                    f"Failed to insert or retrieve author: {author_name} for paper UUID {paper_id}"
-                )
-                continue
-            author_id = author_id_tuple[0]
-            logger.info(f"Processed author '{author_name}' with ID: {author_id}")
-
-            insert_paper_author_query = """
-            INSERT INTO paper_authors (paper_id, author_id)
-            VALUES (%s, %s) ON CONFLICT (paper_id, author_id) DO NOTHING;
-            """
-            # paper_id here is the UUID from the papers table (e.g., e7727547c53448c68e437d8880fcc196)
-            cursor.execute(insert_paper_author_query, (paper_id, author_id))
-            logger.info(f"Linked paper UUID {paper_id} with author ID {author_id}")
+    try:
+        save_pdf_markdown(file_path, content_sha256, on_progress)
+    except Exception as e:
+        publish_progress(progress_task_id, "failed", error=str(e))
+        raise
+    md_file_name = f"{file_path[:-4]}.md"
+    publish_progress(progress_task_id, "markdown_converted", md_file=md_file_name)
+    return md_file_name
 
-        conn.commit()
-        logger.info(
-            f"Successfully inserted paper and author data into DB for: {file_path}"
+
+def queue_markdown_conversion(
+    file_path: str, content_sha256: str = None, progress_task_id: str = None
+):
+    return convert_pdf_markdown_task.apply_async(
+        args=(file_path, content_sha256, progress_task_id),
+        priority=settings.MARKDOWN_TASK_PRIORITY,
+    )
+
+
+def persist_batch_and_queue_markdown(records: List[dict]) -> List[str]:
+    inserted_ids = persist_paper_records(records)
+    # Skipped duplicates already have (or are getting) their markdown
+    inserted_set = set(inserted_ids)
+    for record in records:
+        if record["uuid"] not in inserted_set:
+            continue
+        queue_markdown_conversion(
+            record["original_file_path"], record["content_sha256"]
         )
+    return inserted_ids
 
-    except psycopg2.Error as e:
-        logger.error(f"Database error during get_pdf_data_task for {file_path}: {e}")
-        if conn:
-            conn.rollback()
-        raise
+
+@celery.task
+def extract_front_matter_task(
+    file_path: str, content_sha256: str, task_id: str, priority: str = INTERACTIVE
+):
+    """
+    Ingestion stage 1 (pdf_cpu queue): reads the PDF's embedded metadata and
+    converts its first page(s) to markdown. `task_id` is the id of the final
+    stage, under which the whole ingestion reports its progress; `priority`
+    is the LLM priority class of the metadata stage.
+    """
+    logger.info(f"Starting extract_front_matter_task for: {file_path}")
+    embedded, md_text = extract_front_matter(file_path)
+    publish_progress(task_id, "converted", pages="front_matter")
+    return {
+        "file_path": file_path,
+        "content_sha256": content_sha256,
+        "task_id": task_id,
+        "embedded": embedded,
+        "md_text": md_text,
+        "priority": priority,
+    }
+
+
+@celery.task(bind=True, max_retries=None)
+def extract_metadata_task(self, stage: dict, metadata_attempts: List[dict] = None):
+    """
+    Ingestion stage 2 (llm_io queue): asks the metadata agent for title and
+    authors.
+
+    A failed metadata call is not retried in place: the task is rescheduled
+    with a jittered exponential countdown so the worker slot is free for
+    other documents meanwhile. Every attempt is recorded in the progress
+    meta of the ingestion's final task id.
+    """
+    file_path = stage["file_path"]
+    metadata_attempts = list(metadata_attempts or [])
+    attempt = len(metadata_attempts) + 1
+    max_attempts = settings.PDF_METADATA_MAX_ATTEMPTS
+    logger.info(
+        f"Starting extract_metadata_task for: {file_path} (metadata attempt {attempt}/{max_attempts})"
+    )
+    self.update_state(
+        task_id=stage["task_id"],
+        state="PROGRESS",
+        meta={
+            "file_path": file_path,
+            "stage": "extract_metadata",
+            "attempt": attempt,
+            "attempts": metadata_attempts,
+        },
+    )
+
+    try:
+        with llm_priority(stage.get("priority", INTERACTIVE)):
+            metadata = get_pdf_metadata(stage["md_text"], attempt, stage["embedded"])
     except Exception as e:
-        logger.error(
-            f"Unexpected error in get_pdf_data_task for {file_path}: {e}", exc_info=True
+        metadata_attempts.append({"attempt": attempt, "error": str(e)})
+        if attempt >= max_attempts:
+            logger.error(
+                f"extract_metadata_task: Metadata extraction failed after {attempt} attempts for {file_path}: {e}"
+            )
+            raise
+        countdown = backoff_delay(
+            attempt - 1,
+            settings.PDF_METADATA_BACKOFF_BASE_SECONDS,
+            settings.PDF_METADATA_BACKOFF_MAX_SECONDS,
         )
-        if conn:
-            conn.rollback()
-        raise
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+        metadata_attempts[-1]["retry_in_seconds"] = round(countdown, 1)
+        publish_progress(stage["task_id"], "metadata_retry", **metadata_attempts[-1])
+        logger.warning(
+            f"extract_metadata_task: Metadata attempt {attempt}/{max_attempts} failed for {file_path}, retrying in {countdown:.1f}s"
+        )
+        raise self.retry(
+            exc=e,
+            countdown=countdown,
+            args=(),
+            kwargs={"stage": stage, "metadata_attempts": metadata_attempts},
+        )
+    logger.info(f"Parsed data from helper: {metadata}")
+    publish_progress(stage["task_id"], "metadata_extracted", **metadata)
+
+    return {
+        "file_path": file_path,
+        "content_sha256": stage["content_sha256"],
+        "task_id": stage["task_id"],
+        "metadata": metadata,
+    }
+
+
+@celery.task
+def persist_paper_task(stage: dict):
+    """
+    Ingestion stage 3 (db_io queue): persists the paper and its authors, then
+    queues the full markdown conversion as a separate lower-priority task.
+    """
+    file_path = stage["file_path"]
+    content_sha256 = stage["content_sha256"]
+    record = build_paper_record(file_path, stage["metadata"], content_sha256)
+    inserted_ids = persist_paper_records([record])
+    if not inserted_ids:
+        logger.error(f"Failed to insert paper for {file_path}. No ID returned.")
+        raise Exception(f"Failed to insert paper for {file_path}")
+
+    logger.info(
+        f"Inserted paper with UUID: {inserted_ids[0]} and {len(record['authors'])} authors for original file: {file_path}"
+    )
+    publish_progress(stage["task_id"], "persisted", paper_id=inserted_ids[0])
+
+    markdown_task = queue_markdown_conversion(
+        file_path, content_sha256, stage["task_id"]
+    )
+    return {**stage["metadata"], "markdown_task_id": markdown_task.id}
+
+
+@celery.task
+def ingestion_failed_task(request, exc, traceback, task_id: str):
+    """
+    Error callback of an ingestion chain: a stage failed, so the chain
+    stopped before its final task; record the failure under the final task
+    id so status checks and upload deduplication see it.
+    """
+    logger.error(f"Ingestion {task_id} failed in task {request.id}: {exc}")
+    celery.backend.mark_as_failure(task_id, exc, traceback)
+    publish_progress(task_id, "failed", error=str(exc))
+
+
+def ingest_pdf(
+    file_path: str,
+    content_sha256: str,
+    task_id: str = None,
+    metadata_attempts: List[dict] = None,
+    countdown: float = None,
+    priority: str = INTERACTIVE,
+):
+    """
+    Starts the staged ingestion of an uploaded PDF:
+    extract_front_matter_task -> extract_metadata_task -> persist_paper_task,
+    each routed to its own queue (see celery_app.py). The returned result,
+    and `task_id` if given, belong to the final stage. `priority` is the
+    class its LLM calls are scheduled in (see helper_functions.llm_scheduler).
+    """
+    task_id = task_id or uuid.uuid4().hex
+    pipeline = chain(
+        extract_front_matter_task.s(
+            file_path, content_sha256, task_id, priority=priority
+        ).set(countdown=countdown),
+        extract_metadata_task.s(metadata_attempts=metadata_attempts),
+        persist_paper_task.s(),
+    )
+    pipeline.on_error(ingestion_failed_task.s(task_id))
+    return pipeline.apply_async(task_id=task_id)
+
+
+@celery.task
+def ingest_pdf_backlog_task(
+    file_paths: List[str], batch_size: int = BACKLOG_BATCH_SIZE
+):
+    """
+    Parses a list of PDFs already on disk and persists them `batch_size`
+    papers per transaction, then queues their markdown conversion. PDFs that
+    fail to parse are handed to the staged ingestion (ingest_pdf), which
+    retries them with backoff without holding up the batch; papers already
+    in the database are skipped by persist_papers. Its LLM calls are batch
+    priority, so they never hold up interactive uploads.
+    """
+    logger.info(f"Starting ingest_pdf_backlog_task for {len(file_paths)} files")
+    inserted = []
+    failed = []
+    rescheduled = []
+    batch = []
+
+    for file_path in file_paths:
+        try:
+            content_sha256 = file_sha256(file_path)
+        except OSError as e:
+            logger.error(f"ingest_pdf_backlog_task: Skipping {file_path}: {e}")
+            failed.append(file_path)
+            continue
+
+        try:
+            with llm_priority(BATCH):
+                parsed_data = parse_pdf(file_path)
+            batch.append(build_paper_record(file_path, parsed_data, content_sha256))
+        except Exception as e:
+            logger.warning(
+                f"ingest_pdf_backlog_task: Rescheduling {file_path} individually: {e}"
+            )
+            ingest_pdf(
+                file_path,
+                content_sha256,
+                metadata_attempts=[{"attempt": 1, "error": str(e)}],
+                countdown=backoff_delay(
+                    0,
+                    settings.PDF_METADATA_BACKOFF_BASE_SECONDS,
+                    settings.PDF_METADATA_BACKOFF_MAX_SECONDS,
+                ),
+                priority=BATCH,
+            )
+            rescheduled.append(file_path)
+            continue
+
+        if len(batch) >= batch_size:
+            inserted.extend(persist_batch_and_queue_markdown(batch))
+            batch = []
+
+    if batch:
+        inserted.extend(persist_batch_and_queue_markdown(batch))
 
-    return parsed_data_from_helper
+    logger.info(
+        f"ingest_pdf_backlog_task: inserted {len(inserted)} papers, {len(rescheduled)} rescheduled, {len(failed)} failed"
+    )
+    return {"inserted": inserted, "rescheduled": rescheduled, "failed": failed}
@@ -0,0 +1,329 @@
+import json
+import time
+import uuid
+import logging
+from typing import List
+
+import psycopg2
+
+from agents.requirements import REQUIREMENTS_SYSTEM_PROMPT, requirements_agent
+from celery_app import celery
+from config import settings
+from db.conn import get_db_connection, release_db_connection
+from db.redis_conn import get_redis
+from db.requirements import replace_paper_requirements
+from helper_functions.backoff import backoff_delay
+from helper_functions.llm_cache import run_agent_sync_cached
+from helper_functions.parse import iter_pdf_chunks
+from helper_functions.progress import publish_progress
+from helper_functions.redis_semaphore import acquire_slot, release_slot
+
+logger = logging.getLogger(__name__)
+
+# Cluster-wide limit on chunks sent to the requirements agent at once
+REQUIREMENTS_SEMAPHORE = "requirements_chunks"
+
+# Redis state of a job: a hash of counters ("total", "done", "aggregated",
+# "ready:<chunk index>"), and hashes of chunk texts and chunk results by
+# chunk index
+JOB_KEY = "requirements_job:{}"
+CHUNKS_KEY = "requirements_job:{}:chunks"
+RESULTS_KEY = "requirements_job:{}:results"
+
+
+def _job_keys(job_id: str) -> List[str]:
+    return [key.format(job_id) for key in (JOB_KEY, CHUNKS_KEY, RESULTS_KEY)]
+
+
+def _store_chunk(job_id: str, chunk_index: int, chunk_text: str) -> None:
+    key = CHUNKS_KEY.format(job_id)
+    with get_redis().pipeline() as pipe:
+        pipe.hset(key, chunk_index, chunk_text)
+        pipe.expire(key, settings.REQUIREMENTS_JOB_TTL_SECONDS)
+        pipe.execute()
+
+
+def _queue_chunk(job_id: str, chunk_index: int) -> None:
+    extract_chunk_requirements_task.apply_async(
+        args=(job_id, chunk_index),
+        link_error=requirements_job_failed_task.s(job_id),
+    )
+
+
+def _release_chunk(job_id: str, chunk_index: int) -> None:
+    # A job runs its chunks in REQUIREMENTS_CHUNK_CONCURRENCY lanes: chunk i
+    # is queued once it is stored and chunk i - lanes is done, by whichever
+    # of the chunker and that chunk's task gets there second
+    if chunk_index < settings.REQUIREMENTS_CHUNK_CONCURRENCY:
+        _queue_chunk(job_id, chunk_index)
+        return
+    if get_redis().hincrby(JOB_KEY.format(job_id), f"ready:{chunk_index}", 1) == 2:
+        _queue_chunk(job_id, chunk_index)
+
+
+def _maybe_aggregate(paper_id: str, job_id: str, total: int, done: int) -> None:
+    # Queues aggregation once every chunk is done; the chunker (which sets
+    # the total) and the last chunk may both see that, so the first to set
+    # "aggregated" does it
+    if total != done or not get_redis().hsetnx(JOB_KEY.format(job_id), "aggregated", 1):
+        return
+    aggregate_requirements_task.apply_async(
+        args=(paper_id, job_id),
+        task_id=job_id,
+        link_error=requirements_job_failed_task.s(job_id),
+    )
+
+
+@celery.task(bind=True)
+def chunk_paper_task(self, paper_id: str, file_path: str, job_id: str):
+    """
+    Requirement extraction stage 1 (pdf_cpu queue): chunks the paper's text
+    once, streaming it page by page. Each chunk is stored in Redis and its
+    extract_chunk_requirements_task queued as soon as it is produced and a
+    lane is free (see _release_chunk), so neither this worker nor any broker
+    message holds the whole document.
+    Once every chunk is done, aggregate_requirements_task runs as `job_id`.
+    """
+    logger.info(f"Starting chunk_paper_task for paper {paper_id}: {file_path}")
+    job_key = JOB_KEY.format(job_id)
+    get_redis().hset(job_key, mapping={"paper_id": paper_id, "done": 0})
+    get_redis().expire(job_key, settings.REQUIREMENTS_JOB_TTL_SECONDS)
+
+    chunk_count = 0
+    for chunk_index, chunk_text in enumerate(iter_pdf_chunks(file_path)):
+        _store_chunk(job_id, chunk_index, chunk_text)
+        _release_chunk(job_id, chunk_index)
+        chunk_count += 1
+
+    publish_progress(job_id, "chunked", paper_id=paper_id, chunk_count=chunk_count)
+    self.update_state(
+        task_id=job_id,
+        state="PROGRESS",
+        meta={
+            "paper_id": paper_id,
+            "stage": "extract_requirements",
+            "chunk_count": chunk_count,
+        },
+    )
+    with get_redis().pipeline() as pipe:
+        pipe.hset(job_key, "total", chunk_count)
+        pipe.hget(job_key, "done")
+        _, done = pipe.execute()
+    _maybe_aggregate(paper_id, job_id, chunk_count, int(done or 0))
+    return job_id
+
+
+def _finish_chunk(job_id: str, chunk_index: int, result: dict) -> dict:
+    # Records a chunk's result, frees its text and counts it as done
+    job_key, chunks_key, results_key = _job_keys(job_id)
+    with get_redis().pipeline() as pipe:
+        pipe.hset(results_key, chunk_index, json.dumps(result))
+        pipe.expire(results_key, settings.REQUIREMENTS_JOB_TTL_SECONDS)
+        pipe.hdel(chunks_key, chunk_index)
+        pipe.hincrby(job_key, "done", 1)
+        pipe.hmget(job_key, "total", "paper_id")
+        *_, done, (total, paper_id) = pipe.execute()
+    if total is not None:
+        _maybe_aggregate(paper_id, job_id, int(total), done)
+    next_index = chunk_index + settings.REQUIREMENTS_CHUNK_CONCURRENCY
+    if total is None or next_index < int(total):
+        _release_chunk(job_id, next_index)
+    return result
+
+
+def _chunk_failed(job_id: str, chunk_index: int, error: str) -> dict:
+    publish_progress(job_id, "chunk_failed", chunk_index=chunk_index, error=error)
+    return _finish_chunk(
+        job_id,
+        chunk_index,
+        {"chunk_index": chunk_index, "requirements": [], "error": error},
+    )
+
+
+@celery.task(bind=True, max_retries=None)
+def extract_chunk_requirements_task(
+    self,
+    job_id: str,
+    chunk_index: int,
+    failed_attempts: int = 0,
+    slot_wait_started: float = None,
+):
+    """
+    Requirement extraction stage 2 (llm_io queue): asks the requirements
+    agent for the requirements in one chunk, read from the job's chunks in
+    Redis, and records them in the job's results.
+
+    At most REQUIREMENTS_CHUNK_CONCURRENCY chunks are extracted at once
+    across all workers. A chunk that finds no free slot (other jobs hold
+    them) is rescheduled with a jittered exponential countdown instead of
+    holding its worker, and fails after REQUIREMENTS_SLOT_MAX_WAIT_SECONDS.
+    A failed LLM call is retried with
+    a jittered exponential countdown; once REQUIREMENTS_CHUNK_MAX_ATTEMPTS
+    are used up the chunk is reported with its error and no requirements,
+    so one bad chunk doesn't fail the whole job.
+    """
+    chunk_text = get_redis().hget(CHUNKS_KEY.format(job_id), chunk_index)
+    if chunk_text is None:
+        error = f"Chunk text expired after {settings.REQUIREMENTS_JOB_TTL_SECONDS}s"
+        logger.error(
+            f"extract_chunk_requirements_task: Chunk {chunk_index} of job {job_id}: {error}"
+        )
+        return _chunk_failed(job_id, chunk_index, error)
+
+    token = acquire_slot(
+        REQUIREMENTS_SEMAPHORE,
+        settings.REQUIREMENTS_CHUNK_CONCURRENCY,
+        settings.REQUIREMENTS_SLOT_LEASE_SECONDS,
+    )
+    if token is None:
+        now = time.time()
+        slot_wait_started = slot_wait_started or now
+        if now - slot_wait_started >= settings.REQUIREMENTS_SLOT_MAX_WAIT_SECONDS:
+            error = (
+                f"No free slot within {settings.REQUIREMENTS_SLOT_MAX_WAIT_SECONDS}s"
+            )
+            logger.error(
+                f"extract_chunk_requirements_task: Chunk {chunk_index} of job {job_id}: {error}"
+            )
+            return _chunk_failed(job_id, chunk_index, error)
+        raise self.retry(
+            countdown=backoff_delay(
+                self.request.retries,
+                settings.REQUIREMENTS_SLOT_WAIT_SECONDS,
+                settings.REQUIREMENTS_SLOT_WAIT_MAX_SECONDS,
+            ),
+            args=(),
+            kwargs={
+                "job_id": job_id,
+                "chunk_index": chunk_index,
+                "failed_attempts": failed_attempts,
+                "slot_wait_started": slot_wait_started,
+            },
+        )
+
+    try:
+        requirements = run_agent_sync_cached(
+            requirements_agent, chunk_text, REQUIREMENTS_SYSTEM_PROMPT
+        )
+    except Exception as e:
+        attempt = failed_attempts + 1
+        max_attempts = settings.REQUIREMENTS_CHUNK_MAX_ATTEMPTS
+        if attempt >= max_attempts:
+            logger.error(
+                f"extract_chunk_requirements_task: Chunk {chunk_index} of job {job_id} failed after {attempt} attempts: {e}"
+            )
+            return _chunk_failed(job_id, chunk_index, str(e))
+        countdown = backoff_delay(
+            attempt - 1,
+            settings.REQUIREMENTS_CHUNK_BACKOFF_BASE_SECONDS,
+            settings.REQUIREMENTS_CHUNK_BACKOFF_MAX_SECONDS,
+        )
+        logger.warning(
+            f"extract_chunk_requirements_task: Chunk {chunk_index} of job {job_id} attempt {attempt}/{max_attempts} failed, retrying in {countdown:.1f}s"
+        )
+        raise self.retry(
+            exc=e,
+            countdown=countdown,
+            args=(),
+            kwargs={
+                "job_id": job_id,
+                "chunk_index": chunk_index,
+                "failed_attempts": attempt,
+            },
+        )
+    finally:
+        release_slot(REQUIREMENTS_SEMAPHORE, token)
+
+    publish_progress(
+        job_id,
+        "chunk_extracted",
+        chunk_index=chunk_index,
+        requirement_count=len(requirements),
+    )
+    return _finish_chunk(
+        job_id,
+        chunk_index,
+        {"chunk_index": chunk_index, "requirements": requirements},
+    )
+
+
+@celery.task
+def aggregate_requirements_task(paper_id: str, job_id: str):
+    """
+    Requirement extraction stage 3 (db_io queue), queued by the last chunk
+    to finish: merges the chunks' requirements from Redis in document order,
+    drops duplicates and stores them as the paper's requirements list in one
+    transaction.
+    """
+    results_key = RESULTS_KEY.format(job_id)
+    results = sorted(
+        (json.loads(result) for result in get_redis().hvals(results_key)),
+        key=lambda result: result["chunk_index"],
+    )
+    seen = set()
+    requirements = []
+    for result in results:
+        for requirement in result["requirements"]:
+            requirement = requirement.strip()
+            if requirement and requirement not in seen:
+                seen.add(requirement)
+                requirements.append((result["chunk_index"], requirement))
+    failed_chunks = [result["chunk_index"] for result in results if "error" in result]
+
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        replace_paper_requirements(cursor, paper_id, job_id, requirements)
+        conn.commit()
+    except psycopg2.Error as e:
+        logger.error(f"Database error while storing requirements of {paper_id}: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            release_db_connection(conn)
+    get_redis().delete(*_job_keys(job_id))
+
+    publish_progress(
+        job_id,
+        "requirements_persisted",
+        paper_id=paper_id,
+        requirement_count=len(requirements),
+        failed_chunks=failed_chunks,
+    )
+    return {
+        "paper_id": paper_id,
+        "chunk_count": len(results),
+        "failed_chunks": failed_chunks,
+        "requirements": [requirement for _, requirement in requirements],
+    }
+
+
+@celery.task
+def requirements_job_failed_task(request, exc, traceback, job_id: str):
+    """
+    Error callback of a requirement extraction job: records the failure
+    under the job id so status checks and the progress stream see it.
+    """
+    logger.error(f"Requirements job {job_id} failed in task {request.id}: {exc}")
+    celery.backend.mark_as_failure(job_id, exc, traceback)
+    publish_progress(job_id, "failed", error=str(exc))
+
+
+def start_requirements_job(paper_id: str, file_path: str) -> str:
+    """
+    Queues requirement extraction for a paper and returns the job id, under
+    which the job reports its status (/tasks/task_status) and progress
+    (/tasks/progress).
+    """
+    job_id = uuid.uuid4().hex
+    chunk_paper_task.apply_async(
+        args=(paper_id, file_path, job_id),
+        link_error=requirements_job_failed_task.s(job_id),
+    )
+    return job_id
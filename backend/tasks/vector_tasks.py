@@ -0,0 +1,19 @@
+import logging
+
+from celery_app import celery
+from db.vector_index import build_vector_index, split_table_name
+from helper_functions.knowledge_base import vector_table_connection
+
+logger = logging.getLogger(__name__)
+
+
+@celery.task
+def build_vector_index_task(table: str, **options):
+    """
+    Creates or rebuilds an HNSW/IVFFlat index on a vector table (db_io
+    queue); `options` are build_vector_index's keyword arguments.
+    """
+    logger.info(f"Starting build_vector_index_task for {table}: {options}")
+    schema, table_name = split_table_name(table)
+    with vector_table_connection(schema, table_name) as conn:
+        return build_vector_index(conn, schema, table_name, **options)